@@ -1,23 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Union
 
 from database import get_db
 import crud
 import schemas
 from auth import get_current_user
+from utils.pagination import InvalidCursorError
+from utils.serialization import parse_song_fields, song_columns, rows_to_dicts, InvalidFieldsError
+from utils.response_cache import get_response_cache, playlist_namespace, SONGS_NAMESPACE, PLAYLISTS_NAMESPACE
 
 router = APIRouter(prefix="/playlists", tags=["playlists"])
 
 
-@router.get("", response_model=List[schemas.Playlist])
+@router.get("", response_model=Union[schemas.PlaylistSummaryPage, List[schemas.PlaylistSummary]])
 def get_playlists(
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(50, ge=1, le=200),
         db: Session = Depends(get_db),
         current_user: schemas.User = Depends(get_current_user)
 ):
-    """获取所有歌单"""
-    playlists = crud.get_playlists(db)
-    return playlists
+    """获取所有歌单（附带歌曲数、总时长和代表封面）
+
+    传入 cursor 参数时使用游标分页（首页传空字符串），返回 {items, next_cursor}
+    """
+    def build():
+        if cursor is None:
+            playlists = crud.get_playlists(db)
+            return [summary.model_dump() for summary in crud.build_playlist_summaries(db, playlists)]
+        try:
+            playlists, next_cursor = crud.get_playlists_page(db, limit=limit, cursor=cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        return schemas.PlaylistSummaryPage(
+            items=crud.build_playlist_summaries(db, playlists),
+            next_cursor=next_cursor
+        ).model_dump()
+
+    key = f"playlists:{cursor}:{limit if cursor is not None else ''}"
+    return get_response_cache().json([SONGS_NAMESPACE, PLAYLISTS_NAMESPACE], key, build)
 
 
 @router.get("/{playlist_id}", response_model=schemas.Playlist)
@@ -131,6 +156,54 @@ def add_song_to_playlist(
     return {"message": "Song added to playlist successfully"}
 
 
+@router.post("/{playlist_id}/songs", response_model=schemas.PlaylistSongBatchResult)
+def add_songs_to_playlist(
+        playlist_id: int,
+        batch: schemas.PlaylistSongBatch,
+        db: Session = Depends(get_db),
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """批量添加歌曲到歌单（按传入顺序追加到末尾，已存在和不存在的歌曲会被跳过）"""
+    # 检查歌单是否存在
+    playlist = crud.get_playlist(db, playlist_id=playlist_id)
+    if playlist is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Playlist not found"
+        )
+
+    try:
+        added, skipped, not_found = crud.add_songs_to_playlist(db, playlist_id=playlist_id, song_ids=batch.song_ids)
+    except IntegrityError:
+        # 并发请求同时添加了相同的歌曲
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Playlist was modified concurrently, please retry"
+        )
+    return schemas.PlaylistSongBatchResult(added=added, skipped=skipped, not_found=not_found)
+
+
+@router.delete("/{playlist_id}/songs", response_model=schemas.PlaylistSongBatchResult)
+def remove_songs_from_playlist(
+        playlist_id: int,
+        batch: schemas.PlaylistSongBatch,
+        db: Session = Depends(get_db),
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """批量从歌单移除歌曲"""
+    # 检查歌单是否存在
+    playlist = crud.get_playlist(db, playlist_id=playlist_id)
+    if playlist is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Playlist not found"
+        )
+
+    removed, skipped = crud.remove_songs_from_playlist(db, playlist_id=playlist_id, song_ids=batch.song_ids)
+    return schemas.PlaylistSongBatchResult(removed=removed, skipped=skipped)
+
+
 @router.delete("/{playlist_id}/songs/{song_id}")
 def remove_song_from_playlist(
         playlist_id: int,
@@ -157,30 +230,60 @@ def remove_song_from_playlist(
         )
 
 
-@router.get("/{playlist_id}/songs", response_model=List[schemas.SongInPlaylist])
+@router.get("/{playlist_id}/songs", response_model=Union[schemas.SongInPlaylistListPage, List[schemas.SongInPlaylistListItem]])
 def get_playlist_songs(
         playlist_id: int,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(100, ge=1, le=500),
+        fields: Optional[str] = Query(None, description="歌曲返回的字段，逗号分隔，例如 id,title,artist"),
         db: Session = Depends(get_db),
         current_user: schemas.User = Depends(get_current_user)
 ):
-    """获取歌单内歌曲（按顺序）"""
-    # 检查歌单是否存在
-    playlist = crud.get_playlist(db, playlist_id=playlist_id)
-    if playlist is None:
+    """获取歌单内歌曲（按顺序）
+
+    传入 cursor 参数时使用游标分页（首页传空字符串），返回 {items, next_cursor}
+    """
+    try:
+        field_names = parse_song_fields(fields)
+    except InvalidFieldsError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Playlist not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
+    # 歌曲列加前缀，避免与歌单歌曲的 id 列重名
+    columns = song_columns(field_names, prefix="song_")
 
-    playlist_songs = crud.get_playlist_songs(db, playlist_id=playlist_id)
-    return [
-        schemas.SongInPlaylist(
-            song=ps.song,
-            order_index=ps.order_index,
-            added_at=ps.added_at
-        )
-        for ps in playlist_songs
-    ]
+    def to_items(rows):
+        songs = rows_to_dicts(rows, field_names, offset=3)
+        return [
+            {"song": song, "order_index": row[0], "added_at": row[2]}
+            for row, song in zip(rows, songs)
+        ]
+
+    def build():
+        # 检查歌单是否存在
+        playlist = crud.get_playlist(db, playlist_id=playlist_id)
+        if playlist is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Playlist not found"
+            )
+
+        if cursor is None:
+            return to_items(crud.get_playlist_song_rows(db, playlist_id=playlist_id, song_columns=columns))
+        try:
+            rows, next_cursor = crud.get_playlist_song_rows(
+                db, playlist_id=playlist_id, song_columns=columns, limit=limit, cursor=cursor
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        return {"items": to_items(rows), "next_cursor": next_cursor}
+
+    key = f"playlist_songs:{playlist_id}:{cursor}:{limit if cursor is not None else ''}:{','.join(field_names)}"
+    return get_response_cache().json([SONGS_NAMESPACE, playlist_namespace(playlist_id)], key, build)
 
 
 @router.put("/{playlist_id}/songs/order")
@@ -213,3 +316,31 @@ def update_playlist_song_order(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update playlist song order: {str(e)}"
         )
+
+
+@router.post("/{playlist_id}/songs/{song_id}/move", response_model=schemas.SongInPlaylist)
+def move_playlist_song(
+        playlist_id: int,
+        song_id: int,
+        move: schemas.PlaylistSongMove,
+        db: Session = Depends(get_db),
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """将歌曲移动到另一首歌之前（拖拽排序），只更新被移动的歌曲"""
+    # 检查歌单是否存在
+    playlist = crud.get_playlist(db, playlist_id=playlist_id)
+    if playlist is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Playlist not found"
+        )
+
+    playlist_song = crud.move_playlist_song(
+        db, playlist_id=playlist_id, song_id=song_id, before_song_id=move.before_song_id
+    )
+    if playlist_song is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Song not found in playlist"
+        )
+    return playlist_song
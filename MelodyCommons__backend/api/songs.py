@@ -1,34 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 import os
+import asyncio
 import mimetypes
 import time
 
-from database import get_db
+from database import get_db, SessionLocal
 import crud
 import schemas
 from auth import get_current_user, verify_token_string, get_user_by_token
-from utils.audio import extract_audio_metadata, is_valid_audio_file, MAX_AUDIO_SIZE
-from utils.file import save_uploaded_file, get_file_size, AUDIO_DIR
-from utils.cover import save_cover_image, get_cover_url, refresh_song_cover
+from utils.audio import extract_audio_metadata, MAX_AUDIO_SIZE
+from utils.file import get_file_size, delete_file, AUDIO_DIR
+from utils.upload import (
+    receive_audio_upload, IngestedUpload, UploadError, UnsupportedUploadError, UploadTooLargeError
+)
+from utils.cover import refresh_song_cover, get_cover_cache_stats
+from utils.pagination import InvalidCursorError, SONG_SORT_COLUMNS, DEFAULT_SONG_SORT
+from utils.play_events import record_play, record_session_play
+from utils.streaming import file_response, get_audio_media_type, STATIC_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL
+from utils.cover_jobs import get_cover_job_queue
+from utils.transcode import (
+    get_transcoder, is_transcoding_available, rendition_media_type,
+    TranscodeError, TranscodeJob, RENDITIONS, ORIGINAL_QUALITY
+)
+from utils.pcm import can_decode
+from utils.waveform import get_waveform_queue, read_waveform, is_waveform_available
+from utils.loudness import get_loudness_queue
+from utils.thumbnails import (
+    get_thumbnail_queue, is_thumbnail_available, pick_thumbnail_size, negotiate_thumbnail_format,
+    thumbnail_path, THUMBNAIL_FORMATS
+)
+from utils.hls import (
+    get_hls_packager, HLS_PLAYLIST_MEDIA_TYPE, HLS_SEGMENT_MEDIA_TYPE, HLS_SEGMENT_CACHE_CONTROL
+)
+from utils.response_cache import get_response_cache, SONGS_NAMESPACE
+from utils.serialization import (
+    parse_song_fields, song_columns, rows_to_dicts, InvalidFieldsError, fast_json_response
+)
 
 router = APIRouter(prefix="/songs", tags=["songs"])
 
 
-@router.get("", response_model=List[schemas.Song])
+def _dump_song(song) -> dict:
+    """按 schemas.Song 转换为可缓存的字典"""
+    return schemas.Song.model_validate(song).model_dump()
+
+
+@router.get("", response_model=Union[schemas.SongListPage, List[schemas.SongListItem]])
 def get_songs(
         page: int = Query(1, ge=1),
         limit: int = Query(50, ge=1, le=100),
         search: Optional[str] = Query(None),
+        cursor: Optional[str] = Query(None),
+        sort: str = Query(DEFAULT_SONG_SORT),
+        fields: Optional[str] = Query(None, description="返回的字段，逗号分隔，例如 id,title,artist"),
         db: Session = Depends(get_db),
         current_user: schemas.User = Depends(get_current_user)
 ):
-    """获取所有歌曲（支持分页和搜索）"""
+    """获取所有歌曲（支持分页和搜索）
+
+    传入 cursor 参数时使用游标分页（首页传空字符串），返回 {items, next_cursor}。
+    只查询所需的列并直接序列化，不经过 ORM 对象和逐行的模型校验。
+    """
+    try:
+        field_names = parse_song_fields(fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    columns = song_columns(field_names)
+    cache = get_response_cache()
+    fields_key = ",".join(field_names)
+
+    if cursor is not None:
+        if sort not in SONG_SORT_COLUMNS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid sort field"
+            )
+
+        def build_page():
+            try:
+                rows, next_cursor = crud.get_song_rows_page(
+                    db, columns, limit=limit, search=search, sort=sort, cursor=cursor
+                )
+            except InvalidCursorError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            return {"items": rows_to_dicts(rows, field_names), "next_cursor": next_cursor}
+
+        return cache.json(
+            [SONGS_NAMESPACE], f"songs:cursor:{cursor}:{limit}:{search}:{sort}:{fields_key}", build_page
+        )
+
     skip = (page - 1) * limit
-    songs = crud.get_songs(db, skip=skip, limit=limit, search=search)
-    return songs
+    return cache.json(
+        [SONGS_NAMESPACE], f"songs:page:{page}:{limit}:{search}:{fields_key}",
+        lambda: rows_to_dicts(crud.get_song_rows(db, columns, skip=skip, limit=limit, search=search), field_names)
+    )
 
 
 @router.get("/popular/top", response_model=List[schemas.Song])
@@ -38,8 +113,26 @@ def get_popular_songs(
         current_user: schemas.User = Depends(get_current_user)
 ):
     """获取热门歌曲（按播放次数排序，播放次数相同时随机选择）"""
-    songs = crud.get_popular_songs(db, limit=limit)
-    return songs
+    return get_response_cache().json(
+        [SONGS_NAMESPACE], f"songs:popular:{limit}",
+        lambda: [_dump_song(song) for song in crud.get_popular_songs(db, limit=limit)]
+    )
+
+
+@router.get("/covers/jobs", response_model=schemas.CoverJobSummary)
+def get_cover_jobs_summary(
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """获取封面获取任务的整体进度"""
+    return get_cover_job_queue().summary()
+
+
+@router.get("/covers/stats", response_model=schemas.CoverCacheStats)
+def get_cover_stats(
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """获取封面缓存命中统计"""
+    return get_cover_cache_stats()
 
 
 @router.get("/{song_id}", response_model=schemas.Song)
@@ -49,227 +142,422 @@ def get_song(
         current_user: schemas.User = Depends(get_current_user)
 ):
     """获取单个歌曲详情"""
-    song = crud.get_song(db, song_id=song_id)
-    if song is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Song not found"
-        )
-    return song
+    def build():
+        song = crud.get_song(db, song_id=song_id)
+        if song is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Song not found"
+            )
+        return _dump_song(song)
+
+    return get_response_cache().json([SONGS_NAMESPACE], f"songs:detail:{song_id}", build)
+
+
+def _load_stream_target(song_id: int, query_token: Optional[str], auth_header: Optional[str]):
+    """验证身份并查找歌曲文件，返回(文件路径, stat 结果, 用户ID)（同步执行数据库与文件系统访问，由线程池调用）"""
+    db = SessionLocal()
+    try:
+        user = None
+
+        # 方法1: 尝试从查询参数获取token（用于音频播放）
+        if query_token:
+            try:
+                username = verify_token_string(query_token)
+                user = get_user_by_token(username, db)
+            except Exception as e:
+                print(f"Token validation error: {e}")
+                pass
+
+        # 方法2: 如果查询参数认证失败，尝试从Authorization头获取token
+        if not user:
+            try:
+                if auth_header and auth_header.startswith("Bearer "):
+                    token = auth_header.split(" ")[1]
+                    username = verify_token_string(token)
+                    user = get_user_by_token(username, db)
+            except Exception as e:
+                print(f"Authorization header error: {e}")
+                pass
+
+        # 如果两种认证方式都失败
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Authentication required"
+            )
+
+        # 获取歌曲信息
+        song = crud.get_song(db, song_id=song_id)
+        if song is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Song not found"
+            )
+
+        # 检查文件是否存在
+        try:
+            stat_result = os.stat(song.file_path)
+        except OSError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Song file not found"
+            )
+
+        return song.file_path, stat_result, user.id
+    finally:
+        db.close()
 
 
 @router.get("/{song_id}/stream")
 async def stream_song(
         song_id: int,
         request: Request,
-        db: Session = Depends(get_db)
+        quality: Optional[str] = Query(
+            None, description="转码质量：low / medium（Opus）、aac、mp3，不指定或 original 返回原始文件"
+        )
 ):
     """流式播放歌曲 - 支持查询参数认证和Header认证"""
+    if quality and quality != ORIGINAL_QUALITY and quality not in RENDITIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported quality: {quality}"
+        )
 
-    user = None
+    # 认证、数据库查询和文件检查都是阻塞操作，放到线程池中执行，避免阻塞事件循环上的其他播放请求
+    file_path, stat_result, _ = await run_in_threadpool(
+        _load_stream_target,
+        song_id,
+        request.query_params.get("token"),
+        request.headers.get("Authorization")
+    )
 
-    # 方法1: 尝试从查询参数获取token（用于音频播放）
-    token = request.query_params.get("token")
-    if token:
-        try:
-            username = verify_token_string(token)
-            user = get_user_by_token(username, db)
-        except Exception as e:
-            print(f"Token validation error: {e}")
-            pass
+    if quality and quality != ORIGINAL_QUALITY and is_transcoding_available():
+        response = await _transcoded_response(request, file_path, stat_result, quality)
+    else:
+        # 支持完整文件、单区间/多区间和 If-Range 请求，由线程池或零拷贝发送文件内容
+        response = file_response(
+            request,
+            file_path,
+            stat_result,
+            get_audio_media_type(file_path),
+            headers={"Cache-Control": "public, max-age=3600"}
+        )
+
+    # 增加播放次数（仅在返回完整内容的非Range请求时，拖动进度条和 304 缓存验证不计数）
+    # 播放事件先写入缓冲区，由后台线程批量更新数据库
+    if not request.headers.get('range') and response.status_code == status.HTTP_200_OK:
+        record_play(song_id)
+    return response
 
-    # 方法2: 如果查询参数认证失败，尝试从Authorization头获取token
-    if not user:
-        try:
-            auth_header = request.headers.get("Authorization")
-            if auth_header and auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-                username = verify_token_string(token)
-                user = get_user_by_token(username, db)
-        except Exception as e:
-            print(f"Authorization header error: {e}")
-            pass
 
-    # 如果两种认证方式都失败
-    if not user:
+async def _transcoded_response(request: Request, file_path: str, stat_result: os.stat_result, quality: str):
+    """返回转码后的音频：已缓存时按普通文件返回（支持 Range），否则边转码边返回"""
+    try:
+        target = await run_in_threadpool(get_transcoder().prepare, file_path, stat_result, quality)
+    except TranscodeError as e:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Authentication required"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
         )
 
-    # 获取歌曲信息
-    song = crud.get_song(db, song_id=song_id)
-    if song is None:
+    media_type = rendition_media_type(quality)
+    if isinstance(target, TranscodeJob):
+        # 首次请求：转码尚未完成，长度未知，不支持 Range
+        return StreamingResponse(
+            target.stream(),
+            media_type=media_type,
+            headers={"Cache-Control": "no-store", "Accept-Ranges": "none", "X-Transcode": "MISS"}
+        )
+
+    rendition_path, rendition_stat = target
+    return file_response(
+        request,
+        rendition_path,
+        rendition_stat,
+        media_type,
+        headers={"Cache-Control": "public, max-age=3600", "X-Transcode": "HIT"}
+    )
+
+
+@router.get("/{song_id}/hls.m3u8")
+async def get_song_hls_playlist(
+        song_id: int,
+        request: Request
+):
+    """HLS 播放清单：首次请求时切片并缓存，分片地址不需要再次认证"""
+    file_path, stat_result, user_id = await run_in_threadpool(
+        _load_stream_target,
+        song_id,
+        request.query_params.get("token"),
+        request.headers.get("Authorization")
+    )
+    if not is_transcoding_available():
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Song not found"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="HLS streaming is not available"
+        )
+
+    packager = get_hls_packager()
+    try:
+        key = await run_in_threadpool(packager.package, file_path, stat_result)
+        playlist = await run_in_threadpool(packager.playlist, key, "../hls/")
+    except (TranscodeError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Failed to prepare HLS stream: {e}"
         )
 
-    # 检查文件是否存在
-    if not os.path.exists(song.file_path):
+    # 播放器会重新加载清单（重试、切回前台），同一用户短时间内只计一次播放
+    record_session_play(user_id, song_id)
+    return Response(
+        content=playlist,
+        media_type=HLS_PLAYLIST_MEDIA_TYPE,
+        headers={"Cache-Control": "private, no-cache"}
+    )
+
+
+@router.get("/hls/{key}/{segment}")
+def get_song_hls_segment(
+        key: str,
+        segment: str,
+        request: Request
+):
+    """HLS 分片：内容不可变，按静态文件返回"""
+    segment_path = get_hls_packager().segment_path(key, segment)
+    try:
+        stat_result = os.stat(segment_path) if segment_path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Song file not found"
+            detail="Segment not found"
         )
 
-    # 获取Range请求头
-    range_header = request.headers.get('range')
+    return file_response(
+        request,
+        segment_path,
+        stat_result,
+        HLS_SEGMENT_MEDIA_TYPE,
+        headers={"Cache-Control": HLS_SEGMENT_CACHE_CONTROL}
+    )
 
-    # 增加播放次数（仅在非Range请求时，避免拖动进度条时重复计数）
-    if not range_header:
-        crud.increment_play_count(db, song_id=song_id)
 
-    # 获取文件信息
-    file_size = os.path.getsize(song.file_path)
-    file_ext = os.path.splitext(song.file_path)[1].lower()
+@router.get("/{song_id}/waveform")
+async def get_song_waveform(
+        song_id: int,
+        request: Request,
+        resolution: int = Query(1024, ge=1, description="峰值桶数量，返回不小于该值的最小分辨率"),
+        format: str = Query("binary", pattern="^(binary|json)$", description="binary 为 int8 的 (min, max) 交错数组")
+):
+    """获取歌曲波形峰值（用于播放器进度条），没有预先计算时现场计算"""
+    file_path, stat_result, _ = await run_in_threadpool(
+        _load_stream_target,
+        song_id,
+        request.query_params.get("token"),
+        request.headers.get("Authorization")
+    )
+    if not is_waveform_available() or not can_decode(file_path):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Waveform is not available"
+        )
 
-    # 确定媒体类型
-    media_type_map = {
-        '.mp3': 'audio/mpeg',
-        '.flac': 'audio/flac',
-        '.wav': 'audio/wav'
-    }
-    media_type = media_type_map.get(file_ext, 'audio/mpeg')
+    levels = await run_in_threadpool(read_waveform, file_path, stat_result)
+    if levels is None:
+        future = get_waveform_queue().enqueue(file_path)
+        if future is None:
+            # 服务正在关闭，分析进程池已停止
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Waveform is not available"
+            )
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Failed to compute waveform: {e}"
+            )
+        levels = await run_in_threadpool(read_waveform, file_path, stat_result)
+        if levels is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Waveform is not available"
+            )
+
+    available = sorted(levels)
+    chosen = next((level for level in available if level >= resolution), available[-1])
+    # 波形随音频文件变化，ETag 由音频文件和分辨率决定
+    etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}-w{chosen}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": STATIC_CACHE_CONTROL, "X-Waveform-Resolution": str(chosen)}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if format == "json":
+        peaks = list(memoryview(levels[chosen]).cast("b"))
+        response = fast_json_response({"resolution": chosen, "peaks": peaks})
+        response.headers.update(headers)
+        return response
+    return Response(content=levels[chosen], media_type="application/octet-stream", headers=headers)
 
-    # 处理Range请求（支持音频播放器的跳转功能）
 
-    if range_header:
-        # 解析Range头
+@router.get("/{song_id}/cover")
+def get_song_cover(
+        song_id: int,
+        request: Request,
+        size: Optional[int] = Query(None, ge=1, description="缩略图边长，返回 64 / 256 / 640 中不小于该值的一档"),
+        format: Optional[str] = Query(None, pattern="^(webp|jpeg)$", description="缩略图格式，不指定时按 Accept 选择"),
+        v: Optional[str] = Query(None, description="版本号（例如歌曲的 updated_at），带版本号的地址可以永久缓存"),
+        db: Session = Depends(get_db)
+):
+    """获取歌曲封面图片（支持 ETag / Last-Modified 条件请求）"""
+    song = crud.get_song(db, song_id=song_id)
+    if song is None or not song.cover_path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cover not found"
+        )
+
+    try:
+        stat_result = os.stat(song.cover_path)
+    except OSError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cover file not found"
+        )
+
+    cache_control = IMMUTABLE_CACHE_CONTROL if v else STATIC_CACHE_CONTROL
+    if size and is_thumbnail_available():
+        image_format = format or negotiate_thumbnail_format(request.headers.get("accept"))
+        path = thumbnail_path(song.cover_path, pick_thumbnail_size(size), image_format)
         try:
-            range_match = range_header.replace('bytes=', '').split('-')
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if range_match[1] else file_size - 1
-
-            # 确保范围有效
-            start = max(0, start)
-            end = min(file_size - 1, end)
-            content_length = end - start + 1
-
-            def iterfile_range(file_path: str, start: int, end: int):
-                with open(file_path, "rb") as file_like:
-                    file_like.seek(start)
-                    remaining = end - start + 1
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        chunk = file_like.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-
-            headers = {
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Accept-Ranges": "bytes",
-                "Content-Length": str(content_length),
-                "Content-Type": media_type,
-                "Cache-Control": "public, max-age=3600",
-            }
+            thumbnail_stat = os.stat(path)
+        except OSError:
+            thumbnail_stat = None
+        if thumbnail_stat is not None:
+            headers = {"Cache-Control": cache_control}
+            if not format:
+                headers["Vary"] = "Accept"
+            return file_response(request, path, thumbnail_stat, THUMBNAIL_FORMATS[image_format][1], headers=headers)
+        # 缩略图尚未生成：提交任务，这次先返回原图（短时间缓存，之后再请求会得到缩略图）
+        get_thumbnail_queue().enqueue(song.cover_path)
+        cache_control = "public, max-age=60"
+
+    media_type = mimetypes.guess_type(song.cover_path)[0] or "image/jpeg"
+    return file_response(
+        request,
+        song.cover_path,
+        stat_result,
+        media_type,
+        headers={"Cache-Control": cache_control}
+    )
 
-            return StreamingResponse(
-                iterfile_range(song.file_path, start, end),
-                status_code=206,  # Partial Content
-                headers=headers
-            )
-        except (ValueError, IndexError) as e:
-            print(f"Range header parsing error: {e}")
-            # 如果Range头解析失败，返回完整文件
-            pass
-
-    # 返回完整文件
-    def iterfile(file_path: str):
-        with open(file_path, "rb") as file_like:
-            while chunk := file_like.read(8192):
-                yield chunk
-
-    headers = {
-        "Content-Length": str(file_size),
-        "Accept-Ranges": "bytes",
-        "Content-Type": media_type,
-        "Cache-Control": "public, max-age=3600",
-    }
 
-    return StreamingResponse(
-        iterfile(song.file_path),
-        headers=headers
+def _create_uploaded_song(db: Session, upload: IngestedUpload, title: Optional[str],
+                          artist: Optional[str], album: Optional[str]):
+    """提取元数据并创建歌曲记录（在线程池中执行）"""
+    metadata = extract_audio_metadata(upload.file_path)
+
+    # 使用提供的信息（查询参数或表单字段）或元数据
+    song_data = schemas.SongCreate(
+        title=title or upload.fields.get("title") or metadata.get("title", "Unknown Title"),
+        artist=artist or upload.fields.get("artist") or metadata.get("artist", "Unknown Artist"),
+        album=album or upload.fields.get("album") or metadata.get("album", "")
+    )
+
+    return crud.create_song(
+        db=db,
+        song=song_data,
+        file_path=upload.file_path,
+        file_size=upload.file_size,
+        duration=metadata.get("duration", 0),
+        content_hash=upload.content_hash
     )
 
 
-@router.post("/", response_model=schemas.Song)
-def upload_song(
-        file: UploadFile = File(...),
+@router.post("/", response_model=schemas.SongUploadResult, status_code=status.HTTP_201_CREATED, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "title": {"type": "string"},
+                        "artist": {"type": "string"},
+                        "album": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+})
+async def upload_song(
+        request: Request,
+        response: Response,
         title: Optional[str] = None,
         artist: Optional[str] = None,
         album: Optional[str] = None,
+        dedupe: bool = Query(True),
         db: Session = Depends(get_db),
         current_user: schemas.User = Depends(get_current_user)
 ):
-    """上传歌曲文件"""
-    # 验证文件格式
-    if not is_valid_audio_file(file.filename):
+    """上传歌曲文件
+
+    请求体以流的方式直接写入音频目录，同时计算哈希并检查大小，
+    超过限制时立即中止，不会先缓存整个文件。
+    创建新歌曲时返回 201；dedupe 为 true 且已有内容相同的歌曲时，删除本次上传的文件，
+    返回 200 和已有歌曲（duplicate 为 true）。
+    """
+    try:
+        upload = await receive_audio_upload(request, AUDIO_DIR, MAX_AUDIO_SIZE)
+    except UnsupportedUploadError as e:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-            detail="Unsupported audio format"
+            detail=str(e)
         )
-
-    # 检查文件大小
-    file.file.seek(0, 2)  # 移动到文件末尾
-    file_size = file.file.tell()
-    file.file.seek(0)  # 重置到开头
-
-    if file_size > MAX_AUDIO_SIZE:
+    except UploadTooLargeError as e:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="File too large"
+            detail=str(e)
         )
-
-    try:
-        # 保存文件
-        file_path = save_uploaded_file(file, AUDIO_DIR)
-
-        # 提取元数据
-        metadata = extract_audio_metadata(file_path)
-
-        # 使用提供的信息或元数据
-        song_data = schemas.SongCreate(
-            title=title or metadata.get("title", "Unknown Title"),
-            artist=artist or metadata.get("artist", "Unknown Artist"),
-            album=album or metadata.get("album", "")
+    except UploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
 
-        # 创建歌曲记录
-        song = crud.create_song(
-            db=db,
-            song=song_data,
-            file_path=file_path,
-            file_size=file_size,
-            duration=metadata.get("duration", 0)
-        )
-
-        # 尝试获取封面
-        try:
-            cover_url, cover_path = refresh_song_cover(
-                song.id, song.title, song.artist, song.album
-            )
-            if cover_url or cover_path:
-                crud.update_song_cover(db, song.id, cover_url, cover_path)
-                db.refresh(song)
-        except Exception as e:
-            print(f"Failed to get cover for song {song.id}: {e}")
-
-        return song
+    if dedupe:
+        existing = await run_in_threadpool(crud.get_song_by_hash, db, upload.content_hash)
+        if existing is not None:
+            # 重复音频：不保存副本，跳过元数据提取和封面获取
+            await run_in_threadpool(delete_file, upload.file_path)
+            response.status_code = status.HTTP_200_OK
+            result = schemas.SongUploadResult.model_validate(existing)
+            result.duplicate = True
+            return result
 
+    try:
+        song = await run_in_threadpool(_create_uploaded_song, db, upload, title, artist, album)
     except Exception as e:
         # 如果出错，清理已保存的文件
-        if 'file_path' in locals() and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except:
-                pass
+        await run_in_threadpool(delete_file, upload.file_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload song: {str(e)}"
         )
 
+    # 封面和波形在后台生成，上传请求立即返回
+    get_cover_job_queue().enqueue(song.id)
+    get_waveform_queue().enqueue(song.file_path)
+    get_loudness_queue().enqueue(song.id, song.file_path)
+
+    return song
+
 
 @router.put("/{song_id}", response_model=schemas.Song)
 def update_song(
@@ -322,6 +610,21 @@ def delete_song(
     )
 
 
+@router.get("/{song_id}/cover/status", response_model=schemas.CoverJobStatus)
+def get_cover_job_status(
+        song_id: int,
+        current_user: schemas.User = Depends(get_current_user)
+):
+    """获取歌曲封面获取任务的状态"""
+    job = get_cover_job_queue().get_status(song_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cover job not found"
+        )
+    return job
+
+
 @router.post("/{song_id}/cover/refresh", response_model=schemas.Song)
 def refresh_cover(
         song_id: int,
@@ -337,8 +640,9 @@ def refresh_cover(
         )
 
     try:
+        # 手动刷新时忽略封面缓存重新下载
         cover_url, cover_path = refresh_song_cover(
-            song.id, song.title, song.artist, song.album
+            db, song.id, song.title, song.artist, song.album, force=True
         )
         updated_song = crud.update_song_cover(db, song.id, cover_url, cover_path)
         return updated_song
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -9,12 +10,22 @@ from sqlalchemy.orm import Session
 from database import get_db
 import crud
 import schemas
+from utils.cache import TTLCache
 
 # JWT配置
 SECRET_KEY = "melody-commons-secret-key-2025-09-01-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30天
 
+# 认证缓存：token -> 用户名（不超过 token 的 exp），用户名 -> 用户信息
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 10 * 60
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60
+
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # 密码加密
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -54,6 +65,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token_string(token: str) -> str:
     """验证token字符串"""
+    username = _token_cache.get(token)
+    if username is not None:
+        return username
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -62,6 +77,11 @@ def verify_token_string(token: str) -> str:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token: no username"
             )
+
+        # 缓存时间不超过 token 的剩余有效期
+        exp = payload.get("exp")
+        ttl = TOKEN_CACHE_TTL if exp is None else min(TOKEN_CACHE_TTL, exp - time.time())
+        _token_cache.set(token, username, ttl=ttl)
         return username
     except JWTError as e:
         print(f"JWT Error: {e}")
@@ -71,9 +91,32 @@ def verify_token_string(token: str) -> str:
         )
 
 
+def lookup_user(db: Session, username: str) -> Optional[schemas.User]:
+    """根据用户名获取用户信息（优先读取缓存）"""
+    user = _user_cache.get(username)
+    if user is not None:
+        return user
+
+    db_user = crud.get_user_by_username(db, username=username)
+    if db_user is None:
+        return None
+    user = schemas.User.model_validate(db_user)
+    _user_cache.set(username, user)
+    return user
+
+
+def invalidate_user_cache(username: Optional[str] = None):
+    """用户信息变更时清除缓存；不指定用户名时清空全部认证缓存"""
+    if username is None:
+        _token_cache.clear()
+        _user_cache.clear()
+    else:
+        _user_cache.delete(username)
+
+
 def get_user_by_token(username: str, db: Session) -> schemas.User:
     """通过token获取用户"""
-    user = crud.get_user_by_username(db, username=username)
+    user = lookup_user(db, username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,7 +136,7 @@ def get_current_user(
         db: Session = Depends(get_db)
 ) -> schemas.User:
     """获取当前用户"""
-    user = crud.get_user_by_username(db, username=username)
+    user = lookup_user(db, username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
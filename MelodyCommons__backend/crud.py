@@ -1,12 +1,25 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, update, case
+from sqlalchemy.exc import IntegrityError
 import models
 import schemas
-from auth import hash_password
+from auth import hash_password, invalidate_user_cache
+from utils.search import get_search_index
+from utils.popularity import get_top_songs, get_leaderboard
+from utils.response_cache import invalidate_songs, invalidate_playlist
+from utils.waveform import remove_waveform
+from utils.thumbnails import remove_thumbnails
+from utils.file import is_library_file
+from utils.pagination import (
+    paginate_keyset, SONG_SORT_COLUMNS, DEFAULT_SONG_SORT, PLAYLIST_SONG_SORT, PLAYLIST_SONG_COLUMNS,
+    PLAYLIST_SORT, PLAYLIST_COLUMNS
+)
 import os
-import random
 from typing import Optional, List, Dict
 
+# 歌单内歌曲排序值的间隔：在两首歌之间插入时取中间值，间隔用完时重新编号
+PLAYLIST_ORDER_GAP = 1024
+
 
 # 用户CRUD
 def create_user(db: Session, user: schemas.UserCreate):
@@ -18,6 +31,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.username)
     return db_user
 
 
@@ -32,35 +46,89 @@ def get_user(db: Session, user_id: int):
 
 
 # 歌曲CRUD
-def create_song(db: Session, song: schemas.SongCreate, file_path: str, file_size: int, duration: int = 0):
-    """创建歌曲"""
+def create_song(db: Session, song: schemas.SongCreate, file_path: str, file_size: int, duration: int = 0,
+                content_hash: Optional[str] = None):
+    """创建歌曲；文件监听已为同一文件创建记录时，用本次提供的信息更新该记录"""
     db_song = models.Song(
         title=song.title,
         artist=song.artist,
         album=song.album,
         duration=duration,
         file_path=file_path,
-        file_size=file_size
+        file_size=file_size,
+        content_hash=content_hash
     )
     db.add(db_song)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 上传的文件改名到音频目录后，文件监听可能先写入了记录
+        db.rollback()
+        db_song = db.query(models.Song).filter(models.Song.file_path == file_path).first()
+        if db_song is None:
+            raise
+        db_song.title = song.title
+        db_song.artist = song.artist
+        db_song.album = song.album
+        db_song.duration = duration
+        db_song.file_size = file_size
+        db_song.content_hash = content_hash
+        db.commit()
     db.refresh(db_song)
+    invalidate_songs()
+    get_search_index().index_song(db, db_song)
+    get_leaderboard().record_play(db_song.id, db_song.play_count)
     return db_song
 
 
+def get_song_by_hash(db: Session, content_hash: str):
+    """根据音频内容哈希查找歌曲"""
+    return db.query(models.Song).filter(
+        models.Song.content_hash == content_hash
+    ).order_by(models.Song.id).first()
+
+
+def _songs_query(db: Session, search: Optional[str] = None, skip: int = 0, limit: int = 100):
+    query = db.query(models.Song)
+
+    if search:
+        # 使用全文索引并按相关度排序分页
+        return get_search_index().page(db, query, search, skip, limit)
+    return query.order_by(desc(models.Song.created_at), desc(models.Song.id)).offset(skip).limit(limit)
+
+
 def get_songs(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None):
     """获取歌曲列表（支持搜索和分页）"""
-    query = db.query(models.Song)
+    return _songs_query(db, search, skip, limit).all()
+
 
+def get_song_rows(db: Session, columns: List, skip: int = 0, limit: int = 100, search: Optional[str] = None):
+    """按列查询歌曲列表，返回元组（不构造 ORM 对象）"""
+    return _songs_query(db, search, skip, limit).with_entities(*columns).all()
+
+
+def _songs_page(db: Session, query, limit: int, search: Optional[str], sort: str, cursor: Optional[str]):
+    sort_columns = SONG_SORT_COLUMNS[sort]
     if search:
-        search_filter = f"%{search}%"
-        query = query.filter(
-            (models.Song.title.like(search_filter)) |
-            (models.Song.artist.like(search_filter)) |
-            (models.Song.album.like(search_filter))
-        )
+        # 游标模式下按排序键排序，搜索只作为过滤条件
+        return get_search_index().keyset_page(db, query, search, sort_columns, sort, limit, cursor)
+    return paginate_keyset(query, sort_columns, sort, limit, cursor)
 
-    return query.offset(skip).limit(limit).all()
+
+def get_songs_page(db: Session, limit: int = 50, search: Optional[str] = None,
+                   sort: str = DEFAULT_SONG_SORT, cursor: Optional[str] = None):
+    """按游标获取歌曲列表，返回(歌曲列表, 下一页游标)"""
+    return _songs_page(db, db.query(models.Song), limit, search, sort, cursor)
+
+
+def get_song_rows_page(db: Session, columns: List, limit: int = 50, search: Optional[str] = None,
+                       sort: str = DEFAULT_SONG_SORT, cursor: Optional[str] = None):
+    """按列、按游标查询歌曲列表，返回(元组列表, 下一页游标)
+
+    排序键会追加在所选列之后，用于生成下一页游标。
+    """
+    query = db.query(models.Song).with_entities(*columns, *SONG_SORT_COLUMNS[sort])
+    return _songs_page(db, query, limit, search, sort, cursor)
 
 
 def get_song(db: Session, song_id: int):
@@ -70,54 +138,88 @@ def get_song(db: Session, song_id: int):
 
 def increment_play_count(db: Session, song_id: int):
     """增加歌曲播放次数"""
-    db_song = db.query(models.Song).filter(models.Song.id == song_id).first()
-    if db_song:
-        db_song.play_count += 1
-        db.commit()
-        db.refresh(db_song)
-    return db_song
+    add_play_counts(db, {song_id: 1})
+    update_leaderboard_scores(db, [song_id])
+    return get_song(db, song_id=song_id)
+
+
+def add_play_counts(db: Session, play_counts: Dict[int, int]):
+    """批量累加播放次数，play_counts 为 {歌曲ID: 增量}
+
+    只执行 UPDATE 并提交：抛出异常表示播放次数没有写入，可以重试；
+    排行榜由 update_leaderboard_scores 单独更新。
+    """
+    # 按增量分组，每组一条 UPDATE ... SET play_count = play_count + n
+    groups: Dict[int, List[int]] = {}
+    for song_id, count in play_counts.items():
+        groups.setdefault(count, []).append(song_id)
+
+    for count, song_ids in groups.items():
+        db.execute(
+            update(models.Song)
+            .where(models.Song.id.in_(song_ids))
+            .values(play_count=models.Song.play_count + count)
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+
+
+def update_leaderboard_scores(db: Session, song_ids: List[int]):
+    """播放次数写入后更新排行榜；失败时让排行榜失效（下次读取时重新加载），不影响已写入的播放次数"""
+    leaderboard = get_leaderboard()
+    try:
+        rows = db.query(models.Song.id, models.Song.play_count).filter(models.Song.id.in_(song_ids)).all()
+        for row in rows:
+            leaderboard.record_play(row.id, row.play_count)
+    except Exception as e:
+        print(f"Failed to update leaderboard: {e}")
+        db.rollback()
+        leaderboard.invalidate()
 
 
 def get_popular_songs(db: Session, limit: int = 10):
     """获取热门歌曲（按播放次数排序，播放次数相同时随机选择）"""
-    # 首先获取所有歌曲并按播放次数分组
-    all_songs = db.query(models.Song).order_by(desc(models.Song.play_count)).all()
-
-    if not all_songs:
-        return []
-
-    # 如果歌曲总数小于等于限制，直接返回所有歌曲并随机打乱顺序
-    if len(all_songs) <= limit:
-        random.shuffle(all_songs)
-        return all_songs
-
-    # 按播放次数分组
-    play_count_groups = {}
-    for song in all_songs:
-        count = song.play_count
-        if count not in play_count_groups:
-            play_count_groups[count] = []
-        play_count_groups[count].append(song)
-
-    # 从高到低遍历播放次数，随机选择歌曲直到达到limit
-    result = []
-    for count in sorted(play_count_groups.keys(), reverse=True):
-        songs_in_group = play_count_groups[count]
-        random.shuffle(songs_in_group)  # 随机打乱同播放次数的歌曲
-
-        if len(result) + len(songs_in_group) <= limit:
-            # 如果整组都可以加入，全部加入
-            result.extend(songs_in_group)
-        else:
-            # 否则只加入需要的数量
-            remaining = limit - len(result)
-            result.extend(songs_in_group[:remaining])
-            break
+    return get_top_songs(db, limit=limit)
 
-        if len(result) >= limit:
-            break
 
-    return result
+def release_cover_file(db: Session, cover_path: Optional[str]):
+    """封面文件不再被任何歌曲引用时删除（同专辑的歌曲共享同一个封面文件）"""
+    if not cover_path:
+        return
+    references = db.query(func.count(models.Song.id)).filter(models.Song.cover_path == cover_path).scalar()
+    if references:
+        return
+
+    db.query(models.CoverCache).filter(models.CoverCache.cover_path == cover_path).delete(synchronize_session=False)
+    db.commit()
+    if os.path.exists(cover_path):
+        os.remove(cover_path)
+    remove_thumbnails(cover_path)
+
+
+def get_cover_cache_entry(db: Session, lookup_key: str):
+    """获取封面缓存条目"""
+    return db.query(models.CoverCache).filter(models.CoverCache.lookup_key == lookup_key).first()
+
+
+def set_cover_cache_entry(db: Session, lookup_key: str, cover_path: Optional[str], expires_at=None):
+    """写入封面缓存条目，cover_path 为空表示查询不到封面"""
+    entry = get_cover_cache_entry(db, lookup_key)
+    if entry is None:
+        entry = models.CoverCache(lookup_key=lookup_key, cover_path=cover_path, expires_at=expires_at)
+        db.add(entry)
+        try:
+            db.commit()
+            return entry
+        except IntegrityError:
+            # 其他线程已写入同一个键
+            db.rollback()
+            entry = get_cover_cache_entry(db, lookup_key)
+
+    entry.cover_path = cover_path
+    entry.expires_at = expires_at
+    db.commit()
+    return entry
 
 
 def update_song(db: Session, song_id: int, song_update: schemas.SongUpdate):
@@ -132,17 +234,18 @@ def update_song(db: Session, song_id: int, song_update: schemas.SongUpdate):
             setattr(db_song, field, value)
 
         db.commit()
+        invalidate_songs()
         db.refresh(db_song)
+        get_search_index().index_song(db, db_song)
 
         # Check if file_path has changed and delete the old file
         if "file_path" in update_data and old_file_path and old_file_path != db_song.file_path:
             if os.path.exists(old_file_path):
                 os.remove(old_file_path)
 
-        # Check if cover_path has changed and delete the old cover
+        # Check if cover_path has changed and release the old cover
         if "cover_path" in update_data and old_cover_path and old_cover_path != db_song.cover_path:
-            if os.path.exists(old_cover_path):
-                os.remove(old_cover_path)
+            release_cover_file(db, old_cover_path)
 
     return db_song
 
@@ -157,12 +260,19 @@ def update_song_cover(db: Session, song_id: int, cover_url: str = None, cover_pa
             db_song.cover_url = cover_url
         if cover_path:
             db_song.cover_path = cover_path
+            db.flush()
+            # 封面文件可能刚被 release_cover_file 删除（最后一首引用它的歌曲被删除或换了封面），
+            # flush 后本歌曲已计入引用数，再确认文件仍存在
+            if not os.path.exists(cover_path):
+                print(f"封面文件 {cover_path} 已被删除，保留歌曲 {song_id} 原有的封面")
+                db.rollback()
+                return db.query(models.Song).filter(models.Song.id == song_id).first()
         db.commit()
+        invalidate_songs()
         db.refresh(db_song)
 
         if cover_path and old_cover_path and old_cover_path != cover_path:
-            if os.path.exists(old_cover_path):
-                os.remove(old_cover_path)
+            release_cover_file(db, old_cover_path)
     return db_song
 
 
@@ -173,12 +283,14 @@ def delete_song(db: Session, song_id: int, attempt: int = 0):
         # 如果在重试期间，其他请求已经删除了它，也视为成功
         return True
 
-    # 尝试删除物理文件
+    # 尝试删除物理文件（封面可能被其他歌曲共享，删除记录后按引用数清理）
+    # 音频目录之外的文件是批量导入时引用的用户原文件，只删除记录和波形缓存，不删除文件
+    cover_path = db_song.cover_path
     try:
-        if db_song.file_path and os.path.exists(db_song.file_path):
+        if db_song.file_path and is_library_file(db_song.file_path) and os.path.exists(db_song.file_path):
             os.remove(db_song.file_path)
-        if db_song.cover_path and os.path.exists(db_song.cover_path):
-            os.remove(db_song.cover_path)
+        if db_song.file_path:
+            remove_waveform(db_song.file_path)
     except Exception as e:
         # 只在第一次尝试时打印错误，避免重试时信息泛滥
         if attempt == 0:
@@ -189,6 +301,14 @@ def delete_song(db: Session, song_id: int, attempt: int = 0):
     # 文件删除成功后，才删除数据库记录
     db.delete(db_song)
     db.commit()
+    invalidate_songs()
+    get_search_index().remove_song(db, song_id)
+    get_leaderboard().discard(song_id)
+
+    try:
+        release_cover_file(db, cover_path)
+    except Exception as e:
+        print(f"Error deleting cover: {e}")
     return True
 
 
@@ -201,6 +321,7 @@ def create_playlist(db: Session, playlist: schemas.PlaylistCreate):
     )
     db.add(db_playlist)
     db.commit()
+    invalidate_playlist()
     db.refresh(db_playlist)
     return db_playlist
 
@@ -210,6 +331,48 @@ def get_playlists(db: Session):
     return db.query(models.Playlist).order_by(desc(models.Playlist.created_at)).all()
 
 
+def get_playlists_page(db: Session, limit: int = 50, cursor: Optional[str] = None):
+    """按游标获取歌单列表，返回(歌单列表, 下一页游标)"""
+    query = db.query(models.Playlist)
+    return paginate_keyset(query, PLAYLIST_COLUMNS, PLAYLIST_SORT, limit, cursor)
+
+
+def get_playlist_stats(db: Session, playlist_ids: List[int]) -> Dict[int, Dict]:
+    """用一条分组查询统计歌单的歌曲数、总时长和代表封面（ID 最小的有封面的歌曲）"""
+    if not playlist_ids:
+        return {}
+    rows = db.query(
+        models.PlaylistSong.playlist_id,
+        func.count(models.PlaylistSong.id),
+        func.coalesce(func.sum(models.Song.duration), 0),
+        func.min(case((models.Song.cover_path.isnot(None), models.Song.id)))
+    ).join(
+        models.Song, models.Song.id == models.PlaylistSong.song_id
+    ).filter(
+        models.PlaylistSong.playlist_id.in_(playlist_ids)
+    ).group_by(models.PlaylistSong.playlist_id).all()
+    return {
+        playlist_id: {"song_count": song_count, "total_duration": int(total_duration), "cover_song_id": cover_song_id}
+        for playlist_id, song_count, total_duration, cover_song_id in rows
+    }
+
+
+def build_playlist_summaries(db: Session, playlists: List[models.Playlist]) -> List[schemas.PlaylistSummary]:
+    """为歌单附加统计信息"""
+    stats = get_playlist_stats(db, [playlist.id for playlist in playlists])
+    empty = {"song_count": 0, "total_duration": 0, "cover_song_id": None}
+    return [
+        schemas.PlaylistSummary(
+            id=playlist.id,
+            name=playlist.name,
+            description=playlist.description,
+            created_at=playlist.created_at,
+            **stats.get(playlist.id, empty)
+        )
+        for playlist in playlists
+    ]
+
+
 def get_playlist(db: Session, playlist_id: int):
     """根据ID获取歌单"""
     return db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
@@ -230,6 +393,7 @@ def update_playlist(db: Session, playlist_id: int, playlist_update: schemas.Play
         for field, value in update_data.items():
             setattr(db_playlist, field, value)
         db.commit()
+        invalidate_playlist(playlist_id)
         db.refresh(db_playlist)
     return db_playlist
 
@@ -240,11 +404,20 @@ def delete_playlist(db: Session, playlist_id: int):
     if db_playlist:
         db.delete(db_playlist)
         db.commit()
+        invalidate_playlist(playlist_id)
         return True
     return False
 
 
 # 歌单歌曲关联CRUD
+def _next_playlist_order(db: Session, playlist_id: int) -> int:
+    """歌单末尾的下一个排序值"""
+    max_order = db.query(func.max(models.PlaylistSong.order_index)).filter(
+        models.PlaylistSong.playlist_id == playlist_id
+    ).scalar()
+    return 0 if max_order is None else max_order + PLAYLIST_ORDER_GAP
+
+
 def add_song_to_playlist(db: Session, playlist_id: int, song_id: int, order_index: int = None):
     """添加歌曲到歌单"""
     # 检查是否已存在
@@ -256,24 +429,63 @@ def add_song_to_playlist(db: Session, playlist_id: int, song_id: int, order_inde
     if existing:
         return None  # 已存在
 
-    # 如果没有指定顺序，添加到末尾
-    if order_index is None:
-        max_order = db.query(func.max(models.PlaylistSong.order_index)).filter(
+    # order_index 为歌单中的位置（从 0 开始），记下当前位于该位置的歌曲
+    before_song_id = None
+    if order_index is not None:
+        before_song_id = db.query(models.PlaylistSong.song_id).filter(
             models.PlaylistSong.playlist_id == playlist_id
-        ).scalar() or -1
-        order_index = max_order + 1
+        ).order_by(
+            models.PlaylistSong.order_index, models.PlaylistSong.id
+        ).offset(max(order_index, 0)).limit(1).scalar()
 
+    # 先添加到末尾
     db_playlist_song = models.PlaylistSong(
         playlist_id=playlist_id,
         song_id=song_id,
-        order_index=order_index
+        order_index=_next_playlist_order(db, playlist_id)
     )
     db.add(db_playlist_song)
     db.commit()
+    invalidate_playlist(playlist_id)
+
+    # 指定了位置时移动到该位置的歌曲之前（排序值取前后两首歌的中间值）
+    if before_song_id is not None:
+        moved = move_playlist_song(db, playlist_id, song_id, before_song_id=before_song_id)
+        if moved is not None:
+            return moved
     db.refresh(db_playlist_song)
     return db_playlist_song
 
 
+def add_songs_to_playlist(db: Session, playlist_id: int, song_ids: List[int]):
+    """批量添加歌曲到歌单末尾（单个事务），返回(已添加, 已存在, 不存在)的歌曲ID"""
+    song_ids = list(dict.fromkeys(song_ids))
+
+    # 一次查询校验歌曲是否存在、是否已在歌单中
+    valid_ids = {song_id for song_id, in db.query(models.Song.id).filter(models.Song.id.in_(song_ids))}
+    existing_ids = {song_id for song_id, in db.query(models.PlaylistSong.song_id).filter(
+        models.PlaylistSong.playlist_id == playlist_id,
+        models.PlaylistSong.song_id.in_(song_ids)
+    )}
+
+    not_found = [song_id for song_id in song_ids if song_id not in valid_ids]
+    skipped = [song_id for song_id in song_ids if song_id in existing_ids]
+    to_add = [song_id for song_id in song_ids if song_id in valid_ids and song_id not in existing_ids]
+    if not to_add:
+        return [], skipped, not_found
+
+    start = _next_playlist_order(db, playlist_id)
+
+    # 不需要取回主键，使用 executemany 一次写入
+    db.bulk_insert_mappings(models.PlaylistSong, [
+        {"playlist_id": playlist_id, "song_id": song_id, "order_index": start + offset * PLAYLIST_ORDER_GAP}
+        for offset, song_id in enumerate(to_add)
+    ])
+    db.commit()
+    invalidate_playlist(playlist_id)
+    return to_add, skipped, not_found
+
+
 def remove_song_from_playlist(db: Session, playlist_id: int, song_id: int):
     """从歌单移除歌曲"""
     db_playlist_song = db.query(models.PlaylistSong).filter(
@@ -284,32 +496,166 @@ def remove_song_from_playlist(db: Session, playlist_id: int, song_id: int):
     if db_playlist_song:
         db.delete(db_playlist_song)
         db.commit()
+        invalidate_playlist(playlist_id)
         return True
     return False
 
 
+def remove_songs_from_playlist(db: Session, playlist_id: int, song_ids: List[int]):
+    """批量从歌单移除歌曲（单条 DELETE），返回(已移除, 不在歌单中)的歌曲ID"""
+    song_ids = list(dict.fromkeys(song_ids))
+    query = db.query(models.PlaylistSong).filter(
+        models.PlaylistSong.playlist_id == playlist_id,
+        models.PlaylistSong.song_id.in_(song_ids)
+    )
+    present = {song_id for song_id, in query.with_entities(models.PlaylistSong.song_id)}
+    if present:
+        query.delete(synchronize_session=False)
+        db.commit()
+        invalidate_playlist(playlist_id)
+
+    removed = [song_id for song_id in song_ids if song_id in present]
+    skipped = [song_id for song_id in song_ids if song_id not in present]
+    return removed, skipped
+
+
 def get_playlist_songs(db: Session, playlist_id: int):
     """获取歌单内的歌曲（按顺序）"""
     return db.query(models.PlaylistSong).options(
         joinedload(models.PlaylistSong.song)
     ).filter(
         models.PlaylistSong.playlist_id == playlist_id
-    ).order_by(models.PlaylistSong.order_index).all()
+    ).order_by(models.PlaylistSong.order_index, models.PlaylistSong.id).all()
+
+
+def get_playlist_song_rows(db: Session, playlist_id: int, song_columns: List,
+                           limit: Optional[int] = None, cursor: Optional[str] = None):
+    """按列查询歌单内的歌曲，每行为 (order_index, id, added_at, 歌曲列...)
+
+    limit 为空时返回全部歌曲（按顺序），否则按游标分页并返回(元组列表, 下一页游标)
+    """
+    query = db.query(
+        models.PlaylistSong.order_index, models.PlaylistSong.id, models.PlaylistSong.added_at, *song_columns
+    ).join(
+        models.Song, models.Song.id == models.PlaylistSong.song_id
+    ).filter(
+        models.PlaylistSong.playlist_id == playlist_id
+    )
+    if limit is None:
+        return query.order_by(*PLAYLIST_SONG_COLUMNS).all()
+    return paginate_keyset(query, PLAYLIST_SONG_COLUMNS, PLAYLIST_SONG_SORT, limit, cursor, descending=False)
+
+
+def get_playlist_songs_page(db: Session, playlist_id: int, limit: int = 100, cursor: Optional[str] = None):
+    """按游标获取歌单内的歌曲，返回(歌单歌曲列表, 下一页游标)"""
+    query = db.query(models.PlaylistSong).options(
+        joinedload(models.PlaylistSong.song)
+    ).filter(
+        models.PlaylistSong.playlist_id == playlist_id
+    )
+    return paginate_keyset(query, PLAYLIST_SONG_COLUMNS, PLAYLIST_SONG_SORT, limit, cursor, descending=False)
 
 
 def update_playlist_song_order(db: Session, playlist_id: int, song_orders: List[Dict]):
-    """更新歌单内歌曲顺序"""
-    for order_data in song_orders:
-        song_id = order_data.get("song_id")
-        order_index = order_data.get("order_index")
+    """更新歌单内歌曲顺序（单条 CASE UPDATE）"""
+    orders = {
+        order_data["song_id"]: order_data["order_index"]
+        for order_data in song_orders
+        if order_data.get("song_id") is not None and order_data.get("order_index") is not None
+    }
+    if not orders:
+        return True
 
-        db_playlist_song = db.query(models.PlaylistSong).filter(
+    # 按给定顺序拉开间隔，之后的单曲移动无需重新编号
+    db.execute(
+        update(models.PlaylistSong)
+        .where(
             models.PlaylistSong.playlist_id == playlist_id,
-            models.PlaylistSong.song_id == song_id
-        ).first()
+            models.PlaylistSong.song_id.in_(list(orders))
+        )
+        .values(order_index=case(
+            {song_id: order_index * PLAYLIST_ORDER_GAP for song_id, order_index in orders.items()},
+            value=models.PlaylistSong.song_id
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    invalidate_playlist(playlist_id)
+    return True
 
-        if db_playlist_song:
-            db_playlist_song.order_index = order_index
 
+def rebalance_playlist_order(db: Session, playlist_id: int):
+    """按当前顺序重新编号，使相邻歌曲之间恢复间隔（单条 CASE UPDATE）"""
+    row_ids = [row_id for row_id, in db.query(models.PlaylistSong.id).filter(
+        models.PlaylistSong.playlist_id == playlist_id
+    ).order_by(models.PlaylistSong.order_index, models.PlaylistSong.id)]
+    if not row_ids:
+        return
+    db.execute(
+        update(models.PlaylistSong)
+        .where(models.PlaylistSong.id.in_(row_ids))
+        .values(order_index=case(
+            {row_id: position * PLAYLIST_ORDER_GAP for position, row_id in enumerate(row_ids)},
+            value=models.PlaylistSong.id
+        ))
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
-    return True
+    invalidate_playlist(playlist_id)
+
+
+def move_playlist_song(db: Session, playlist_id: int, song_id: int, before_song_id: Optional[int] = None):
+    """将歌曲移动到另一首歌之前（before_song_id 为空时移到末尾），只更新被移动的一行
+
+    返回更新后的歌单歌曲；歌曲不在歌单中时返回 None
+    """
+    item = db.query(models.PlaylistSong).filter(
+        models.PlaylistSong.playlist_id == playlist_id,
+        models.PlaylistSong.song_id == song_id
+    ).first()
+    if item is None:
+        return None
+    if before_song_id == song_id:
+        return item
+
+    for attempt in range(2):
+        if before_song_id is None:
+            new_order = db.query(func.max(models.PlaylistSong.order_index)).filter(
+                models.PlaylistSong.playlist_id == playlist_id,
+                models.PlaylistSong.id != item.id
+            ).scalar()
+            new_order = 0 if new_order is None else new_order + PLAYLIST_ORDER_GAP
+        else:
+            before = db.query(models.PlaylistSong).filter(
+                models.PlaylistSong.playlist_id == playlist_id,
+                models.PlaylistSong.song_id == before_song_id
+            ).first()
+            if before is None:
+                return None
+
+            # 目标位置前一首歌（按 (order_index, id) 排序，排除被移动的歌曲）
+            previous = db.query(models.PlaylistSong.order_index).filter(
+                models.PlaylistSong.playlist_id == playlist_id,
+                models.PlaylistSong.id != item.id,
+                (models.PlaylistSong.order_index < before.order_index) |
+                ((models.PlaylistSong.order_index == before.order_index) & (models.PlaylistSong.id < before.id))
+            ).order_by(desc(models.PlaylistSong.order_index), desc(models.PlaylistSong.id)).first()
+
+            if previous is None:
+                new_order = before.order_index - PLAYLIST_ORDER_GAP
+            elif before.order_index - previous.order_index > 1:
+                new_order = (previous.order_index + before.order_index) // 2
+            elif attempt == 0:
+                # 间隔已用完，重新编号后再计算
+                rebalance_playlist_order(db, playlist_id)
+                db.refresh(item)
+                continue
+            else:
+                return None
+        break
+
+    item.order_index = new_order
+    db.commit()
+    invalidate_playlist(playlist_id)
+    db.refresh(item)
+    return item
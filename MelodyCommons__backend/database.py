@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import pymysql
@@ -41,3 +41,28 @@ def get_db():
 # 创建数据库表
 def create_tables():
     Base.metadata.create_all(bind=engine)
+
+    # create_all 不会修改已有的表，新增的列需要单独补建
+    add_missing_columns()
+
+    # create_all 只会为新建的表创建索引，已有的表需要单独补建
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def add_missing_columns():
+    """为已有的表补建模型中新增的列（新增列必须允许为空）"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL"))
+                print(f"已为表 {table.name} 添加列 {column.name}")
@@ -0,0 +1,230 @@
+"""批量导入本地音乐库
+
+用法: python import_library.py <音乐目录> [--copy] [--workers N] [--batch-size N] [--no-hash]
+
+在进程池中并行提取元数据和内容哈希，按批写入 songs 表。每批单独提交，
+已导入的文件（相同路径、相同原始路径或相同内容哈希）会被跳过，因此中断后重新运行即可继续导入。
+使用 --copy 时文件先复制为隐藏的临时文件（文件监听和同步会忽略），本批提交后再改为正式文件名。
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, create_tables
+import models
+from utils.audio import extract_audio_metadata, get_file_hash, is_valid_audio_file
+from utils.file import ensure_directories, generate_unique_filename, AUDIO_DIR
+from utils.search import init_search_index
+
+# 每批写入数据库的歌曲数量
+IMPORT_BATCH_SIZE = 1000
+# 每个工作进程一次领取的文件数量
+IMPORT_CHUNK_SIZE = 64
+
+
+def iter_audio_files(root: str) -> Iterator[str]:
+    """递归遍历目录，返回音频文件的绝对路径"""
+    stack = [os.path.abspath(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and is_valid_audio_file(entry.name):
+                        yield entry.path
+        except OSError as e:
+            print(f"无法读取目录 {directory}: {e}")
+
+
+def probe_file(file_path: str, with_hash: bool = True) -> Optional[dict]:
+    """在工作进程中提取单个文件的元数据和哈希"""
+    try:
+        file_size = os.path.getsize(file_path)
+    except OSError:
+        return None
+    metadata = extract_audio_metadata(file_path)
+    return {
+        "file_path": file_path,
+        "file_size": file_size,
+        "title": metadata.get("title") or os.path.splitext(os.path.basename(file_path))[0],
+        "artist": metadata.get("artist") or "Unknown Artist",
+        "album": metadata.get("album", ""),
+        "duration": metadata.get("duration", 0),
+        "content_hash": get_file_hash(file_path) if with_hash else None,
+    }
+
+
+def _probe_with_hash(file_path: str) -> Optional[dict]:
+    return probe_file(file_path, True)
+
+
+def _probe_without_hash(file_path: str) -> Optional[dict]:
+    return probe_file(file_path, False)
+
+
+def _reserve_target(source_path: str, reserved: Set[str]) -> str:
+    """生成复制后的路径；本批的文件提交后才会出现在目录中，需要同时避开已分配的路径"""
+    target = os.path.join(AUDIO_DIR, generate_unique_filename(AUDIO_DIR, os.path.basename(source_path)))
+    stem, ext = os.path.splitext(target)
+    counter = 1
+    while target in reserved:
+        target = f"{stem}_{counter}{ext}"
+        counter += 1
+    reserved.add(target)
+    return target
+
+
+def _copy_into_library(row: dict, reserved: Set[str], temp_paths: Dict[str, str]) -> dict:
+    """将文件复制为音频目录中的隐藏临时文件，记录使用复制后的正式路径和原始路径"""
+    target = _reserve_target(row["file_path"], reserved)
+    temp_path = os.path.join(AUDIO_DIR, f".import_{uuid.uuid4().hex}.part")
+    shutil.copy2(row["file_path"], temp_path)
+    temp_paths[target] = temp_path
+    return dict(row, file_path=target, source_path=row["file_path"])
+
+
+def _discard_temp_files(temp_paths: Dict[str, str]):
+    for temp_path in temp_paths.values():
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    temp_paths.clear()
+
+
+def _insert_batch(db, batch: List[dict]) -> List[dict]:
+    """批量写入，返回实际写入的行
+
+    导入目录位于 static/audio 时，文件监听可能已经先写入了相同路径的歌曲，
+    此时跳过这些路径后重新写入本批。
+    """
+    try:
+        db.bulk_insert_mappings(models.Song, batch)
+        db.commit()
+        return batch
+    except IntegrityError:
+        db.rollback()
+    paths = [row["file_path"] for row in batch]
+    existing = {path for path, in db.query(models.Song.file_path).filter(models.Song.file_path.in_(paths))}
+    batch = [row for row in batch if row["file_path"] not in existing]
+    if batch:
+        db.bulk_insert_mappings(models.Song, batch)
+        db.commit()
+    return batch
+
+
+def import_library(root: str, copy: bool = False, workers: Optional[int] = None,
+                   batch_size: int = IMPORT_BATCH_SIZE, with_hash: bool = True) -> int:
+    """导入目录下的所有音频文件，返回新增的歌曲数量"""
+    ensure_directories()
+    create_tables()
+
+    db = SessionLocal()
+    # 本批复制的临时文件：正式路径 -> 临时路径
+    temp_paths: Dict[str, str] = {}
+    try:
+        # 已导入的路径（包括复制前的原始路径）和内容哈希，用于断点续传和去重
+        known_paths = {path for path, in db.query(models.Song.file_path)}
+        known_paths.update(
+            path for path, in
+            db.query(models.Song.source_path).filter(models.Song.source_path.isnot(None))
+        )
+        known_hashes = {
+            content_hash for content_hash, in
+            db.query(models.Song.content_hash).filter(models.Song.content_hash.isnot(None))
+        }
+
+        pending_paths = (path for path in iter_audio_files(root) if path not in known_paths)
+        probe = _probe_with_hash if with_hash else _probe_without_hash
+
+        started = time.monotonic()
+        scanned = imported = skipped = 0
+        batch = []
+        reserved: Set[str] = set()
+
+        def flush():
+            nonlocal imported, skipped, batch
+            if not batch:
+                return
+            inserted = _insert_batch(db, batch)
+            # 提交后再改名，文件出现在音频目录时数据库中已有记录
+            inserted_paths = {row["file_path"] for row in inserted}
+            for target in inserted_paths:
+                if target in temp_paths:
+                    os.replace(temp_paths.pop(target), target)
+            _discard_temp_files(temp_paths)
+            reserved.clear()
+            imported += len(inserted)
+            skipped += len(batch) - len(inserted)
+            batch = []
+            elapsed = max(time.monotonic() - started, 1e-6)
+            print(f"已导入 {imported} 首，已处理 {scanned} 个文件，跳过 {skipped} 个，"
+                  f"{scanned / elapsed * 60:.0f} 个文件/分钟")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for row in executor.map(probe, pending_paths, chunksize=IMPORT_CHUNK_SIZE):
+                scanned += 1
+                if row is None:
+                    skipped += 1
+                    continue
+                if row["content_hash"]:
+                    if row["content_hash"] in known_hashes:
+                        skipped += 1
+                        continue
+                    known_hashes.add(row["content_hash"])
+                batch.append(_copy_into_library(row, reserved, temp_paths) if copy else row)
+                if len(batch) >= batch_size:
+                    flush()
+        flush()
+
+        elapsed = time.monotonic() - started
+        print(f"导入完成：新增 {imported} 首，跳过 {skipped} 个，用时 {elapsed:.1f} 秒")
+        return imported
+    except KeyboardInterrupt:
+        # 已提交的批次会保留，重新运行时从中断处继续
+        db.rollback()
+        print("导入已中断，重新运行即可继续。")
+        return 0
+    finally:
+        # 未提交批次已复制的临时文件
+        _discard_temp_files(temp_paths)
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量导入本地音乐库")
+    parser.add_argument("directory", help="音乐文件所在目录")
+    parser.add_argument("--copy", action="store_true", help="将文件复制到 static/audio（默认直接引用原路径）")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认等于CPU核心数）")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每批写入的歌曲数量")
+    parser.add_argument("--no-hash", action="store_true", help="不计算内容哈希（更快，但不能按内容去重）")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在: {args.directory}")
+        return 1
+
+    imported = import_library(
+        args.directory,
+        copy=args.copy,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        with_hash=not args.no_hash
+    )
+    if imported:
+        # 批量写入不会经过 crud 的索引钩子，需要同步全文索引
+        init_search_index()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 import os
 
 from database import create_tables
 from api import auth, songs, playlists
+from auth import get_current_user
+import schemas
 from utils.file import ensure_directories
-from utils.sync import sync_database_with_static_files
+from utils.sync import start_background_sync
+from utils.search import init_search_index
+from utils.play_events import get_play_count_buffer
+from utils.streaming import CachedStaticFiles
+from utils.cover_jobs import get_cover_job_queue
+from utils.watcher import get_library_watcher, WATCH_LIBRARY
+from utils.response_cache import get_response_cache
+from utils.transcode import get_transcoder
+from utils.pcm import get_analysis_pool
+from utils.thumbnails import get_thumbnail_queue
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -38,14 +48,14 @@ ensure_directories()
 # 创建数据库表
 create_tables()
 
-# 同步数据库与文件
-sync_database_with_static_files()
+# 初始化歌曲搜索索引
+init_search_index()
 
 # 挂载静态文件
 if not os.path.exists("static"):
     os.makedirs("static", exist_ok=True)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # 注册路由
 app.include_router(auth.router)
@@ -53,6 +63,26 @@ app.include_router(songs.router)
 app.include_router(playlists.router)
 
 
+@app.on_event("startup")
+def start_background_workers():
+    get_play_count_buffer().start()
+    # 在后台同步数据库与文件并补算内容哈希，不阻塞启动
+    start_background_sync()
+    if WATCH_LIBRARY:
+        get_library_watcher().start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    # 写入缓冲区中尚未保存的播放次数
+    get_play_count_buffer().stop()
+    get_cover_job_queue().shutdown()
+    get_library_watcher().stop()
+    get_transcoder().shutdown()
+    get_analysis_pool().shutdown()
+    get_thumbnail_queue().shutdown()
+
+
 # 全局异常处理
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -95,6 +125,12 @@ def health_check():
     return {"status": "healthy", "message": "MelodyCommons API is running"}
 
 
+# 接口响应缓存命中统计
+@app.get("/cache/stats")
+def cache_stats(current_user: schemas.User = Depends(get_current_user)):
+    return get_response_cache().stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
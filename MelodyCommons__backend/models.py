@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, BIGINT, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, BIGINT, Float, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -21,13 +21,57 @@ class Song(Base):
     album = Column(String(255), nullable=True)
     duration = Column(Integer, default=0)
     file_path = Column(String(500), nullable=False, unique=True)
+    # 批量导入时复制前的原始路径，重新运行导入时用于跳过已复制的文件
+    source_path = Column(String(500), nullable=True)
     file_size = Column(BIGINT, nullable=True)
+    # 音频文件内容的 SHA-256，用于上传去重
+    content_hash = Column(String(64), nullable=True)
     cover_url = Column(String(500), nullable=True)
     cover_path = Column(String(500), nullable=True)
     play_count = Column(Integer, default=0, nullable=False)
+    # 响度分析结果：积分响度（LUFS）、采样峰值（线性）、ReplayGain 增益（dB）
+    loudness = Column(Float, nullable=True)
+    peak = Column(Float, nullable=True)
+    replay_gain = Column(Float, nullable=True)
+    loudness_analyzed_at = Column(TIMESTAMP, nullable=True)
     created_at = Column(TIMESTAMP, default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, default=func.current_timestamp(), onupdate=func.current_timestamp())
 
+    # 键集分页使用的复合索引；cover_path 索引用于统计共享封面的引用数；
+    # content_hash 索引用于查找重复音频
+    __table_args__ = (
+        Index('ix_songs_created_at_id', 'created_at', 'id'),
+        Index('ix_songs_play_count_id', 'play_count', 'id'),
+        Index('ix_songs_cover_path', 'cover_path'),
+        Index('ix_songs_content_hash', 'content_hash'),
+        Index('ix_songs_source_path', 'source_path'),
+    )
+
+
+class CoverCache(Base):
+    __tablename__ = "cover_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # 规范化后的 (艺术家, 专辑) 或 (艺术家, 标题) 的哈希
+    lookup_key = Column(String(64), nullable=False, unique=True)
+    # 为空表示查询不到封面（负缓存），此时 expires_at 为过期时间
+    cover_path = Column(String(500), nullable=True)
+    expires_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, default=func.current_timestamp())
+
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+
+    # 任务名称，例如 "static_files"
+    name = Column(String(50), primary_key=True)
+    # 本轮扫描已处理到的歌曲 ID，中断后从此处继续；0 表示上一轮已完成
+    cursor = Column(Integer, default=0, nullable=False)
+    completed_at = Column(TIMESTAMP, nullable=True)
+    # 领导者锁：只有持有锁的进程执行同步，过期后其他进程可以接管
+    lock_owner = Column(String(100), nullable=True)
+    lock_expires_at = Column(TIMESTAMP, nullable=True)
+
 
 class Playlist(Base):
     __tablename__ = "playlists"
@@ -52,4 +96,7 @@ class PlaylistSong(Base):
     playlist = relationship("Playlist", back_populates="songs")
     song = relationship("Song")
 
-    __table_args__ = (UniqueConstraint('playlist_id', 'song_id', name='unique_playlist_song'),)
+    __table_args__ = (
+        UniqueConstraint('playlist_id', 'song_id', name='unique_playlist_song'),
+        Index('ix_playlist_songs_playlist_order', 'playlist_id', 'order_index', 'id'),
+    )
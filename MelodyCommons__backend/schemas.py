@@ -1,4 +1,4 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict
 from datetime import datetime
 
@@ -43,9 +43,13 @@ class Song(BaseModel):
     duration: int
     file_path: str
     file_size: Optional[int]
+    content_hash: Optional[str] = None
     cover_url: Optional[str]
     cover_path: Optional[str]
     play_count: int
+    loudness: Optional[float] = None
+    peak: Optional[float] = None
+    replay_gain: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
@@ -59,6 +63,41 @@ class Song(BaseModel):
         from_attributes = True
 
 
+class SongUploadResult(Song):
+    """上传结果：duplicate 为 true 表示已有内容相同的歌曲，本次上传没有创建新歌曲"""
+    duplicate: bool = False
+
+
+class SongPage(BaseModel):
+    items: List[Song]
+    next_cursor: Optional[str] = None
+
+
+class SongListItem(BaseModel):
+    """歌曲列表项：未指定 fields 时包含全部字段，指定 fields 时只包含所选字段"""
+    id: Optional[int] = None
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    duration: Optional[int] = None
+    file_path: Optional[str] = None
+    file_size: Optional[int] = None
+    content_hash: Optional[str] = None
+    cover_url: Optional[str] = None
+    cover_path: Optional[str] = None
+    play_count: Optional[int] = None
+    loudness: Optional[float] = None
+    peak: Optional[float] = None
+    replay_gain: Optional[float] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class SongListPage(BaseModel):
+    items: List[SongListItem]
+    next_cursor: Optional[str] = None
+
+
 class SongInPlaylist(BaseModel):
     song: Song
     order_index: int
@@ -68,6 +107,49 @@ class SongInPlaylist(BaseModel):
         from_attributes = True
 
 
+class SongInPlaylistPage(BaseModel):
+    items: List[SongInPlaylist]
+    next_cursor: Optional[str] = None
+
+
+class SongInPlaylistListItem(BaseModel):
+    song: SongListItem
+    order_index: int
+    added_at: datetime
+
+
+class SongInPlaylistListPage(BaseModel):
+    items: List[SongInPlaylistListItem]
+    next_cursor: Optional[str] = None
+
+
+class CoverJobStatus(BaseModel):
+    song_id: int
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    updated_at: datetime
+
+
+class CoverJobSummary(BaseModel):
+    pending: int
+    running: int
+    retrying: int
+    done: int
+    not_found: int
+    failed: int
+
+
+class CoverCacheStats(BaseModel):
+    lookups: int
+    hits: int
+    negative_hits: int
+    misses: int
+    downloads: int
+    deduplicated: int
+    hit_rate: float
+
+
 # 歌单相关
 class PlaylistCreate(BaseModel):
     name: str
@@ -89,6 +171,19 @@ class Playlist(BaseModel):
         from_attributes = True
 
 
+class PlaylistSummary(Playlist):
+    song_count: int = 0
+    # 总时长（秒）
+    total_duration: int = 0
+    # 代表封面：歌单中 ID 最小的有封面的歌曲（可通过 /songs/{id}/cover 获取）
+    cover_song_id: Optional[int] = None
+
+
+class PlaylistSummaryPage(BaseModel):
+    items: List[PlaylistSummary]
+    next_cursor: Optional[str] = None
+
+
 class PlaylistWithSongs(BaseModel):
     id: int
     name: str
@@ -104,6 +199,23 @@ class PlaylistSongOrder(BaseModel):
     song_orders: List[Dict[str, int]]
 
 
+class PlaylistSongMove(BaseModel):
+    # 移动到该歌曲之前；为空时移到歌单末尾
+    before_song_id: Optional[int] = None
+
+
+class PlaylistSongBatch(BaseModel):
+    song_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+
+class PlaylistSongBatchResult(BaseModel):
+    added: List[int] = []
+    removed: List[int] = []
+    # 已在歌单中（添加时）或不在歌单中（移除时）的歌曲
+    skipped: List[int] = []
+    not_found: List[int] = []
+
+
 # 通用响应
 class ErrorResponse(BaseModel):
     error: str
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试直接导入后端模块（与 uvicorn main:app 相同，以后端目录为根）
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
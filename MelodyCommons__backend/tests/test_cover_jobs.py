@@ -0,0 +1,184 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from api import songs
+from auth import get_current_user
+from database import Base
+from utils import cover, cover_jobs, thumbnails
+
+PNG_DATA = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+class StubCoverServer:
+    """本地封面服务：按顺序返回预设的响应，之后一直返回最后一个"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    index = min(stub.requests, len(stub.responses) - 1)
+                    stub.requests += 1
+                status_code, content_type, body = stub.responses[index]
+                self.send_response(status_code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/cover"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 不生成缩略图
+    monkeypatch.setattr(thumbnails, "Image", None)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(cover_jobs, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    servers = []
+
+    def start(*responses):
+        server = StubCoverServer(responses)
+        servers.append(server)
+        monkeypatch.setattr(cover, "LRCAPI_COVER_URL", server.url)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def queue():
+    queue = cover_jobs.CoverJobQueue(workers=2, retry_delay=0.01)
+    yield queue
+    queue.shutdown()
+
+
+def _add_song(factory, title: str = "song") -> int:
+    db = factory()
+    song = models.Song(title=title, artist="artist", album="album", file_path=f"static/audio/{title}.mp3")
+    db.add(song)
+    db.commit()
+    song_id = song.id
+    db.close()
+    return song_id
+
+
+def _wait(queue, song_id: int) -> dict:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = queue.get_status(song_id)
+        if job and job["status"] in cover_jobs.FINISHED_STATES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"cover job did not finish: {queue.get_status(song_id)}")
+
+
+def _song(factory, song_id: int) -> models.Song:
+    db = factory()
+    song = db.get(models.Song, song_id)
+    db.close()
+    return song
+
+
+def test_retries_until_cover_is_available(session_factory, stub_server, queue):
+    server = stub_server(
+        (503, "text/plain", b"busy"),
+        (429, "text/plain", b"slow down"),
+        (200, "image/png", PNG_DATA),
+    )
+    song_id = _add_song(session_factory)
+
+    assert queue.enqueue(song_id)
+    job = _wait(queue, song_id)
+
+    assert job["status"] == cover_jobs.DONE
+    assert job["attempts"] == 3
+    assert server.requests == 3
+    song = _song(session_factory, song_id)
+    assert song.cover_path.endswith(".png")
+    assert song.cover_url
+
+
+def test_gives_up_after_max_retries(session_factory, stub_server):
+    stub_server((500, "text/plain", b"error"))
+    queue = cover_jobs.CoverJobQueue(workers=1, max_retries=1, retry_delay=0.01)
+    song_id = _add_song(session_factory)
+    try:
+        queue.enqueue(song_id)
+        job = _wait(queue, song_id)
+    finally:
+        queue.shutdown()
+
+    assert job["status"] == cover_jobs.FAILED
+    assert job["attempts"] == 2
+
+
+def test_not_found_leaves_song_without_cover(session_factory, stub_server, queue):
+    server = stub_server((404, "text/plain", b"not found"))
+    song_id = _add_song(session_factory)
+
+    queue.enqueue(song_id)
+    job = _wait(queue, song_id)
+
+    assert job["status"] == cover_jobs.NOT_FOUND
+    # 专辑、艺术家+标题、标题各查询一次
+    assert server.requests == 3
+    song = _song(session_factory, song_id)
+    assert song.cover_path is None
+    assert song.cover_url is None
+
+
+def test_status_endpoints(session_factory, stub_server, queue, monkeypatch):
+    stub_server((200, "image/png", PNG_DATA))
+    monkeypatch.setattr(songs, "get_cover_job_queue", lambda: queue)
+    app = FastAPI()
+    app.include_router(songs.router)
+    app.dependency_overrides[get_current_user] = lambda: None
+    client = TestClient(app)
+
+    assert client.get("/songs/1/cover/status").status_code == 404
+
+    song_id = _add_song(session_factory)
+    queue.enqueue(song_id)
+    _wait(queue, song_id)
+
+    response = client.get(f"/songs/{song_id}/cover/status")
+    assert response.status_code == 200
+    assert response.json()["status"] == cover_jobs.DONE
+    assert response.json()["attempts"] == 1
+
+    summary = client.get("/songs/covers/jobs").json()
+    assert summary["done"] == 1
+    assert summary["pending"] == summary["failed"] == 0
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from database import Base
+from utils import search
+from utils.waveform import waveform_path
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # 音频目录等相对路径以后端目录为根，测试中切换到临时目录
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "static" / "audio").mkdir(parents=True)
+    monkeypatch.setattr(search, "_search_index", search.InMemoryIndex())
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add_song(db, file_path: str) -> models.Song:
+    song = models.Song(title="song", artist="artist", file_path=file_path)
+    db.add(song)
+    db.commit()
+    return song
+
+
+def test_delete_library_song_removes_file(db, tmp_path):
+    path = os.path.join("static", "audio", "song.mp3")
+    with open(path, "wb") as f:
+        f.write(b"audio")
+    peaks = waveform_path(path)
+    with open(peaks, "wb") as f:
+        f.write(b"peaks")
+    song = _add_song(db, path)
+
+    assert crud.delete_song(db, song.id)
+    assert not os.path.exists(path)
+    assert not os.path.exists(peaks)
+    assert db.query(models.Song).count() == 0
+
+
+def test_delete_reference_song_keeps_source_file(db, tmp_path):
+    # 批量导入（未指定 --copy）时歌曲直接引用用户目录中的原文件
+    music_dir = tmp_path / "music"
+    music_dir.mkdir()
+    source = music_dir / "song.mp3"
+    source.write_bytes(b"audio")
+    song = _add_song(db, str(source))
+
+    # 波形不写入用户目录
+    assert not waveform_path(str(source)).startswith(str(music_dir))
+
+    assert crud.delete_song(db, song.id)
+    assert source.read_bytes() == b"audio"
+    assert os.listdir(music_dir) == ["song.mp3"]
+    assert db.query(models.Song).count() == 0
+
+
+def _playlist_song_ids(db, playlist_id: int):
+    return [item.song_id for item in db.query(models.PlaylistSong).filter(
+        models.PlaylistSong.playlist_id == playlist_id
+    ).order_by(models.PlaylistSong.order_index, models.PlaylistSong.id)]
+
+
+def test_add_song_at_position_after_reorder(db):
+    playlist = models.Playlist(name="playlist")
+    db.add(playlist)
+    db.commit()
+    songs = [_add_song(db, f"static/audio/{i}.mp3") for i in range(6)]
+    for song in songs[:5]:
+        crud.add_song_to_playlist(db, playlist.id, song.id)
+
+    # 重新排序后排序值带有间隔，指定的位置仍按歌曲的序号处理
+    reordered = [songs[4].id, songs[3].id, songs[2].id, songs[1].id, songs[0].id]
+    crud.update_playlist_song_order(db, playlist.id, [
+        {"song_id": song_id, "order_index": index} for index, song_id in enumerate(reordered)
+    ])
+    crud.add_song_to_playlist(db, playlist.id, songs[5].id, order_index=3)
+    assert _playlist_song_ids(db, playlist.id) == reordered[:3] + [songs[5].id] + reordered[3:]
+
+
+def test_add_song_at_position_beyond_end(db):
+    playlist = models.Playlist(name="playlist")
+    db.add(playlist)
+    db.commit()
+    songs = [_add_song(db, f"static/audio/{i}.mp3") for i in range(3)]
+    crud.add_song_to_playlist(db, playlist.id, songs[0].id)
+    crud.add_song_to_playlist(db, playlist.id, songs[1].id, order_index=0)
+    crud.add_song_to_playlist(db, playlist.id, songs[2].id, order_index=10)
+    assert _playlist_song_ids(db, playlist.id) == [songs[1].id, songs[0].id, songs[2].id]
+
+
+def test_update_cover_keeps_old_cover_when_new_file_was_released(db):
+    os.makedirs(os.path.join("static", "covers"))
+    old_cover = os.path.join("static", "covers", "old.jpg")
+    with open(old_cover, "wb") as f:
+        f.write(b"old")
+    song = _add_song(db, os.path.join("static", "audio", "song.mp3"))
+    crud.update_song_cover(db, song.id, cover_path=old_cover)
+
+    # 封面任务拿到的封面文件在提交前被 release_cover_file 删除
+    updated = crud.update_song_cover(db, song.id, cover_path=os.path.join("static", "covers", "released.jpg"))
+    assert updated.cover_path == old_cover
+    assert os.path.exists(old_cover)
@@ -0,0 +1,45 @@
+from concurrent.futures import Future
+
+import pytest
+
+from utils import loudness
+
+pytestmark = pytest.mark.skipif(loudness.np is None, reason="numpy is not installed")
+
+
+class RecordingPool:
+    """只记录提交的任务，由测试决定何时完成"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.submitted.append((args, future))
+        return future
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(loudness, "get_analysis_pool", lambda: pool)
+    return pool
+
+
+def test_enqueue_dedupes_by_song(pool, monkeypatch):
+    saved = []
+    monkeypatch.setattr(loudness, "_save_results", saved.extend)
+    queue = loudness.LoudnessJobQueue()
+
+    first = queue.enqueue(1, "song.wav")
+    assert queue.enqueue(1, "song.wav") is first
+    assert queue.enqueue(2, "other.wav") is not first
+    assert len(pool.submitted) == 2
+    assert queue.is_pending(1)
+
+    first.set_result((-14.0, 0.5))
+    assert not queue.is_pending(1)
+    assert [mapping["id"] for mapping in saved] == [1]
+    # 完成后可以重新分析
+    assert queue.enqueue(1, "song.wav") is not first
+    assert len(pool.submitted) == 3
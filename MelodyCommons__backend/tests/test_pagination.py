@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+from utils.pagination import (
+    encode_cursor, decode_cursor, paginate_keyset, InvalidCursorError, SONG_SORT_COLUMNS
+)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    cursor = encode_cursor("created_at", [created_at, 42])
+    # 游标可以直接放在查询参数中
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, "created_at") == [created_at, 42]
+
+
+def test_cursor_with_plain_values():
+    cursor = encode_cursor("play_count", [17, 3])
+    assert decode_cursor(cursor, "play_count") == [17, 3]
+
+
+def test_cursor_sort_mismatch():
+    cursor = encode_cursor("play_count", [17, 3])
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "created_at")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "!!!", encode_cursor("created_at", [])[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "created_at")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine, tables=[models.Song.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add_songs(db, count: int):
+    # 每三首歌的创建时间相同，翻页必须依靠 id 决胜
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        db.add(models.Song(
+            title=f"song {i}", artist="artist", file_path=f"static/audio/{i}.mp3", play_count=i % 4
+        ))
+    db.commit()
+    # 与 CURRENT_TIMESTAMP 默认值相同，SQLite 中以不含微秒的文本保存
+    for song in db.query(models.Song):
+        created_at = base + timedelta(seconds=(song.id - 1) // 3)
+        db.execute(
+            text("UPDATE songs SET created_at = :created_at WHERE id = :id"),
+            {"created_at": created_at.isoformat(sep=" "), "id": song.id}
+        )
+    db.commit()
+    db.expire_all()
+
+
+@pytest.mark.parametrize("sort", ["created_at", "play_count"])
+def test_keyset_pages_cover_all_rows_once(db, sort):
+    _add_songs(db, 25)
+    columns = SONG_SORT_COLUMNS[sort]
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = paginate_keyset(db.query(models.Song), columns, sort, 4, cursor)
+        seen.extend(rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == 25
+    assert len({song.id for song in seen}) == 25
+    keys = [tuple(getattr(song, column.key) for column in columns) for song in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_keyset_last_page_has_no_cursor(db):
+    _add_songs(db, 4)
+    rows, cursor = paginate_keyset(db.query(models.Song), SONG_SORT_COLUMNS["created_at"], "created_at", 4, None)
+    assert len(rows) == 4
+    assert cursor is None
+
+
+def test_keyset_rejects_cursor_of_wrong_length(db):
+    cursor = encode_cursor("created_at", [datetime(2024, 1, 1)])
+    with pytest.raises(InvalidCursorError):
+        paginate_keyset(db.query(models.Song), SONG_SORT_COLUMNS["created_at"], "created_at", 4, cursor)
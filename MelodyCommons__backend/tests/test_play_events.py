@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from database import Base
+from utils import play_events
+from utils.popularity import Leaderboard
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[models.Song.__table__])
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(play_events, "SessionLocal", factory)
+    session = factory()
+    session.add_all([
+        models.Song(id=song_id, title=f"song {song_id}", artist="artist", file_path=f"static/audio/{song_id}.mp3")
+        for song_id in (1, 2)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _play_counts(db):
+    db.expire_all()
+    return {song.id: song.play_count for song in db.query(models.Song)}
+
+
+def test_flush_writes_counts(db):
+    buffer = play_events.PlayCountBuffer()
+    for song_id in (1, 1, 2):
+        buffer.record(song_id)
+    assert buffer.flush() == 2
+    assert buffer.flush() == 0
+    buffer.stop()
+    assert _play_counts(db) == {1: 2, 2: 1}
+
+
+def test_leaderboard_failure_does_not_requeue(db, monkeypatch):
+    leaderboard = Leaderboard()
+    leaderboard.refresh(db)
+
+    def fail(song_id, play_count):
+        raise RuntimeError("leaderboard unavailable")
+
+    monkeypatch.setattr(leaderboard, "record_play", fail)
+    monkeypatch.setattr("crud.get_leaderboard", lambda: leaderboard)
+    buffer = play_events.PlayCountBuffer()
+    buffer.record(1, 3)
+    buffer.flush()
+    # 播放次数已提交，不能放回缓冲区再写一次
+    assert buffer.flush() == 0
+    buffer.stop()
+    assert _play_counts(db) == {1: 3, 2: 0}
+    assert not leaderboard._is_fresh()
+
+
+def test_write_failure_is_requeued(db, monkeypatch):
+    def fail(db, play_counts):
+        raise RuntimeError("database unavailable")
+
+    buffer = play_events.PlayCountBuffer()
+    buffer.record(2, 4)
+    with monkeypatch.context() as patch:
+        patch.setattr("crud.add_play_counts", fail)
+        assert buffer.flush() == 0
+    assert buffer.flush() == 1
+    buffer.stop()
+    assert _play_counts(db) == {1: 0, 2: 4}
+
+
+def test_recent_plays_dedupes_within_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(play_events.time, "monotonic", lambda: now[0])
+    recent = play_events.RecentPlays(window=60, max_entries=3)
+
+    assert recent.first_play(1, 10)
+    assert not recent.first_play(1, 10)
+    # 其他用户、其他歌曲分别计数
+    assert recent.first_play(2, 10)
+    assert recent.first_play(1, 11)
+
+    now[0] += 61
+    assert recent.first_play(1, 10)
+
+
+def test_recent_plays_is_bounded():
+    recent = play_events.RecentPlays(window=60, max_entries=2)
+    for song_id in range(5):
+        assert recent.first_play(1, song_id)
+    assert len(recent._plays) <= 2
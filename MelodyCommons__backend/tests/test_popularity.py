@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+from utils.popularity import sample_play_count_bucket
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine, tables=[models.Song.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add_songs(db, ids, play_count: int):
+    for song_id in ids:
+        db.add(models.Song(id=song_id, title=f"song {song_id}", artist="artist",
+                           file_path=f"static/audio/{song_id}.mp3", play_count=play_count))
+    db.commit()
+
+
+def test_sample_only_from_bucket(db):
+    _add_songs(db, range(1, 51), 0)
+    _add_songs(db, range(51, 61), 5)
+    sample = sample_play_count_bucket(db, 5, 4)
+    assert len(sample) == len(set(sample)) == 4
+    assert all(51 <= song_id <= 60 for song_id in sample)
+    assert sorted(sample_play_count_bucket(db, 5, 20)) == list(range(51, 61))
+    assert sample_play_count_bucket(db, 7, 3) == []
+
+
+def test_sample_is_uniform_across_id_gaps(db):
+    # id 之间有很大的间隔：按 id 范围随机选起点时，间隔后的歌曲会被过多选中
+    ids = list(range(1, 41)) + [10_000 + i for i in range(10)]
+    _add_songs(db, ids, 3)
+    random.seed(1234)
+    counts = Counter()
+    rounds = 2000
+    for _ in range(rounds):
+        counts.update(sample_play_count_bucket(db, 3, 2))
+
+    expected = rounds * 2 / len(ids)
+    assert set(counts) == set(ids)
+    assert max(counts.values()) < expected * 1.5
+    assert min(counts.values()) > expected * 0.5
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import crud
+import models
+from database import Base
+from utils import search
+from utils.pagination import SONG_SORT_COLUMNS
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[models.Song.__table__])
+    monkeypatch.setattr(search, "_search_index", search.InMemoryIndex())
+    # 每次查询前都检查数据库变化
+    monkeypatch.setattr(search, "SEARCH_INDEX_CHECK_INTERVAL", 0)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add_songs(db, count: int, title: str = "song"):
+    db.add_all([
+        models.Song(title=f"{title} {i}", artist="artist", file_path=f"static/audio/{title}-{i}.mp3")
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def test_offset_pages_beyond_candidate_limit(db, monkeypatch):
+    monkeypatch.setattr(search, "MAX_SEARCH_CANDIDATES", 10)
+    _add_songs(db, 30)
+
+    seen = []
+    for skip in range(0, 40, 8):
+        seen.extend(song.id for song in crud.get_songs(db, skip=skip, limit=8, search="song"))
+    assert sorted(seen) == list(range(1, 31))
+
+    rows = crud.get_song_rows(db, [models.Song.id, models.Song.title], skip=28, limit=8, search="song")
+    assert len(rows) == 2
+
+
+@pytest.mark.parametrize("candidates", [5, 1000])
+def test_cursor_pages_cover_all_matches(db, monkeypatch, candidates):
+    # candidates 小于命中数量时走按排序键分批扫描的路径
+    monkeypatch.setattr(search, "MAX_SEARCH_CANDIDATES", candidates)
+    monkeypatch.setattr(search, "SEARCH_SCAN_BATCH", 7)
+    _add_songs(db, 20, "hit")
+    _add_songs(db, 20, "miss")
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = crud.get_song_rows_page(
+            db, [models.Song.id, models.Song.title], limit=6, search="hit", sort="created_at", cursor=cursor
+        )
+        seen.extend(rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == 20
+    assert all(row.title.startswith("hit") for row in seen)
+    keys = [tuple(getattr(row, column.key) for column in SONG_SORT_COLUMNS["created_at"]) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_sees_changes_from_other_sessions(engine, db):
+    _add_songs(db, 3)
+    assert len(crud.get_songs(db, search="song")) == 3
+
+    # 其他进程（批量导入、文件监听）直接写入数据库，不经过本进程的 index_song
+    other = sessionmaker(bind=engine)()
+    other.add(models.Song(title="fresh tune", artist="artist", file_path="static/audio/fresh.mp3"))
+    other.query(models.Song).filter(models.Song.id == 1).update({"title": "renamed"})
+    other.query(models.Song).filter(models.Song.id == 2).delete()
+    other.commit()
+    other.close()
+
+    assert [song.title for song in crud.get_songs(db, search="fresh")] == ["fresh tune"]
+    assert [song.id for song in crud.get_songs(db, search="song")] == [3]
+    assert [song.id for song in crud.get_songs(db, search="renamed")] == [1]
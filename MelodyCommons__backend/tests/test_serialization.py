@@ -0,0 +1,20 @@
+import pytest
+
+from utils.serialization import parse_song_fields, InvalidFieldsError, SONG_FIELDS
+
+
+def test_default_fields_match_song_schema():
+    # 未指定 fields 时与原来按 schemas.Song 返回的字段一致
+    fields = parse_song_fields(None)
+    assert fields == SONG_FIELDS
+    assert {"file_path", "cover_path", "content_hash"} <= set(fields)
+
+
+def test_sparse_fields_keep_order_and_drop_duplicates():
+    assert parse_song_fields("title, id,title") == ("title", "id")
+
+
+@pytest.mark.parametrize("fields", ["id,password", " , "])
+def test_invalid_fields(fields):
+    with pytest.raises(InvalidFieldsError):
+        parse_song_fields(fields)
@@ -0,0 +1,140 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.streaming import parse_range_header, file_response, make_etag, RangeNotSatisfiable, MAX_RANGES
+
+FILE_SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    # 后缀区间：最后 N 字节，超过文件大小时返回整个文件
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=0-0", [(0, 0)]),
+    ("BYTES = 0-9", [(0, 9)]),
+])
+def test_single_range(header, expected):
+    assert parse_range_header(header, FILE_SIZE) == expected
+
+
+def test_multi_range_sorted_and_merged():
+    # 重叠和相邻的区间合并，结果按起始位置排序
+    assert parse_range_header("bytes=500-599,0-99,50-149,150-199", FILE_SIZE) == [(0, 199), (500, 599)]
+    assert parse_range_header("bytes=0-9, 20-29, -10", FILE_SIZE) == [(0, 9), (20, 29), (990, 999)]
+
+
+def test_unsatisfiable_ranges_are_dropped():
+    # 只要有一个区间可满足，就忽略不可满足的区间
+    assert parse_range_header("bytes=2000-3000,0-9", FILE_SIZE) == [(0, 9)]
+    assert parse_range_header("bytes=-0,0-9", FILE_SIZE) == [(0, 9)]
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_all_ranges_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, FILE_SIZE)
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-9",
+    "bytes=",
+    "bytes=abc",
+    "bytes=5-1",
+    "bytes=a-9",
+    "bytes=0-9,x",
+])
+def test_invalid_header_means_full_file(header):
+    assert parse_range_header(header, FILE_SIZE) is None
+
+
+def test_too_many_ranges_means_full_file():
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1))
+    assert parse_range_header(header, FILE_SIZE) is None
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(os.urandom(FILE_SIZE))
+    return path
+
+
+@pytest.fixture
+def client(audio_file):
+    app = FastAPI()
+
+    @app.get("/file")
+    def get_file(request: Request):
+        return file_response(request, str(audio_file), os.stat(audio_file), "audio/mpeg")
+
+    return TestClient(app)
+
+
+def test_full_response(client, audio_file):
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == audio_file.read_bytes()
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == make_etag(os.stat(audio_file))
+
+
+def test_single_range_response(client, audio_file):
+    response = client.get("/file", headers={"Range": "bytes=-100"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 900-999/{FILE_SIZE}"
+    assert response.headers["content-length"] == "100"
+    assert response.content == audio_file.read_bytes()[900:]
+
+
+def test_multi_range_response(client, audio_file):
+    data = audio_file.read_bytes()
+    response = client.get("/file", headers={"Range": "bytes=0-9,500-509"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    assert int(response.headers["content-length"]) == len(response.content)
+
+    boundary = content_type.split("boundary=")[1]
+    expected = (
+        f"--{boundary}\r\nContent-Type: audio/mpeg\r\nContent-Range: bytes 0-9/{FILE_SIZE}\r\n\r\n".encode()
+        + data[0:10]
+        + f"\r\n--{boundary}\r\nContent-Type: audio/mpeg\r\nContent-Range: bytes 500-509/{FILE_SIZE}\r\n\r\n".encode()
+        + data[500:510]
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+    assert response.content == expected
+
+
+def test_unsatisfiable_range_response(client):
+    response = client.get("/file", headers={"Range": f"bytes={FILE_SIZE}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{FILE_SIZE}"
+
+
+def test_invalid_range_returns_full_file(client, audio_file):
+    response = client.get("/file", headers={"Range": "bytes=9-1"})
+    assert response.status_code == 200
+    assert response.content == audio_file.read_bytes()
+
+
+def test_if_range(client, audio_file):
+    etag = make_etag(os.stat(audio_file))
+    matched = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matched.status_code == 206
+    # 文件已变化：忽略 Range 返回完整文件
+    stale = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert len(stale.content) == FILE_SIZE
+
+
+def test_not_modified(client, audio_file):
+    etag = make_etag(os.stat(audio_file))
+    response = client.get("/file", headers={"If-None-Match": etag, "Range": "bytes=0-9"})
+    assert response.status_code == 304
+    assert response.content == b""
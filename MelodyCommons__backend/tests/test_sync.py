@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from database import Base
+from utils import search, sync
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(sync, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def _expire_lock(db, name):
+    state = db.get(models.SyncState, name)
+    state.lock_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_lock_taken_over_after_expiry(db):
+    assert sync.acquire_sync_lock(db, "job", "a") is not None
+    assert sync.acquire_sync_lock(db, "job", "b") is None
+    assert sync.renew_sync_lock(db, "job", "a")
+
+    _expire_lock(db, "job")
+    assert sync.acquire_sync_lock(db, "job", "b") is not None
+    # 原持有者不能续期，也不能释放新持有者的锁
+    assert not sync.renew_sync_lock(db, "job", "a")
+    sync.release_sync_lock(db, "job", "a")
+    db.expire_all()
+    assert db.get(models.SyncState, "job").lock_owner == "b"
+
+    sync.release_sync_lock(db, "job", "b")
+    db.expire_all()
+    assert db.get(models.SyncState, "job").lock_owner is None
+
+
+def test_backfill_stops_when_lock_is_lost(db, tmp_path):
+    for i in range(5):
+        path = tmp_path / f"{i}.mp3"
+        path.write_bytes(bytes([i]) * 100)
+        db.add(models.Song(title=f"song {i}", artist="artist", file_path=str(path)))
+    db.commit()
+
+    assert sync.acquire_sync_lock(db, sync.BACKFILL_SYNC_NAME, "a") is not None
+    renew = sync.lock_renewer(sync.BACKFILL_SYNC_NAME, "a")
+    assert sync.backfill_content_hashes(batch_size=2, renew=renew) == 5
+
+    db.query(models.Song).update({"content_hash": None})
+    db.commit()
+    _expire_lock(db, sync.BACKFILL_SYNC_NAME)
+    assert sync.acquire_sync_lock(db, sync.BACKFILL_SYNC_NAME, "b") is not None
+    # 第一批处理完后续期失败，不再处理后续批次
+    assert sync.backfill_content_hashes(batch_size=2, renew=renew) == 2
+
+
+def test_missing_cover_clears_cover_instead_of_deleting_song(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "_search_index", search.InMemoryIndex())
+    audio = tmp_path / "song.mp3"
+    audio.write_bytes(b"audio")
+    db.add(models.Song(title="kept", artist="artist", file_path=str(audio), cover_path=str(tmp_path / "gone.jpg")))
+    db.add(models.Song(title="gone", artist="artist", file_path=str(tmp_path / "gone.mp3")))
+    db.commit()
+
+    assert sync.sync_database_with_static_files(force=True) == 1
+    db.expire_all()
+    songs = db.query(models.Song).all()
+    assert [(song.title, song.cover_path) for song in songs] == [("kept", None)]
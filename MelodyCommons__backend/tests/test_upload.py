@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from utils.upload import receive_audio_upload, UploadError, UnsupportedUploadError, UploadTooLargeError
+
+BOUNDARY = "----melodycommons-test"
+
+
+class FakeRequest:
+    """只提供 receive_audio_upload 用到的 headers 和 stream()"""
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.headers = {
+            "content-type": f"multipart/form-data; boundary={BOUNDARY}",
+            "content-length": str(len(body)),
+        }
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def build_body(parts):
+    """parts: [(name, filename 或 None, 内容)]，按顺序生成 multipart 请求体"""
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename is not None:
+            body += b"Content-Type: application/octet-stream\r\n"
+        body += b"\r\n" + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receive(body: bytes, chunk_size: int, directory: str, max_size: int = 10 * 1024 * 1024):
+    return asyncio.run(receive_audio_upload(FakeRequest(body, chunk_size), directory, max_size))
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "static" / "audio"
+    directory.mkdir(parents=True)
+    return str(directory)
+
+
+@pytest.mark.parametrize("chunk_size", [1 << 30, 64 * 1024, 4099])
+@pytest.mark.parametrize("size", [100, 200 * 1024])
+def test_file_followed_by_text_fields(upload_dir, chunk_size, size):
+    # 前端先发送文件，再发送 title/artist/album（src/api/songs.ts）
+    content = os.urandom(size)
+    body = build_body([
+        ("file", "song.mp3", content),
+        ("title", None, "标题".encode("utf-8")),
+        ("artist", None, b"Artist"),
+        ("album", None, b"Album"),
+    ])
+
+    upload = receive(body, chunk_size, upload_dir)
+
+    assert upload.filename == "song.mp3"
+    assert upload.fields == {"title": "标题", "artist": "Artist", "album": "Album"}
+    assert upload.file_size == size
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    assert os.path.basename(upload.file_path).startswith("song_")
+    with open(upload.file_path, "rb") as f:
+        assert f.read() == content
+    assert [name for name in os.listdir(upload_dir) if name.endswith(".part")] == []
+
+
+def test_text_fields_before_file(upload_dir):
+    content = b"audio" * 100
+    body = build_body([("title", None, b"T"), ("file", "a.flac", content)])
+
+    upload = receive(body, 16, upload_dir)
+
+    assert upload.filename == "a.flac"
+    assert upload.fields == {"title": "T"}
+    with open(upload.file_path, "rb") as f:
+        assert f.read() == content
+
+
+def test_missing_file(upload_dir):
+    with pytest.raises(UploadError, match="Missing audio file"):
+        receive(build_body([("title", None, b"T")]), 1 << 20, upload_dir)
+
+
+def test_unsupported_format(upload_dir):
+    with pytest.raises(UnsupportedUploadError):
+        receive(build_body([("file", "notes.txt", b"x"), ("title", None, b"T")]), 1 << 20, upload_dir)
+    assert os.listdir(upload_dir) == []
+
+
+def test_too_large_removes_partial_file(upload_dir):
+    body = build_body([("file", "big.mp3", b"x" * 5000), ("title", None, b"T")])
+    request = FakeRequest(body, 1024)
+    # 不带 Content-Length 时在接收过程中检查大小
+    del request.headers["content-length"]
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(receive_audio_upload(request, upload_dir, 1000))
+    assert os.listdir(upload_dir) == []
@@ -9,14 +9,17 @@ ALLOWED_AUDIO_FORMATS = [".mp3", ".flac", ".wav"]
 MAX_AUDIO_SIZE = 50 * 1024 * 1024  # 50MB
 
 
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
 def get_file_hash(file_path: str) -> str:
-    """计算文件MD5哈希"""
-    hash_md5 = hashlib.md5()
+    """计算文件SHA-256哈希（与上传时计算的 content_hash 一致）"""
+    hash_sha256 = hashlib.sha256()
     try:
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                hash_sha256.update(chunk)
+        return hash_sha256.hexdigest()
     except Exception:
         return ""
 
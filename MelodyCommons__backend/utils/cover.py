@@ -1,12 +1,50 @@
 import requests
 import os
 import hashlib
-from typing import Optional
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional, List
+
+from sqlalchemy.orm import Session
+import crud
+from utils.thumbnails import get_thumbnail_queue
 
 LRCAPI_COVER_URL = "https://api.lrc.cx/cover"
 COVER_REQUEST_TIMEOUT = 10
 COVER_DIR = "static/covers"
 MAX_COVER_SIZE = 5 * 1024 * 1024  # 5MB
+# 查询不到封面时的缓存时间，期间不再请求lrcapi
+NEGATIVE_CACHE_TTL = timedelta(hours=24)
+
+# 封面缓存命中统计
+_stats_lock = threading.Lock()
+_stats = {
+    "lookups": 0,
+    "hits": 0,
+    "negative_hits": 0,
+    "misses": 0,
+    "downloads": 0,
+    "deduplicated": 0,
+}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cover_cache_stats() -> dict:
+    """获取封面缓存统计"""
+    with _stats_lock:
+        stats = dict(_stats)
+    answered = stats["hits"] + stats["negative_hits"]
+    stats["hit_rate"] = answered / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+
+class CoverFetchError(Exception):
+    """封面服务暂时不可用（网络错误、限流或服务端错误），可稍后重试"""
 
 
 def ensure_cover_dir():
@@ -15,81 +53,158 @@ def ensure_cover_dir():
         os.makedirs(COVER_DIR, exist_ok=True)
 
 
-def generate_cover_filename(song_id: int, title: str, artist: str, album: str = "") -> str:
-    """生成封面文件名"""
-    content = f"{title}_{artist}_{album}".encode('utf-8')
-    content_hash = hashlib.md5(content).hexdigest()[:8]
-    return f"{song_id}_{content_hash}.jpg"
+def detect_image_extension(cover_data: bytes) -> str:
+    """按文件头识别图片格式，返回扩展名（接口按扩展名返回媒体类型），无法识别时按 JPEG 处理"""
+    if cover_data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if cover_data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if cover_data[:4] == b"RIFF" and cover_data[8:12] == b"WEBP":
+        return "webp"
+    if cover_data.startswith(b"BM"):
+        return "bmp"
+    return "jpg"
+
+
+def generate_cover_filename(cover_data: bytes) -> str:
+    """按图片内容哈希生成封面文件名，相同图片只保存一份"""
+    content_hash = hashlib.sha256(cover_data).hexdigest()[:32]
+    return f"{content_hash}.{detect_image_extension(cover_data)}"
+
+
+def normalize_cover_key(*parts: Optional[str]) -> str:
+    """规范化查询条件（大小写、全半角、空白）后生成缓存键"""
+    normalized = [" ".join(unicodedata.normalize("NFKC", part or "").lower().split()) for part in parts]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
 
 
 def download_cover_from_lrcapi(title: str, artist: str = "", album: str = "") -> Optional[bytes]:
-    """从lrcapi下载封面"""
-    try:
-        params = {"title": title}
-        if artist:
-            params["artist"] = artist
-        if album:
-            params["album"] = album
+    """从lrcapi下载封面，找不到封面时返回None，服务暂时不可用时抛出CoverFetchError"""
+    params = {"title": title}
+    if artist:
+        params["artist"] = artist
+    if album:
+        params["album"] = album
 
+    try:
         response = requests.get(
             LRCAPI_COVER_URL,
             params=params,
             timeout=COVER_REQUEST_TIMEOUT,
             allow_redirects=True
         )
-
-        if response.status_code == 200:
-            # 检查内容类型
-            content_type = response.headers.get('content-type', '').lower()
-            if 'image' in content_type:
-                # 检查文件大小
-                if len(response.content) <= MAX_COVER_SIZE:
-                    return response.content
-                else:
-                    print(f"Cover too large: {len(response.content)} bytes")
+    except requests.RequestException as e:
+        raise CoverFetchError(f"Error downloading cover: {e}")
+
+    if response.status_code == 429 or response.status_code >= 500:
+        raise CoverFetchError(f"Cover service unavailable: {response.status_code}")
+
+    if response.status_code == 200:
+        # 检查内容类型
+        content_type = response.headers.get('content-type', '').lower()
+        if 'image' in content_type:
+            # 检查文件大小
+            if len(response.content) <= MAX_COVER_SIZE:
+                return response.content
             else:
-                print(f"Invalid content type: {content_type}")
+                print(f"Cover too large: {len(response.content)} bytes")
         else:
-            print(f"Failed to download cover: {response.status_code}")
-
-    except Exception as e:
-        print(f"Error downloading cover: {e}")
+            print(f"Invalid content type: {content_type}")
+    else:
+        print(f"Failed to download cover: {response.status_code}")
 
     return None
 
 
-def save_cover_image(song_id: int, title: str, artist: str, album: str = "") -> Optional[str]:
-    """保存封面图片到本地"""
+def save_cover_image(cover_data: bytes) -> Optional[str]:
+    """保存封面图片到本地，返回文件路径"""
     ensure_cover_dir()
 
-    # 生成文件名
-    filename = generate_cover_filename(song_id, title, artist, album)
-    file_path = os.path.join(COVER_DIR, filename)
+    file_path = os.path.join(COVER_DIR, generate_cover_filename(cover_data))
 
-    # 如果文件已存在，直接返回路径
+    # 相同内容的封面已存在，直接复用
     if os.path.exists(file_path):
+        _count("deduplicated")
+        get_thumbnail_queue().enqueue(file_path)
         return file_path
 
-    # 尝试从lrcapi下载
-    cover_data = download_cover_from_lrcapi(title, artist, album)
+    try:
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(cover_data)
+        os.replace(temp_path, file_path)
+        # 缩略图在后台生成
+        get_thumbnail_queue().enqueue(file_path)
+        return file_path
+    except Exception as e:
+        print(f"Error saving cover: {e}")
+    return None
+
+
+def _lookup_keys(title: str, artist: str, album: str = "") -> List[str]:
+    """返回缓存键：专辑封面按 (艺术家, 专辑) 共享，单曲封面按 (艺术家, 标题)"""
+    keys = []
+    if album:
+        keys.append(normalize_cover_key("album", artist, album))
+    keys.append(normalize_cover_key("track", artist, title))
+    return keys
+
+
+def fetch_cover(db: Session, title: str, artist: str, album: str = "", force: bool = False) -> Optional[str]:
+    """获取封面文件路径：优先使用缓存，找不到封面的查询在 NEGATIVE_CACHE_TTL 内不再重复请求"""
+    keys = _lookup_keys(title, artist, album)
+    album_key = keys[0] if album else None
+    track_key = keys[-1]
+    now = datetime.now()
+    negative_keys = set()
+
+    if not force:
+        _count("lookups")
+        for cache_key in keys:
+            entry = crud.get_cover_cache_entry(db, cache_key)
+            if entry is None:
+                continue
+            if entry.cover_path and os.path.exists(entry.cover_path):
+                _count("hits")
+                return entry.cover_path
+            if not entry.cover_path and entry.expires_at and entry.expires_at > now:
+                negative_keys.add(cache_key)
+        if len(negative_keys) == len(keys):
+            _count("negative_hits")
+            return None
+        _count("misses")
+
+    # 先按专辑查询（专辑封面可被同专辑的歌曲共享）
+    if album_key and album_key not in negative_keys:
+        cover_data = download_cover_from_lrcapi(title, artist, album)
+        _count("downloads")
+        if cover_data:
+            cover_path = save_cover_image(cover_data)
+            if cover_path:
+                crud.set_cover_cache_entry(db, album_key, cover_path)
+            return cover_path
+        crud.set_cover_cache_entry(db, album_key, None, expires_at=now + NEGATIVE_CACHE_TTL)
+
+    if track_key in negative_keys:
+        return None
 
     # 如果失败，尝试不带专辑信息
-    if not cover_data and album:
-        cover_data = download_cover_from_lrcapi(title, artist)
+    cover_data = download_cover_from_lrcapi(title, artist)
+    _count("downloads")
 
     # 如果还是失败，尝试只用标题
     if not cover_data and artist:
         cover_data = download_cover_from_lrcapi(title)
+        _count("downloads")
 
-    if cover_data:
-        try:
-            with open(file_path, 'wb') as f:
-                f.write(cover_data)
-            return file_path
-        except Exception as e:
-            print(f"Error saving cover: {e}")
+    if not cover_data:
+        crud.set_cover_cache_entry(db, track_key, None, expires_at=now + NEGATIVE_CACHE_TTL)
+        return None
 
-    return None
+    cover_path = save_cover_image(cover_data)
+    if cover_path:
+        crud.set_cover_cache_entry(db, track_key, cover_path)
+    return cover_path
 
 
 def get_cover_url(song_id: int, title: str, artist: str, album: str = "") -> Optional[str]:
@@ -110,19 +225,16 @@ def get_cover_url(song_id: int, title: str, artist: str, album: str = "") -> Opt
         return None
 
 
-def refresh_song_cover(song_id: int, title: str, artist: str, album: str = "") -> tuple:
-    """刷新歌曲封面，返回(cover_url, cover_path)"""
-    # 删除旧封面文件
-    old_filename = generate_cover_filename(song_id, title, artist, album)
-    old_path = os.path.join(COVER_DIR, old_filename)
-    if os.path.exists(old_path):
-        try:
-            os.remove(old_path)
-        except Exception as e:
-            print(f"Error removing old cover: {e}")
+def refresh_song_cover(db: Session, song_id: int, title: str, artist: str, album: str = "",
+                       force: bool = False) -> tuple:
+    """刷新歌曲封面，返回(cover_url, cover_path)；force 为 True 时忽略缓存重新下载
 
-    # 获取新封面
-    cover_path = save_cover_image(song_id, title, artist, album)
+    找不到封面时都返回 None（前端按 cover_url 判断是否有封面）。
+    """
+    # 旧封面文件由 crud.update_song_cover 按引用计数清理
+    cover_path = fetch_cover(db, title, artist, album, force=force)
+    if not cover_path:
+        return None, None
     cover_url = get_cover_url(song_id, title, artist, album)
 
     return cover_url, cover_path
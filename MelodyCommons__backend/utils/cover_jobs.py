@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict
+
+from database import SessionLocal
+import crud
+from utils.cover import refresh_song_cover, CoverFetchError
+
+# 同时获取封面的最大线程数
+COVER_WORKERS = 4
+# 临时失败（网络错误、服务端错误）的最大重试次数
+COVER_MAX_RETRIES = 3
+# 重试等待时间（秒），每次重试翻倍
+COVER_RETRY_DELAY = 2.0
+# 保留的任务状态数量
+MAX_TRACKED_JOBS = 10000
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+NOT_FOUND = "not_found"
+FAILED = "failed"
+
+FINISHED_STATES = (DONE, NOT_FOUND, FAILED)
+
+
+class CoverJobQueue:
+    """封面获取任务队列：歌曲入库后在后台线程池中获取封面，失败时退避重试"""
+
+    def __init__(self, workers: int = COVER_WORKERS, max_retries: int = COVER_MAX_RETRIES,
+                 retry_delay: float = COVER_RETRY_DELAY):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[int, Dict]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._timers: Dict[int, threading.Timer] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cover-worker")
+            return self._executor
+
+    def shutdown(self):
+        """停止接收任务，取消等待中的重试"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            timers, self._timers = self._timers, {}
+        for timer in timers.values():
+            timer.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_status(self, song_id: int, status: str, **fields):
+        with self._lock:
+            job = self._jobs.pop(song_id, None) or {"song_id": song_id, "attempts": 0, "error": None}
+            job.update(fields, status=status, updated_at=datetime.now())
+            self._jobs[song_id] = job
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+
+    def enqueue(self, song_id: int) -> bool:
+        """提交封面获取任务；该歌曲已有未完成的任务时返回 False"""
+        with self._lock:
+            job = self._jobs.get(song_id)
+            if job is not None and job["status"] not in FINISHED_STATES:
+                return False
+        self._set_status(song_id, PENDING, attempts=0, error=None)
+        self._get_executor().submit(self._run, song_id)
+        return True
+
+    def _schedule_retry(self, song_id: int, delay: float):
+        timer = threading.Timer(delay, self._resubmit, args=(song_id,))
+        timer.daemon = True
+        with self._lock:
+            self._timers[song_id] = timer
+        timer.start()
+
+    def _resubmit(self, song_id: int):
+        with self._lock:
+            self._timers.pop(song_id, None)
+            executor = self._executor
+        if executor is not None:
+            executor.submit(self._run, song_id)
+
+    def _run(self, song_id: int):
+        with self._lock:
+            attempts = self._jobs.get(song_id, {}).get("attempts", 0) + 1
+        self._set_status(song_id, RUNNING, attempts=attempts)
+
+        db = SessionLocal()
+        try:
+            song = crud.get_song(db, song_id=song_id)
+            if song is None:
+                self._set_status(song_id, FAILED, error="Song not found")
+                return
+
+            cover_url, cover_path = refresh_song_cover(db, song.id, song.title, song.artist, song.album)
+            if not cover_path:
+                self._set_status(song_id, NOT_FOUND, error=None)
+                return
+            song = crud.update_song_cover(db, song.id, cover_url, cover_path)
+            if song is not None and song.cover_path != cover_path:
+                # 封面文件在保存前被 release_cover_file 清理，重试时重新下载
+                raise CoverFetchError("Cover file was removed before it was saved")
+            self._set_status(song_id, DONE, error=None)
+        except CoverFetchError as e:
+            if attempts <= self.max_retries:
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                self._set_status(song_id, RETRYING, error=str(e))
+                self._schedule_retry(song_id, delay)
+            else:
+                self._set_status(song_id, FAILED, error=str(e))
+        except Exception as e:
+            print(f"Failed to get cover for song {song_id}: {e}")
+            self._set_status(song_id, FAILED, error=str(e))
+        finally:
+            db.close()
+
+    def get_status(self, song_id: int) -> Optional[Dict]:
+        """获取歌曲的封面任务状态"""
+        with self._lock:
+            job = self._jobs.get(song_id)
+            return dict(job) if job else None
+
+    def summary(self) -> Dict[str, int]:
+        """按状态统计任务数量"""
+        counts = {state: 0 for state in (PENDING, RUNNING, RETRYING, DONE, NOT_FOUND, FAILED)}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        return counts
+
+
+_queue = CoverJobQueue()
+
+
+def get_cover_job_queue() -> CoverJobQueue:
+    """获取进程内封面任务队列"""
+    return _queue
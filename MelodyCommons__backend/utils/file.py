@@ -16,13 +16,17 @@ def ensure_directories():
             os.makedirs(directory, exist_ok=True)
 
 
-def save_uploaded_file(upload_file: UploadFile, directory: str) -> str:
-    """保存上传的文件"""
-    ensure_directories()
+def is_library_file(file_path: str) -> bool:
+    """文件位于音频目录中（上传或 --copy 导入的文件）；批量导入默认直接引用用户目录中的原文件，
+    这些文件不能被删除或写入"""
+    library = os.path.abspath(AUDIO_DIR)
+    return os.path.commonpath([library, os.path.abspath(file_path)]) == library
 
-    # 生成唯一文件名
+
+def generate_unique_filename(directory: str, original_filename: str) -> str:
+    """根据原文件名生成目录内唯一的文件名"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename, ext = os.path.splitext(upload_file.filename)
+    filename, ext = os.path.splitext(os.path.basename(original_filename))
     unique_filename = f"{filename}_{timestamp}{ext}"
 
     # 确保文件名唯一
@@ -31,8 +35,14 @@ def save_uploaded_file(upload_file: UploadFile, directory: str) -> str:
     while os.path.exists(os.path.join(directory, final_filename)):
         final_filename = f"{filename}_{timestamp}_{counter}{ext}"
         counter += 1
+    return final_filename
+
+
+def save_uploaded_file(upload_file: UploadFile, directory: str) -> str:
+    """保存上传的文件"""
+    ensure_directories()
 
-    file_path = os.path.join(directory, final_filename)
+    file_path = os.path.join(directory, generate_unique_filename(directory, upload_file.filename))
 
     # 保存文件
     with open(file_path, "wb") as buffer:
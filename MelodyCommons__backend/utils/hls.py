@@ -0,0 +1,153 @@
+import os
+import re
+import shutil
+import threading
+import uuid
+from typing import Dict, Optional
+
+from utils.streaming import IMMUTABLE_CACHE_CONTROL
+from utils.transcode import FFMPEG_BINARY, TranscodeError, get_transcoder, source_key
+
+# HLS 分片缓存目录，每首歌一个子目录（清单 + 分片）
+HLS_CACHE_DIR = "cache/hls"
+# 缓存总大小上限，超过后按最近访问时间删除整首歌的分片
+HLS_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+# 每个分片的时长（秒）
+HLS_SEGMENT_SECONDS = 6
+# 分片编码（AAC 兼容所有支持 HLS 的播放器）
+HLS_AUDIO_BITRATE = "128k"
+# 分片是不可变的，可以被浏览器和 CDN 长期缓存
+HLS_SEGMENT_CACHE_CONTROL = IMMUTABLE_CACHE_CONTROL
+HLS_PLAYLIST_NAME = "index.m3u8"
+HLS_PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+HLS_SEGMENT_MEDIA_TYPE = "video/mp2t"
+
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_SEGMENT_PATTERN = re.compile(r"^seg_\d{5}\.ts$")
+
+
+class HlsPackager:
+    """按需把歌曲切分为 HLS 分片并缓存
+
+    分片目录名由源文件决定（源文件变化后生成新目录），分片生成后不再修改，
+    因此分片地址不需要认证和数据库查询，可以当作静态文件长期缓存。
+    """
+
+    def __init__(self, cache_dir: str = HLS_CACHE_DIR, max_bytes: int = HLS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Event] = {}
+
+    def package(self, source_path: str, stat_result: os.stat_result) -> str:
+        """返回已切片歌曲的缓存键，没有缓存时切片（阻塞，由线程池调用）"""
+        key = source_key(source_path, stat_result, f"hls:{HLS_SEGMENT_SECONDS}:{HLS_AUDIO_BITRATE}")
+        directory = os.path.join(self.cache_dir, key)
+        while True:
+            with self._lock:
+                if os.path.exists(os.path.join(directory, HLS_PLAYLIST_NAME)):
+                    self._touch(directory)
+                    return key
+                waiting = self._pending.get(key)
+                if waiting is None:
+                    done = self._pending[key] = threading.Event()
+                    break
+            # 其他请求正在切片同一首歌，等待完成后重新检查
+            waiting.wait()
+
+        try:
+            self._segment(source_path, directory)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            done.set()
+        self.evict(keep=key)
+        return key
+
+    def _segment(self, source_path: str, directory: str):
+        # 先写入临时目录，全部完成后再改名，避免返回不完整的清单
+        os.makedirs(self.cache_dir, exist_ok=True)
+        work_dir = f"{directory}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(work_dir)
+        try:
+            get_transcoder().run_ffmpeg([
+                FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", source_path, "-vn", "-map_metadata", "-1",
+                "-c:a", "aac", "-b:a", HLS_AUDIO_BITRATE,
+                "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+                "-hls_segment_filename", os.path.join(work_dir, "seg_%05d.ts"),
+                os.path.join(work_dir, HLS_PLAYLIST_NAME),
+            ])
+            if not os.path.exists(os.path.join(work_dir, HLS_PLAYLIST_NAME)):
+                raise TranscodeError("ffmpeg did not produce a playlist")
+            try:
+                os.replace(work_dir, directory)
+            except OSError:
+                # 其他进程已经完成了同一首歌的切片（目标目录非空），使用已有的结果
+                if not os.path.exists(os.path.join(directory, HLS_PLAYLIST_NAME)):
+                    raise
+                shutil.rmtree(work_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+    def playlist(self, key: str, segment_prefix: str) -> str:
+        """读取清单，把分片文件名替换为分片接口地址"""
+        with open(os.path.join(self.cache_dir, key, HLS_PLAYLIST_NAME), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        return "\n".join(
+            line if not line or line.startswith("#") else f"{segment_prefix}{key}/{line}"
+            for line in lines
+        ) + "\n"
+
+    def segment_path(self, key: str, name: str) -> Optional[str]:
+        """校验分片名称并返回文件路径（只接受生成的文件名，防止路径穿越）
+
+        同时更新目录的访问时间，正在播放的歌曲不会被缓存清理删除。
+        """
+        if not _KEY_PATTERN.match(key) or not _SEGMENT_PATTERN.match(name):
+            return None
+        directory = os.path.join(self.cache_dir, key)
+        self._touch(directory)
+        return os.path.join(directory, name)
+
+    def _touch(self, directory: str):
+        try:
+            os.utime(directory, None)
+        except OSError:
+            pass
+
+    def evict(self, keep: Optional[str] = None):
+        """缓存超过上限时，按目录的最近访问时间删除整首歌的分片"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_dir() or not _KEY_PATTERN.match(entry.name):
+                        continue
+                    size = 0
+                    with os.scandir(entry.path) as files:
+                        for file_entry in files:
+                            size += file_entry.stat().st_size
+                    total += size
+                    entries.append((entry.stat().st_mtime, size, entry.name))
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+
+
+_packager = HlsPackager()
+
+
+def get_hls_packager() -> HlsPackager:
+    """获取进程内 HLS 切片管理"""
+    return _packager
@@ -0,0 +1,244 @@
+import os
+import math
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import SessionLocal
+import models
+from utils.pcm import np, can_decode, decode_pcm, get_analysis_pool, DecodeError
+from utils.response_cache import invalidate_songs
+
+# 分析时的采样率（ffmpeg 统一转换）和最多声道数（单声道按单声道测量，多声道混合为立体声）
+LOUDNESS_SAMPLE_RATE = 48000
+LOUDNESS_CHANNELS = 2
+# ReplayGain 2.0 的参考响度（LUFS）
+REPLAYGAIN_REFERENCE = -18.0
+# EBU R128 / BS.1770：400ms 测量块，75% 重叠；绝对门限 -70 LUFS，相对门限 -10 LU
+LOUDNESS_BLOCK_SECONDS = 0.4
+LOUDNESS_HOP_SECONDS = 0.1
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# 每次做 FFT 的分段数量，限制内存占用
+LOUDNESS_FFT_BLOCKS = 256
+# 回填时每批分析的歌曲数量（每批完成后写入数据库，中断后从未分析的歌曲继续）
+LOUDNESS_BACKFILL_BATCH = 50
+
+
+def _biquad_power(b, a, w):
+    """二阶滤波器在角频率 w 处的功率响应 |H|²"""
+    z = np.exp(-1j * w)
+    response = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response) ** 2
+
+
+def k_weighting_power(freqs, sample_rate: int):
+    """BS.1770 的 K 加权（高架滤波 + 高通滤波）在各频率处的功率响应"""
+    w = 2 * np.pi * freqs / sample_rate
+
+    # 高架：+4dB，1500Hz，Q=1/√2
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * math.pi * 1500.0 / sample_rate
+    alpha = math.sin(w0) / (2 * (1 / math.sqrt(2)))
+    cos_w0 = math.cos(w0)
+    sqrt_gain = math.sqrt(gain)
+    shelf_b = (
+        gain * ((gain + 1) + (gain - 1) * cos_w0 + 2 * sqrt_gain * alpha),
+        -2 * gain * ((gain - 1) + (gain + 1) * cos_w0),
+        gain * ((gain + 1) + (gain - 1) * cos_w0 - 2 * sqrt_gain * alpha),
+    )
+    shelf_a = (
+        (gain + 1) - (gain - 1) * cos_w0 + 2 * sqrt_gain * alpha,
+        2 * ((gain - 1) - (gain + 1) * cos_w0),
+        (gain + 1) - (gain - 1) * cos_w0 - 2 * sqrt_gain * alpha,
+    )
+
+    # 高通：38Hz，Q=0.5
+    w0 = 2 * math.pi * 38.0 / sample_rate
+    alpha = math.sin(w0) / (2 * 0.5)
+    cos_w0 = math.cos(w0)
+    highpass_b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+    highpass_a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+
+    return _biquad_power(shelf_b, shelf_a, w) * _biquad_power(highpass_b, highpass_a, w)
+
+
+def measure_loudness(samples, sample_rate: int) -> Tuple[Optional[float], float]:
+    """计算积分响度（LUFS）和采样峰值（线性，0~1），静音时响度为 None
+
+    K 加权在频域中对每个测量块的功率谱加权实现（Parseval 定理），全部为向量化运算。
+    """
+    x = samples.astype(np.float32) / 32768.0
+    peak = float(np.abs(x).max()) if x.size else 0.0
+
+    # 400ms 测量块每 100ms 一个：先计算每个 100ms 分段的均方值，相邻 4 段取平均即为测量块的均方值
+    hop = int(round(LOUDNESS_HOP_SECONDS * sample_rate))
+    per_block = int(round(LOUDNESS_BLOCK_SECONDS / LOUDNESS_HOP_SECONDS))
+    segments = max(per_block, -(-len(x) // hop))
+    if len(x) < segments * hop:
+        x = np.concatenate([x, np.zeros((segments * hop - len(x), x.shape[1]), dtype=x.dtype)])
+
+    # rfft 只包含一半频谱：除直流和奈奎斯特频率外每个频点计两次
+    freqs = np.fft.rfftfreq(hop, 1.0 / sample_rate)
+    weight = k_weighting_power(freqs, sample_rate) * 2
+    weight[0] /= 2
+    if hop % 2 == 0:
+        weight[-1] /= 2
+    weight = (weight / (hop * hop)).astype(np.float32)
+
+    # (分段, 声道, 分段长度)
+    frames = x.reshape(segments, hop, x.shape[1]).transpose(0, 2, 1)
+    powers = []
+    for start in range(0, segments, LOUDNESS_FFT_BLOCKS):
+        spectrum = np.fft.rfft(frames[start:start + LOUDNESS_FFT_BLOCKS], axis=-1)
+        mean_square = (np.abs(spectrum) ** 2 * weight).sum(axis=-1)
+        # 各声道权重为 1.0（左右声道），只累加实际存在的声道
+        powers.append(mean_square.sum(axis=-1))
+    segment_power = np.concatenate(powers)
+    power = np.convolve(segment_power, np.full(per_block, 1.0 / per_block), mode="valid")
+
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(power)
+    gated = power[block_loudness > ABSOLUTE_GATE]
+    if not gated.size:
+        return None, peak
+    relative_gate = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+    gated = power[(block_loudness > ABSOLUTE_GATE) & (block_loudness > relative_gate)]
+    return -0.691 + 10 * math.log10(gated.mean()), peak
+
+
+def analyze_loudness(file_path: str) -> Tuple[Optional[float], float]:
+    """解码音频并计算响度（在子进程中运行）"""
+    samples, sample_rate = decode_pcm(file_path, LOUDNESS_SAMPLE_RATE, LOUDNESS_CHANNELS)
+    return measure_loudness(samples, sample_rate)
+
+
+def _result_mapping(song_id: int, future: Future) -> Optional[Dict]:
+    """把分析结果转换为更新字段；无法解码的歌曲也记录分析时间，避免反复重试，
+    其他错误（任务取消、超时、进程异常退出）返回 None，下次回填时重试"""
+    mapping = {
+        "id": song_id, "loudness": None, "peak": None, "replay_gain": None,
+        "loudness_analyzed_at": datetime.now(),
+    }
+    if future.cancelled():
+        return None
+    try:
+        loudness, peak = future.result()
+    except DecodeError as e:
+        print(f"Failed to analyze loudness for song {song_id}: {e}")
+        return mapping
+    except Exception as e:
+        print(f"Failed to analyze loudness for song {song_id}: {e}")
+        return None
+    mapping["peak"] = round(peak, 6)
+    if loudness is not None:
+        mapping["loudness"] = round(loudness, 2)
+        mapping["replay_gain"] = round(REPLAYGAIN_REFERENCE - loudness, 2)
+    return mapping
+
+
+def _save_results(mappings: List[Dict]):
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(models.Song, mappings)
+        db.commit()
+        invalidate_songs()
+    except Exception as e:
+        print(f"Failed to save loudness results: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+class LoudnessJobQueue:
+    """新歌曲的响度分析任务，在音频分析进程池中执行，完成后写入数据库"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+
+    def enqueue(self, song_id: int, file_path: str) -> Optional[Future]:
+        """提交响度分析任务，同一首歌已在分析时返回同一个任务"""
+        if np is None or not can_decode(file_path):
+            return None
+        with self._lock:
+            future = self._pending.get(song_id)
+            if future is not None:
+                return future
+        future = get_analysis_pool().submit(analyze_loudness, file_path)
+        if future is None:
+            return None
+        with self._lock:
+            self._pending[song_id] = future
+        future.add_done_callback(lambda f: self._finish(song_id, f))
+        return future
+
+    def is_pending(self, song_id: int) -> bool:
+        with self._lock:
+            return song_id in self._pending
+
+    def _finish(self, song_id: int, future: Future):
+        try:
+            mapping = _result_mapping(song_id, future)
+            if mapping is not None:
+                _save_results([mapping])
+        finally:
+            with self._lock:
+                if self._pending.get(song_id) is future:
+                    del self._pending[song_id]
+
+
+_queue = LoudnessJobQueue()
+
+
+def get_loudness_queue() -> LoudnessJobQueue:
+    """获取进程内响度分析队列"""
+    return _queue
+
+
+def backfill_loudness(batch_size: int = LOUDNESS_BACKFILL_BATCH,
+                      renew: Optional[Callable[[], bool]] = None) -> int:
+    """分析尚未分析过响度的歌曲，返回分析的数量；renew 为每批调用一次的续锁回调，返回 False 时停止"""
+    if np is None:
+        return 0
+    pool = get_analysis_pool()
+    queue = get_loudness_queue()
+    db = SessionLocal()
+    analyzed = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(models.Song.id, models.Song.file_path).filter(
+                models.Song.loudness_analyzed_at.is_(None),
+                models.Song.id > last_id
+            ).order_by(models.Song.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # 暂时无法解码的格式（没有 ffmpeg）不记录，安装 ffmpeg 后再分析
+            # 已在队列中分析的新歌曲由队列写入结果
+            futures = [
+                (song_id, pool.submit(analyze_loudness, file_path)) for song_id, file_path in rows
+                if file_path and can_decode(file_path) and not queue.is_pending(song_id) and os.path.exists(file_path)
+            ]
+            if any(future is None for _, future in futures):
+                # 服务正在关闭
+                break
+            mappings = [_result_mapping(song_id, future) for song_id, future in futures]
+            mappings = [mapping for mapping in mappings if mapping is not None]
+            if mappings:
+                _save_results(mappings)
+                analyzed += len(mappings)
+            if renew is not None and not renew():
+                break
+
+        if analyzed:
+            print(f"已分析 {analyzed} 首歌曲的响度。")
+        return analyzed
+    except Exception as e:
+        print(f"回填响度时发生错误: {e}")
+        return analyzed
+    finally:
+        db.close()
@@ -0,0 +1,97 @@
+import json
+import base64
+from datetime import datetime
+from typing import Optional, List, Sequence, Any
+
+from sqlalchemy import and_, or_, type_coerce, String
+from sqlalchemy.orm import Query
+
+import models
+
+# 歌曲列表可用的排序键（均为降序，以 id 作为唯一的决胜列）
+SONG_SORT_COLUMNS = {
+    "created_at": (models.Song.created_at, models.Song.id),
+    "play_count": (models.Song.play_count, models.Song.id),
+}
+DEFAULT_SONG_SORT = "created_at"
+
+# 歌单列表按创建时间降序
+PLAYLIST_SORT = "created_at"
+PLAYLIST_COLUMNS = (models.Playlist.created_at, models.Playlist.id)
+
+# 歌单内歌曲按 (order_index, id) 升序
+PLAYLIST_SONG_SORT = "order_index"
+PLAYLIST_SONG_COLUMNS = (models.PlaylistSong.order_index, models.PlaylistSong.id)
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前排序方式不匹配"""
+
+
+def _serialize(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _deserialize(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """将排序键的值编码为不透明游标"""
+    payload = json.dumps({"s": sort, "v": [_serialize(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    """解码游标，返回排序键的值"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = [_deserialize(v) for v in payload["v"]]
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+    if payload.get("s") != sort:
+        raise InvalidCursorError("Cursor does not match sort order")
+    return values
+
+
+def _bind_value(value: Any) -> Any:
+    # SQLite 以文本保存 CURRENT_TIMESTAMP（不含微秒），按相同格式绑定时间才能正确比较；MySQL 会自动转换
+    if isinstance(value, datetime):
+        return type_coerce(value.isoformat(sep=" "), String)
+    return value
+
+
+def keyset_filter(columns: Sequence, values: Sequence[Any], descending: bool):
+    """构造 (c1, c2, ...) 严格位于游标之后的条件，展开为 OR 形式以便使用复合索引"""
+    values = [_bind_value(v) for v in values]
+    conditions = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        boundary = column < values[i] if descending else column > values[i]
+        conditions.append(and_(*equal_prefix, boundary))
+    return or_(*conditions)
+
+
+def paginate_keyset(query: Query, columns: Sequence, sort: str, limit: int,
+                    cursor: Optional[str], descending: bool = True):
+    """按键集分页执行查询，返回 (结果列表, 下一页游标)"""
+    if cursor:
+        values = decode_cursor(cursor, sort)
+        if len(values) != len(columns):
+            raise InvalidCursorError("Invalid cursor")
+        query = query.filter(keyset_filter(columns, values, descending))
+
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, [getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
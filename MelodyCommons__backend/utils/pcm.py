@@ -0,0 +1,126 @@
+import subprocess
+import threading
+import wave
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from mutagen import File as MutagenFile
+
+from utils.transcode import FFMPEG_BINARY
+
+try:
+    # 音频分析（波形、响度）使用 NumPy 向量化，未安装时不提供这些功能
+    import numpy as np
+except ImportError:
+    np = None
+
+# 单首歌解码的最长时间（秒）
+DECODE_TIMEOUT = 300
+# 音频分析（解码和计算是 CPU 密集型操作）的进程数
+ANALYSIS_WORKERS = 2
+
+
+class DecodeError(Exception):
+    """无法解码音频"""
+
+
+def is_analysis_available() -> bool:
+    return np is not None
+
+
+def can_decode(file_path: str) -> bool:
+    """没有 ffmpeg 时只能解码 WAV"""
+    return FFMPEG_BINARY is not None or file_path.lower().endswith(".wav")
+
+
+def source_channel_count(file_path: str) -> Optional[int]:
+    """读取音频文件的声道数，无法识别时返回 None"""
+    try:
+        audio = MutagenFile(file_path)
+    except Exception:
+        return None
+    channels = getattr(getattr(audio, "info", None), "channels", None)
+    return channels if isinstance(channels, int) and channels > 0 else None
+
+
+def decode_pcm(file_path: str, sample_rate: int, max_channels: int) -> Tuple["np.ndarray", int]:
+    """解码为 int16 采样，返回 (形状为 (帧数, 声道数) 的数组, 采样率)
+
+    声道数为源文件的声道数，超过 max_channels 时混合为 max_channels 个声道（不会把单声道复制为多声道）。
+    有 ffmpeg 时按指定的采样率输出；没有 ffmpeg 时只能读取 WAV，保持原采样率。
+    """
+    if np is None:
+        raise DecodeError("numpy is not installed")
+
+    if FFMPEG_BINARY is not None:
+        channels = min(source_channel_count(file_path) or max_channels, max_channels)
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-i", file_path, "-vn",
+             "-ac", str(channels), "-ar", str(sample_rate), "-f", "s16le", "-"],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            timeout=DECODE_TIMEOUT
+        )
+        if result.returncode != 0:
+            raise DecodeError(result.stderr.decode("utf-8", "replace").strip()[-500:] or "ffmpeg failed")
+        data = np.frombuffer(result.stdout, dtype="<i2")
+        data = data[:len(data) - len(data) % channels].reshape(-1, channels)
+        return data, sample_rate
+
+    # 没有 ffmpeg 时只支持 16 位 PCM WAV
+    if not can_decode(file_path):
+        raise DecodeError("ffmpeg is required to decode this format")
+    try:
+        with wave.open(file_path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise DecodeError("Only 16-bit WAV files are supported without ffmpeg")
+            source_channels = wav.getnchannels()
+            rate = wav.getframerate()
+            data = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    except (wave.Error, EOFError) as e:
+        raise DecodeError(str(e))
+
+    data = data[:len(data) - len(data) % source_channels].reshape(-1, source_channels)
+    if source_channels > max_channels:
+        # 混合为单声道，再按需要复制到各声道
+        mono = data.mean(axis=1).astype(np.int16)
+        data = np.repeat(mono[:, None], max_channels, axis=1)
+    return data, rate
+
+
+
+class AnalysisPool:
+    """音频分析进程池，波形和响度分析共用，限制总的 CPU 占用"""
+
+    def __init__(self, workers: int = ANALYSIS_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+
+    def submit(self, fn, *args) -> Optional[Future]:
+        """提交任务；服务关闭后返回 None"""
+        with self._lock:
+            if self._closed:
+                return None
+            if self._executor is None:
+                # 服务进程中有多个线程，使用 spawn 避免 fork 后的锁状态问题
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = AnalysisPool()
+
+
+def get_analysis_pool() -> AnalysisPool:
+    """获取进程内音频分析进程池"""
+    return _pool
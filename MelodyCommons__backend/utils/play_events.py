@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from database import SessionLocal
+import crud
+
+# 缓冲区定时写入数据库的间隔（秒）
+FLUSH_INTERVAL = 5.0
+# 缓冲的播放事件达到该数量时立即写入
+FLUSH_THRESHOLD = 500
+# 同一用户在该时间（秒）内重复请求同一首歌（HLS 播放器重新加载清单、重试）只计一次播放
+PLAY_DEDUPE_WINDOW = 120.0
+# 去重时保留的最近播放记录数量
+MAX_RECENT_PLAYS = 10000
+
+
+class PlayCountBuffer:
+    """播放次数缓冲区：在内存中聚合播放事件，由后台线程批量写入数据库"""
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, threshold: int = FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = {}
+        self._pending_events = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台写入线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="play-count-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程并写入剩余的播放事件"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+        self.flush()
+
+    def record(self, song_id: int, count: int = 1):
+        """记录播放事件（不访问数据库）"""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._pending[song_id] = self._pending.get(song_id, 0) + count
+            self._pending_events += count
+            full = self._pending_events >= self.threshold
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """将缓冲的播放次数写入数据库，返回写入的歌曲数量"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._pending_events = 0
+        if not pending:
+            return 0
+
+        db = SessionLocal()
+        try:
+            try:
+                crud.add_play_counts(db, pending)
+            except Exception as e:
+                print(f"Failed to flush play counts: {e}")
+                db.rollback()
+                # 写入失败时放回缓冲区，等待下次重试
+                with self._lock:
+                    for song_id, count in pending.items():
+                        self._pending[song_id] = self._pending.get(song_id, 0) + count
+                        self._pending_events += count
+                return 0
+            # 播放次数已提交，排行榜更新失败不能再放回缓冲区，否则会重复计数
+            crud.update_leaderboard_scores(db, list(pending))
+            return len(pending)
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            self.flush()
+
+
+class RecentPlays:
+    """最近的 (用户, 歌曲) 播放记录，用于在时间窗口内去重"""
+
+    def __init__(self, window: float = PLAY_DEDUPE_WINDOW, max_entries: int = MAX_RECENT_PLAYS):
+        self.window = window
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._plays: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+
+    def first_play(self, user_id: int, song_id: int) -> bool:
+        """窗口内第一次播放时返回 True 并记录"""
+        now = time.monotonic()
+        key = (user_id, song_id)
+        with self._lock:
+            # 按记录时间顺序清理过期记录
+            while self._plays:
+                played_at = next(iter(self._plays.values()))
+                if now - played_at < self.window and len(self._plays) < self.max_entries:
+                    break
+                self._plays.popitem(last=False)
+            if key in self._plays:
+                return False
+            self._plays[key] = now
+            return True
+
+
+_buffer = PlayCountBuffer()
+_recent_plays = RecentPlays()
+
+
+def get_play_count_buffer() -> PlayCountBuffer:
+    """获取进程内播放次数缓冲区"""
+    return _buffer
+
+
+def record_play(song_id: int):
+    """记录一次播放"""
+    _buffer.record(song_id)
+
+
+def record_session_play(user_id: int, song_id: int) -> bool:
+    """记录一次播放，同一用户 PLAY_DEDUPE_WINDOW 内重复请求同一首歌不重复计数"""
+    if not _recent_plays.first_play(user_id, song_id):
+        return False
+    _buffer.record(song_id)
+    return True
@@ -0,0 +1,198 @@
+import time
+import random
+import threading
+from typing import List, Dict, Optional
+
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+import models
+
+# 是否启用内存排行榜（关闭后每次都直接查询数据库）
+LEADERBOARD_ENABLED = True
+# 排行榜保留的歌曲数量，需大于热门接口的最大 limit
+LEADERBOARD_SIZE = 200
+# 排行榜定期从数据库重新加载的间隔（秒），用于同步其他进程产生的播放
+LEADERBOARD_TTL = 300
+# 同播放次数的分组不超过 k 的该倍数时，读取整个分组后抽样
+TIE_SAMPLE_FACTOR = 4
+
+
+def _shuffle_within_groups(songs: List[models.Song]) -> List[models.Song]:
+    """按播放次数从高到低排列，播放次数相同的歌曲随机打乱"""
+    groups: Dict[int, List[models.Song]] = {}
+    for song in songs:
+        groups.setdefault(song.play_count, []).append(song)
+
+    result = []
+    for count in sorted(groups.keys(), reverse=True):
+        random.shuffle(groups[count])
+        result.extend(groups[count])
+    return result
+
+
+def _load_songs(db: Session, song_ids: List[int]) -> List[models.Song]:
+    """按ID批量加载歌曲，并保持传入顺序"""
+    if not song_ids:
+        return []
+    songs = db.query(models.Song).filter(models.Song.id.in_(song_ids)).all()
+    by_id = {song.id: song for song in songs}
+    return [by_id[song_id] for song_id in song_ids if song_id in by_id]
+
+
+def sample_play_count_bucket(db: Session, play_count: int, k: int) -> List[int]:
+    """从播放次数等于 play_count 的歌曲中均匀随机抽取 k 个ID
+
+    分组不超过 k * TIE_SAMPLE_FACTOR 首时读取整个分组后抽样；否则随机选取 k 个不同的位置，
+    每个位置在 (play_count, id) 索引上用 OFFSET 读取一行，不会读取整个分组。
+    """
+    if k <= 0:
+        return []
+
+    bucket = models.Song.play_count == play_count
+    total = db.query(func.count(models.Song.id)).filter(bucket).scalar()
+    if not total:
+        return []
+
+    query = db.query(models.Song.id).filter(bucket).order_by(models.Song.id)
+    if total <= k * TIE_SAMPLE_FACTOR:
+        ids = [row.id for row in query]
+        return random.sample(ids, min(k, len(ids)))
+
+    ids = []
+    for offset in random.sample(range(total), k):
+        song_id = query.offset(offset).limit(1).scalar()
+        # 抽样期间分组可能发生变化（播放次数更新），跳过已不存在的位置
+        if song_id is not None and song_id not in ids:
+            ids.append(song_id)
+    return ids
+
+
+def query_top_songs(db: Session, limit: int) -> List[models.Song]:
+    """直接在数据库中计算热门歌曲，查询行数与 limit 成正比"""
+    # 第 limit 名的播放次数即为边界分组
+    boundary = db.query(models.Song.play_count).order_by(
+        desc(models.Song.play_count)
+    ).offset(limit - 1).limit(1).scalar()
+
+    if boundary is None:
+        # 歌曲总数不超过 limit，直接返回所有歌曲并随机打乱顺序
+        songs = db.query(models.Song).order_by(desc(models.Song.play_count)).limit(limit).all()
+        random.shuffle(songs)
+        return songs
+
+    above = db.query(models.Song).filter(
+        models.Song.play_count > boundary
+    ).order_by(desc(models.Song.play_count)).limit(limit).all()
+    tie_ids = sample_play_count_bucket(db, boundary, limit - len(above))
+    return _shuffle_within_groups(above) + _load_songs(db, tie_ids)
+
+
+class Leaderboard:
+    """内存中的热门歌曲排行榜，保存播放次数最高的 LEADERBOARD_SIZE 首歌曲"""
+
+    def __init__(self, size: int = LEADERBOARD_SIZE, ttl: int = LEADERBOARD_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        # 数据库中歌曲总数不超过 size 时，排行榜包含全部歌曲
+        self._complete = False
+        self._loaded_at: Optional[float] = None
+
+    def invalidate(self):
+        """标记排行榜失效，下次读取时重新加载"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def refresh(self, db: Session):
+        """从数据库加载前 size 名"""
+        rows = db.query(models.Song.id, models.Song.play_count).order_by(
+            desc(models.Song.play_count), desc(models.Song.id)
+        ).limit(self.size).all()
+        with self._lock:
+            self._counts = {row.id: row.play_count for row in rows}
+            self._complete = len(rows) < self.size
+            self._loaded_at = time.monotonic()
+
+    def record_play(self, song_id: int, play_count: int):
+        """播放次数变化后更新排行榜"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if song_id in self._counts or self._complete:
+                self._counts[song_id] = play_count
+                if len(self._counts) >= self.size:
+                    self._complete = False
+                return
+            if len(self._counts) < self.size:
+                # 排行榜不完整时无法判断榜外歌曲的排名，等待下次刷新
+                self._loaded_at = None
+                return
+
+            weakest = min(self._counts, key=self._counts.get)
+            if play_count > self._counts[weakest]:
+                del self._counts[weakest]
+                self._counts[song_id] = play_count
+
+    def discard(self, song_id: int):
+        """歌曲被删除时移出排行榜"""
+        with self._lock:
+            if self._counts.pop(song_id, None) is not None and not self._complete:
+                # 榜外的下一名未知，需要重新加载
+                self._loaded_at = None
+
+    def top_songs(self, db: Session, limit: int) -> Optional[List[models.Song]]:
+        """从排行榜计算热门歌曲；排行榜无法确定结果时返回 None"""
+        if not self._is_fresh():
+            self.refresh(db)
+
+        with self._lock:
+            entries = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+            complete = self._complete
+
+        if len(entries) <= limit:
+            if not complete:
+                return None
+            ids = [song_id for song_id, _ in entries]
+            random.shuffle(ids)
+            songs = _load_songs(db, ids)
+            return songs if len(songs) == len(ids) else None
+
+        boundary = entries[limit - 1][1]
+        above = [song_id for song_id, count in entries if count > boundary]
+        ties = [song_id for song_id, count in entries if count == boundary]
+
+        if complete or entries[-1][1] > boundary:
+            # 边界分组的所有歌曲都在排行榜中
+            tie_ids = random.sample(ties, limit - len(above))
+        else:
+            tie_ids = sample_play_count_bucket(db, boundary, limit - len(above))
+
+        above_songs = _load_songs(db, above)
+        tie_songs = _load_songs(db, tie_ids)
+        if len(above_songs) != len(above) or len(tie_songs) != len(tie_ids):
+            # 排行榜中存在已删除的歌曲
+            self.invalidate()
+            return None
+        return _shuffle_within_groups(above_songs) + tie_songs
+
+
+_leaderboard = Leaderboard()
+
+
+def get_leaderboard() -> Leaderboard:
+    """获取进程内排行榜"""
+    return _leaderboard
+
+
+def get_top_songs(db: Session, limit: int = 10) -> List[models.Song]:
+    """获取热门歌曲（按播放次数排序，播放次数相同时随机选择）"""
+    if LEADERBOARD_ENABLED and limit <= _leaderboard.size:
+        songs = _leaderboard.top_songs(db, limit)
+        if songs is not None:
+            return songs
+    return query_top_songs(db, limit)
@@ -0,0 +1,172 @@
+import threading
+from typing import Any, Callable, Optional, Sequence
+
+from fastapi.responses import Response
+
+from utils.cache import TTLCache
+from utils.serialization import fast_json_response
+
+# 是否启用接口响应缓存
+RESPONSE_CACHE_ENABLED = True
+# 本地缓存的条目数量和过期时间（秒）；播放次数的变化最多延迟该时间可见
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL = 30
+# 共享缓存地址（例如 redis://localhost:6379/0），为空时使用进程内缓存
+RESPONSE_CACHE_URL: Optional[str] = None
+
+# 缓存命名空间：写操作使对应命名空间的所有缓存失效
+SONGS_NAMESPACE = "songs"
+PLAYLISTS_NAMESPACE = "playlists"
+
+
+def playlist_namespace(playlist_id: int) -> str:
+    return f"playlist:{playlist_id}"
+
+
+class LocalCacheBackend:
+    """进程内缓存后端"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._cache.set(key, value, ttl=ttl)
+
+    def get_generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def bump_generation(self, namespace: str):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisCacheBackend:
+    """Redis 缓存后端，多个进程共享缓存和失效版本号"""
+
+    def __init__(self, url: str, prefix: str = "mc:resp:"):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self._prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._client.set(self._prefix + key, value, ex=max(1, int(ttl)))
+
+    def get_generation(self, namespace: str) -> int:
+        return int(self._client.get(f"{self._prefix}gen:{namespace}") or 0)
+
+    def bump_generation(self, namespace: str):
+        self._client.incr(f"{self._prefix}gen:{namespace}")
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{self._prefix}*"):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    """接口响应缓存：按路由和参数缓存序列化后的 JSON
+
+    每个命名空间有一个版本号，缓存键包含相关命名空间的版本号；写操作只需增加版本号，
+    旧的缓存条目不再被读取，随后按 LRU / TTL 淘汰。
+    """
+
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.backend = backend or LocalCacheBackend(ttl=ttl)
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, namespaces: Sequence[str], key: str) -> str:
+        versions = ",".join(f"{ns}@{self.backend.get_generation(ns)}" for ns in namespaces)
+        return f"{versions}|{key}"
+
+    def invalidate(self, *namespaces: str):
+        """使命名空间下的缓存失效"""
+        for namespace in namespaces:
+            try:
+                self.backend.bump_generation(namespace)
+            except Exception as e:
+                print(f"Failed to invalidate response cache: {e}")
+        with self._lock:
+            self.invalidations += 1
+
+    def json(self, namespaces: Sequence[str], key: str, build: Callable[[], Any]) -> Response:
+        """返回缓存的 JSON 响应，未命中时调用 build 生成内容并写入缓存"""
+        if not self.enabled:
+            return fast_json_response(build())
+
+        try:
+            full_key = self.make_key(namespaces, key)
+            body = self.backend.get(full_key)
+        except Exception as e:
+            # 共享缓存不可用时直接查询数据库
+            print(f"Response cache unavailable: {e}")
+            return fast_json_response(build())
+
+        if body is not None:
+            with self._lock:
+                self.hits += 1
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+        with self._lock:
+            self.misses += 1
+        response = fast_json_response(build())
+        try:
+            self.backend.set(full_key, response.body, self.ttl)
+        except Exception as e:
+            print(f"Failed to write response cache: {e}")
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis" if isinstance(self.backend, RedisCacheBackend) else "local",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def _create_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_URL:
+        try:
+            return ResponseCache(backend=RedisCacheBackend(RESPONSE_CACHE_URL))
+        except Exception as e:
+            print(f"无法连接共享缓存，改用进程内缓存: {e}")
+    return ResponseCache()
+
+
+_response_cache = _create_response_cache()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取接口响应缓存"""
+    return _response_cache
+
+
+def invalidate_songs():
+    """歌曲增删改后调用：歌曲列表、歌曲详情、歌单内容都会失效"""
+    _response_cache.invalidate(SONGS_NAMESPACE)
+
+
+def invalidate_playlist(playlist_id: Optional[int] = None):
+    """歌单或歌单内容变化后调用"""
+    if playlist_id is None:
+        _response_cache.invalidate(PLAYLISTS_NAMESPACE)
+    else:
+        _response_cache.invalidate(PLAYLISTS_NAMESPACE, playlist_namespace(playlist_id))
@@ -0,0 +1,500 @@
+import re
+import time
+import bisect
+import threading
+import unicodedata
+from typing import Optional, List, Dict, Tuple, Sequence
+
+from sqlalchemy import text, case, func, or_
+from sqlalchemy.orm import Session, Query
+
+from database import engine, SessionLocal
+import models
+from utils.pagination import paginate_keyset, encode_cursor, _bind_value
+
+# 搜索后端: "auto" 根据数据库类型自动选择, 也可显式指定 "mysql" / "fts5" / "memory"
+SEARCH_BACKEND = "auto"
+# 内存倒排索引：游标分页时命中数量不超过该值用 IN 条件过滤，超过时按排序键分批扫描并在内存中过滤
+MAX_SEARCH_CANDIDATES = 5000
+# 内存倒排索引按排序键扫描时每批读取的行数
+SEARCH_SCAN_BATCH = 1000
+# 内存倒排索引检查数据库变化（其他进程、批量导入、文件监听写入的歌曲）的最短间隔（秒）
+SEARCH_INDEX_CHECK_INTERVAL = 2.0
+# 字段权重（标题 > 艺术家 > 专辑）
+FIELD_WEIGHTS = {"title": 3.0, "artist": 2.0, "album": 1.0}
+
+MYSQL_FULLTEXT_INDEX = "ft_songs_search"
+FTS5_TABLE = "songs_fts"
+
+# 中日韩字符范围（假名、汉字、谚文）
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_PATTERN = re.compile(f"[{_CJK_RANGES}]+|[^\\W_{_CJK_RANGES}]+")
+_CJK_PATTERN = re.compile(f"[{_CJK_RANGES}]")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """统一全半角与大小写"""
+    if not value:
+        return ""
+    return unicodedata.normalize("NFKC", value).lower()
+
+
+def _is_cjk(word: str) -> bool:
+    return bool(_CJK_PATTERN.match(word))
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """索引分词：拉丁文本按单词切分，中日韩文本切分为单字和双字"""
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(normalize_text(value)):
+        if _is_cjk(word):
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def parse_query(value: Optional[str]) -> List[Tuple[str, bool]]:
+    """查询分词，返回 [(词项, 是否前缀匹配)]，所有词项需同时命中"""
+    terms = []
+    for word in _TOKEN_PATTERN.findall(normalize_text(value)):
+        if _is_cjk(word):
+            if len(word) == 1:
+                terms.append((word, False))
+            else:
+                terms.extend((word[i:i + 2], False) for i in range(len(word) - 1))
+        else:
+            terms.append((word, True))
+    return terms
+
+
+def _like_filter(query: Query, search: str) -> Query:
+    """无法分词时退回到 LIKE 匹配"""
+    search_filter = f"%{search}%"
+    return query.filter(
+        (models.Song.title.like(search_filter)) |
+        (models.Song.artist.like(search_filter)) |
+        (models.Song.album.like(search_filter))
+    )
+
+
+class SearchIndex:
+    """搜索索引基类"""
+
+    name = "base"
+
+    def setup(self):
+        """创建索引结构（应用启动时调用）"""
+
+    def index_song(self, db: Session, song: models.Song):
+        """新增或更新歌曲索引"""
+
+    def remove_song(self, db: Session, song_id: int):
+        """移除歌曲索引"""
+
+    def apply(self, db: Session, query: Query, search: str, ranked: bool = True) -> Query:
+        """为查询添加搜索条件；ranked 为 True 时按相关度排序"""
+        raise NotImplementedError
+
+    def page(self, db: Session, query: Query, search: str, skip: int, limit: int) -> Query:
+        """按相关度排序并分页"""
+        return self.apply(db, query, search).offset(skip).limit(limit)
+
+    def keyset_page(self, db: Session, query: Query, search: str, columns: Sequence, sort: str,
+                    limit: int, cursor: Optional[str]):
+        """按排序键游标分页，搜索只作为过滤条件，返回(结果列表, 下一页游标)"""
+        return paginate_keyset(self.apply(db, query, search, ranked=False), columns, sort, limit, cursor)
+
+
+class MySQLFulltextIndex(SearchIndex):
+    """MySQL FULLTEXT 索引（ngram 分词器，支持中文）"""
+
+    name = "mysql"
+
+    def setup(self):
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SHOW INDEX FROM songs WHERE Key_name = :name"),
+                {"name": MYSQL_FULLTEXT_INDEX}
+            ).first()
+            if not exists:
+                print("正在创建歌曲全文索引...")
+                conn.execute(text(
+                    f"ALTER TABLE songs ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} "
+                    f"(title, artist, album) WITH PARSER ngram"
+                ))
+
+    @staticmethod
+    def build_query(search: str) -> str:
+        # ngram 分词器在布尔模式下会把词项转换为短语匹配，可同时覆盖中文与拉丁文本
+        parts = []
+        for word in _TOKEN_PATTERN.findall(normalize_text(search)):
+            parts.append(f"+{word}*" if len(word) == 1 else f'+"{word}"')
+        return " ".join(parts)
+
+    def apply(self, db: Session, query: Query, search: str, ranked: bool = True) -> Query:
+        boolean_query = self.build_query(search)
+        if not boolean_query:
+            return _like_filter(query, search)
+
+        match = "MATCH (songs.title, songs.artist, songs.album) AGAINST (:search_query IN BOOLEAN MODE)"
+        query = query.filter(text(match)).params(search_query=boolean_query)
+        if ranked:
+            query = query.order_by(text(f"{match} DESC"), models.Song.id.desc())
+        return query
+
+
+class FTS5Index(SearchIndex):
+    """SQLite FTS5 虚拟表，写入预分词后的文本"""
+
+    name = "fts5"
+
+    def setup(self):
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS5_TABLE} "
+                f"USING fts5(title, artist, album, tokenize='unicode61 remove_diacritics 2')"
+            ))
+            indexed = conn.execute(text(f"SELECT COUNT(*) FROM {FTS5_TABLE}")).scalar()
+            total = conn.execute(text("SELECT COUNT(*) FROM songs")).scalar()
+        if indexed != total:
+            self.rebuild()
+
+    def rebuild(self):
+        """根据 songs 表重建全文索引"""
+        print("正在重建歌曲全文索引...")
+        db = SessionLocal()
+        try:
+            db.execute(text(f"DELETE FROM {FTS5_TABLE}"))
+            rows = db.query(
+                models.Song.id, models.Song.title, models.Song.artist, models.Song.album
+            ).yield_per(1000)
+            batch = []
+            for row in rows:
+                batch.append(self._row_params(row.id, row.title, row.artist, row.album))
+                if len(batch) >= 1000:
+                    self._insert(db, batch)
+                    batch = []
+            if batch:
+                self._insert(db, batch)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _row_params(song_id: int, title: str, artist: str, album: Optional[str]) -> Dict:
+        return {
+            "rowid": song_id,
+            "title": " ".join(tokenize(title)),
+            "artist": " ".join(tokenize(artist)),
+            "album": " ".join(tokenize(album)),
+        }
+
+    @staticmethod
+    def _insert(db: Session, params):
+        db.execute(
+            text(f"INSERT INTO {FTS5_TABLE} (rowid, title, artist, album) VALUES (:rowid, :title, :artist, :album)"),
+            params
+        )
+
+    def index_song(self, db: Session, song: models.Song):
+        db.execute(text(f"DELETE FROM {FTS5_TABLE} WHERE rowid = :rowid"), {"rowid": song.id})
+        self._insert(db, self._row_params(song.id, song.title, song.artist, song.album))
+        db.commit()
+
+    def remove_song(self, db: Session, song_id: int):
+        db.execute(text(f"DELETE FROM {FTS5_TABLE} WHERE rowid = :rowid"), {"rowid": song_id})
+        db.commit()
+
+    @staticmethod
+    def build_query(search: str) -> str:
+        parts = []
+        for term, prefix in parse_query(search):
+            parts.append(f'"{term}"*' if prefix else f'"{term}"')
+        return " AND ".join(parts)
+
+    def apply(self, db: Session, query: Query, search: str, ranked: bool = True) -> Query:
+        match_query = self.build_query(search)
+        if not match_query:
+            return _like_filter(query, search)
+
+        weights = ", ".join(str(w) for w in FIELD_WEIGHTS.values())
+        matches = text(
+            f"SELECT rowid AS song_id, bm25({FTS5_TABLE}, {weights}) AS score "
+            f"FROM {FTS5_TABLE} WHERE {FTS5_TABLE} MATCH :match_query"
+        ).columns(song_id=models.Song.id.type).subquery("search_matches")
+        query = query.join(matches, matches.c.song_id == models.Song.id).params(match_query=match_query)
+        if ranked:
+            # bm25 分数越小越相关
+            query = query.order_by(text("search_matches.score"), models.Song.id.desc())
+        return query
+
+
+class InMemoryIndex(SearchIndex):
+    """进程内倒排索引（数据库不支持全文索引时使用）
+
+    其他进程（多个 worker、批量导入、文件监听）写入的歌曲不会经过本进程的 index_song，
+    搜索前按 (歌曲数, 最大 ID, 最大 updated_at) 检查数据库是否变化，变化时增量更新索引。
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._documents: Dict[int, Dict[str, float]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._loaded = False
+        self._signature = None
+        self._checked_at = 0.0
+
+    def setup(self):
+        self._ensure_loaded()
+
+    @staticmethod
+    def _db_signature(db: Session):
+        return db.query(
+            func.count(models.Song.id), func.max(models.Song.id), func.max(models.Song.updated_at)
+        ).one()
+
+    def _ensure_loaded(self, db: Optional[Session] = None):
+        if self._loaded:
+            self._refresh(db)
+            return
+        session = db or SessionLocal()
+        try:
+            signature = self._db_signature(session)
+            rows = session.query(
+                models.Song.id, models.Song.title, models.Song.artist, models.Song.album
+            ).yield_per(1000)
+            with self._lock:
+                if self._loaded:
+                    return
+                for row in rows:
+                    self._add(row.id, row.title, row.artist, row.album)
+                self._signature = tuple(signature)
+                self._checked_at = time.monotonic()
+                self._loaded = True
+        finally:
+            if db is None:
+                session.close()
+
+    def _refresh(self, db: Optional[Session] = None):
+        """数据库变化时更新索引：重新索引新增和修改过的歌曲，移除已删除的歌曲"""
+        now = time.monotonic()
+        if now - self._checked_at < SEARCH_INDEX_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+
+        session = db or SessionLocal()
+        try:
+            signature = tuple(self._db_signature(session))
+            previous = self._signature
+            if signature == previous:
+                return
+            _, last_id, last_updated = previous
+            changed = session.query(
+                models.Song.id, models.Song.title, models.Song.artist, models.Song.album
+            )
+            conditions = [models.Song.id > (last_id or 0)]
+            if last_updated is not None:
+                # updated_at 精度为秒，同一秒内的修改需要包含边界
+                conditions.append(models.Song.updated_at >= _bind_value(last_updated))
+            changed = changed.filter(or_(*conditions)).all()
+
+            with self._lock:
+                for row in changed:
+                    self._remove(row.id)
+                    self._add(row.id, row.title, row.artist, row.album)
+                stale = len(self._documents) != signature[0]
+            if stale:
+                # 其他进程删除了歌曲
+                existing = {song_id for song_id, in session.query(models.Song.id)}
+                with self._lock:
+                    for song_id in [song_id for song_id in self._documents if song_id not in existing]:
+                        self._remove(song_id)
+            self._signature = signature
+        except Exception as e:
+            print(f"更新内存搜索索引失败: {e}")
+        finally:
+            if db is None:
+                session.close()
+
+    def _add(self, song_id: int, title: str, artist: str, album: Optional[str]):
+        weights: Dict[str, float] = {}
+        for field, value in (("title", title), ("artist", artist), ("album", album)):
+            for token in tokenize(value):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._vocabulary_dirty = True
+            postings[song_id] = weight
+        self._documents[song_id] = weights
+
+    def _remove(self, song_id: int):
+        weights = self._documents.pop(song_id, None)
+        if weights is None:
+            return
+        for token in weights:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(song_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    def index_song(self, db: Session, song: models.Song):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(song.id)
+            self._add(song.id, song.title, song.artist, song.album)
+
+    def remove_song(self, db: Session, song_id: int):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove(song_id)
+
+    def _term_postings(self, term: str, prefix: bool) -> Dict[int, float]:
+        if not prefix:
+            return dict(self._postings.get(term, {}))
+
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        merged: Dict[int, float] = {}
+        position = bisect.bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+            token = self._vocabulary[position]
+            # 完整命中的词比前缀命中的词得分更高
+            factor = 1.0 if token == term else 0.5
+            for song_id, weight in self._postings.get(token, {}).items():
+                merged[song_id] = max(merged.get(song_id, 0.0), weight * factor)
+            position += 1
+        return merged
+
+    def search_ids(self, search: str, db: Optional[Session] = None) -> List[int]:
+        """返回按相关度排序的全部命中歌曲ID"""
+        self._ensure_loaded(db)
+        terms = parse_query(search)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for term, prefix in terms:
+                postings = self._term_postings(term, prefix)
+                if scores is None:
+                    scores = postings
+                else:
+                    scores = {sid: score + postings[sid] for sid, score in scores.items() if sid in postings}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [song_id for song_id, _ in ranked]
+
+    @staticmethod
+    def _filter_ranked(query: Query, song_ids: List[int]) -> Query:
+        if not song_ids:
+            return query.filter(False)
+        ordering = case({song_id: rank for rank, song_id in enumerate(song_ids)}, value=models.Song.id)
+        return query.filter(models.Song.id.in_(song_ids)).order_by(ordering)
+
+    def apply(self, db: Session, query: Query, search: str, ranked: bool = True) -> Query:
+        if not parse_query(search):
+            return _like_filter(query, search)
+
+        song_ids = self.search_ids(search, db)
+        if not ranked:
+            return query.filter(models.Song.id.in_(song_ids)) if song_ids else query.filter(False)
+        return self._filter_ranked(query, song_ids)
+
+    def page(self, db: Session, query: Query, search: str, skip: int, limit: int) -> Query:
+        # 在索引中分页，数据库只查询当前页的歌曲
+        if not parse_query(search):
+            return super().page(db, query, search, skip, limit)
+        return self._filter_ranked(query, self.search_ids(search, db)[skip:skip + limit])
+
+    def keyset_page(self, db: Session, query: Query, search: str, columns: Sequence, sort: str,
+                    limit: int, cursor: Optional[str]):
+        if not parse_query(search):
+            return super().keyset_page(db, query, search, columns, sort, limit, cursor)
+
+        song_ids = self.search_ids(search, db)
+        if not song_ids:
+            return [], None
+        if len(song_ids) <= MAX_SEARCH_CANDIDATES:
+            return paginate_keyset(query.filter(models.Song.id.in_(song_ids)), columns, sort, limit, cursor)
+
+        # 命中的歌曲很多（宽泛的查询）：按排序键分批读取，在内存中过滤，直到凑满一页
+        matched = set(song_ids)
+        id_key = columns[-1].key
+        rows = []
+        while len(rows) <= limit:
+            batch, cursor = paginate_keyset(query, columns, sort, SEARCH_SCAN_BATCH, cursor)
+            rows.extend(row for row in batch if getattr(row, id_key) in matched)
+            if cursor is None:
+                break
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(sort, [getattr(rows[-1], column.key) for column in columns])
+
+
+_search_index: Optional[SearchIndex] = None
+
+
+def _sqlite_has_fts5() -> bool:
+    try:
+        with engine.connect() as conn:
+            return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+    except Exception:
+        return False
+
+
+def _create_search_index() -> SearchIndex:
+    backend = SEARCH_BACKEND
+    if backend == "auto":
+        dialect = engine.dialect.name
+        if dialect == "mysql":
+            backend = "mysql"
+        elif dialect == "sqlite" and _sqlite_has_fts5():
+            backend = "fts5"
+        else:
+            backend = "memory"
+
+    if backend == "mysql":
+        return MySQLFulltextIndex()
+    if backend == "fts5":
+        return FTS5Index()
+    return InMemoryIndex()
+
+
+def init_search_index() -> SearchIndex:
+    """初始化搜索索引，数据库全文索引不可用时退回到内存索引"""
+    global _search_index
+    index = _create_search_index()
+    try:
+        index.setup()
+    except Exception as e:
+        print(f"初始化{index.name}搜索索引失败，改用内存索引: {e}")
+        index = InMemoryIndex()
+    _search_index = index
+    print(f"歌曲搜索使用 {index.name} 索引")
+    return index
+
+
+def get_search_index() -> SearchIndex:
+    """获取当前搜索索引"""
+    global _search_index
+    if _search_index is None:
+        _search_index = _create_search_index()
+    return _search_index
@@ -0,0 +1,64 @@
+from typing import Optional, Tuple, List, Sequence, Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from sqlalchemy import func
+
+import models
+
+try:
+    # orjson 直接序列化 datetime 等类型，比标准库 json 快得多
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可以通过 ?fields= 选择的歌曲字段（与 schemas.Song 一致）
+SONG_FIELDS = (
+    "id", "title", "artist", "album", "duration", "file_path", "file_size", "content_hash",
+    "cover_url", "cover_path", "play_count", "loudness", "peak", "replay_gain", "created_at", "updated_at",
+)
+# 未指定 fields 时返回全部字段（与原来按 schemas.Song 返回的内容一致），需要更小的响应时由客户端指定 fields
+DEFAULT_SONG_FIELDS = SONG_FIELDS
+# 数据库中可能为空、但接口约定为整数的字段
+_ZERO_DEFAULT_FIELDS = ("duration", "play_count")
+
+
+class InvalidFieldsError(ValueError):
+    """fields 参数包含未知字段"""
+
+
+def parse_song_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """解析 ?fields=id,title,artist，未指定时返回默认字段"""
+    if not fields:
+        return DEFAULT_SONG_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in SONG_FIELDS]
+    if unknown or not names:
+        raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields selected")
+    return names
+
+
+def song_columns(fields: Sequence[str], prefix: str = "") -> List:
+    """按字段构造 select 的列（只查询需要的列，不构造 ORM 对象）"""
+    columns = []
+    for name in fields:
+        column = getattr(models.Song, name)
+        if name in _ZERO_DEFAULT_FIELDS:
+            column = func.coalesce(column, 0)
+        columns.append(column.label(prefix + name))
+    return columns
+
+
+def rows_to_dicts(rows: Sequence, fields: Sequence[str], offset: int = 0) -> List[dict]:
+    """将查询结果元组转换为字典；offset 之前和字段之后的列会被忽略"""
+    if offset:
+        end = offset + len(fields)
+        return [dict(zip(fields, row[offset:end])) for row in rows]
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def fast_json_response(content: Any, status_code: int = 200) -> Response:
+    """用 orjson 直接序列化（跳过逐行的 Pydantic 校验），未安装 orjson 时退回标准 JSON"""
+    if orjson is not None:
+        return ORJSONResponse(content=content, status_code=status_code)
+    return JSONResponse(content=jsonable_encoder(content), status_code=status_code)
@@ -0,0 +1,265 @@
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, List, Tuple, Dict
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+# 每次从磁盘读取的块大小（服务器不支持零拷贝发送时使用）
+STREAM_CHUNK_SIZE = 256 * 1024
+# 单个请求允许的最大区间数量，超过时按完整文件返回
+MAX_RANGES = 16
+
+AUDIO_MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.flac': 'audio/flac',
+    '.wav': 'audio/wav'
+}
+
+# 封面等静态图片的缓存时间
+STATIC_CACHE_CONTROL = "public, max-age=86400"
+# 内容不会变化的资源（地址随内容变化）
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# ASGI 零拷贝扩展（服务器可通过 os.sendfile 直接发送文件）
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    """请求的区间全部超出文件范围"""
+
+
+def get_audio_media_type(file_path: str) -> str:
+    """根据扩展名确定音频媒体类型"""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    return AUDIO_MEDIA_TYPES.get(file_ext, 'audio/mpeg')
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """根据文件大小和修改时间生成强 ETag"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def make_last_modified(stat_result: os.stat_result) -> str:
+    return formatdate(stat_result.st_mtime, usegmt=True)
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 头，返回合并后的 [(start, end)]（闭区间）
+
+    格式无效时返回 None（按完整文件处理），区间全部不可满足时抛出 RangeNotSatisfiable。
+    """
+    unit, _, range_set = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set.strip():
+        return None
+
+    ranges = []
+    for spec in range_set.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # 后缀区间: bytes=-500 表示最后 500 字节
+                length = int(last)
+                if length < 0:
+                    return None
+                if length == 0:
+                    continue
+                start, end = max(0, file_size - length), file_size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+                if start < 0 or (last and end < start):
+                    return None
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+        if start < file_size:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # 合并重叠或相邻的区间
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(if_range: str, etag: str, stat_result: os.stat_result) -> bool:
+    """If-Range 校验：ETag 需强匹配，日期需与最后修改时间一致"""
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(stat_result.st_mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def is_not_modified(request_headers: Headers, etag: str, stat_result: os.stat_result) -> bool:
+    """条件请求校验：优先使用 If-None-Match，其次 If-Modified-Since"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match 使用弱比较
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat_result.st_mtime) <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class FileRangeResponse(Response):
+    """文件响应：支持完整、单区间和多区间（multipart/byteranges）请求
+
+    服务器支持 ASGI 零拷贝扩展时交由 os.sendfile 发送，否则在线程池中按大块读取，
+    不会阻塞事件循环。
+    """
+
+    def __init__(self, path: str, file_size: int, media_type: str,
+                 ranges: Optional[List[Tuple[int, int]]] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 chunk_size: int = STREAM_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.background = None
+        self.body = b""
+        headers = dict(headers or {})
+        headers["Accept-Ranges"] = "bytes"
+
+        if not ranges:
+            self.status_code = 200
+            self._parts = [(b"", 0, file_size - 1)] if file_size else []
+            self._epilogue = b""
+            headers["Content-Type"] = media_type
+            headers["Content-Length"] = str(file_size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self._parts = [(b"", start, end)]
+            self._epilogue = b""
+            headers["Content-Type"] = media_type
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+        else:
+            boundary = secrets.token_hex(12)
+            self.status_code = 206
+            self._parts = []
+            for index, (start, end) in enumerate(ranges):
+                # 除第一个分段外，分隔符前需要换行
+                prefix = (b"\r\n" if index else b"") + (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+                ).encode("latin-1")
+                self._parts.append((prefix, start, end))
+            self._epilogue = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            content_length = sum(len(p) + e - s + 1 for p, s, e in self._parts) + len(self._epilogue)
+            headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+            headers["Content-Length"] = str(content_length)
+
+        self.init_headers(headers)
+
+    @staticmethod
+    def _read(file_obj, offset: int, size: int) -> bytes:
+        file_obj.seek(offset)
+        return file_obj.read(size)
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zero_copy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        file_obj = await anyio.to_thread.run_sync(open, self.path, "rb", 0)
+        try:
+            for prefix, start, end in self._parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zero_copy:
+                    await send({
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": file_obj,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": True,
+                    })
+                    continue
+
+                offset = start
+                while offset <= end:
+                    size = min(self.chunk_size, end - offset + 1)
+                    chunk = await anyio.to_thread.run_sync(self._read, file_obj, offset, size)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            await anyio.to_thread.run_sync(file_obj.close)
+
+        await send({"type": "http.response.body", "body": self._epilogue, "more_body": False})
+
+
+def file_response(request: Request, path: str, stat_result: os.stat_result, media_type: str,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """根据条件请求头、Range / If-Range 请求头构造文件响应"""
+    etag = make_etag(stat_result)
+    headers = dict(headers or {})
+    headers["ETag"] = etag
+    headers["Last-Modified"] = make_last_modified(stat_result)
+    file_size = stat_result.st_size
+
+    if is_not_modified(request.headers, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range_matches(if_range, etag, stat_result):
+            try:
+                ranges = parse_range_header(range_header, file_size)
+            except RangeNotSatisfiable:
+                return Response(
+                    status_code=416,
+                    headers={"Content-Range": f"bytes */{file_size}", "Accept-Ranges": "bytes"}
+                )
+
+    return FileRangeResponse(path, file_size, media_type, ranges=ranges, headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """为静态文件（封面）附加 Cache-Control，ETag / Last-Modified 校验由 StaticFiles 完成"""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        return response
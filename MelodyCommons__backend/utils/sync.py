@@ -1,49 +1,304 @@
 import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, List, Callable
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
+import crud
+from utils.audio import get_file_hash
+from utils.search import get_search_index
+from utils.popularity import get_leaderboard
+from utils.response_cache import invalidate_songs
+from utils.thumbnails import backfill_thumbnails
+from utils.waveform import backfill_waveforms, remove_waveform
+from utils.loudness import backfill_loudness
 
-def sync_database_with_static_files():
+# 回填内容哈希时每批处理的歌曲数量
+HASH_BACKFILL_BATCH = 100
+
+# 同步任务名称（sync_state 表中的主键）
+STATIC_SYNC_NAME = "static_files"
+# 回填任务（内容哈希、缩略图、波形、响度）的锁名称，只有一个进程执行回填
+BACKFILL_SYNC_NAME = "backfill"
+# 每批检查的歌曲数量
+SYNC_BATCH_SIZE = 1000
+# 并行检查文件是否存在的线程数（网络存储上 stat 调用较慢）
+SYNC_STAT_WORKERS = 16
+# 两次完整同步之间的最短间隔（秒），间隔内重启不会重新扫描
+SYNC_INTERVAL = 3600
+# 领导者锁的有效期（秒），每处理一批后续期
+SYNC_LOCK_TTL = 300
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_sync_lock(db: Session, name: str, owner: str) -> Optional[models.SyncState]:
+    """获取同步任务的领导者锁，其他进程持有未过期的锁时返回 None"""
+    if db.get(models.SyncState, name) is None:
+        db.add(models.SyncState(name=name, cursor=0))
+        try:
+            db.commit()
+        except IntegrityError:
+            # 其他进程已创建该记录
+            db.rollback()
+
+    now = datetime.now()
+    result = db.execute(
+        update(models.SyncState)
+        .where(models.SyncState.name == name)
+        .where(or_(
+            models.SyncState.lock_owner.is_(None),
+            models.SyncState.lock_owner == owner,
+            models.SyncState.lock_expires_at < now
+        ))
+        .values(lock_owner=owner, lock_expires_at=now + timedelta(seconds=SYNC_LOCK_TTL))
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return None
+    state = db.get(models.SyncState, name)
+    db.refresh(state)
+    return state
+
+
+def renew_sync_lock(db: Session, name: str, owner: str) -> bool:
+    """续期领导者锁；锁已过期并被其他进程获取时返回 False"""
+    result = db.execute(
+        update(models.SyncState)
+        .where(models.SyncState.name == name)
+        .where(models.SyncState.lock_owner == owner)
+        .values(lock_expires_at=datetime.now() + timedelta(seconds=SYNC_LOCK_TTL))
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def release_sync_lock(db: Session, name: str, owner: str):
+    """释放同步任务的领导者锁；锁已被其他进程获取时不做修改"""
+    db.execute(
+        update(models.SyncState)
+        .where(models.SyncState.name == name)
+        .where(models.SyncState.lock_owner == owner)
+        .values(lock_owner=None, lock_expires_at=None)
+    )
+    db.commit()
+
+
+def lock_renewer(name: str, owner: str) -> Callable[[], bool]:
+    """返回续期领导者锁的回调，供回填任务每处理一批后调用；回调返回 False 时应停止处理"""
+    def renew() -> bool:
+        db: Session = SessionLocal()
+        try:
+            if renew_sync_lock(db, name, owner):
+                return True
+            print(f"领导者锁 {name} 已被其他进程获取，停止处理。")
+            return False
+        except Exception as e:
+            print(f"续期领导者锁 {name} 失败: {e}")
+            db.rollback()
+            return False
+        finally:
+            db.close()
+    return renew
+
+
+def _is_missing(row) -> bool:
+    """歌曲文件不存在（封面文件缺失不会删除歌曲，见 _clear_missing_covers）"""
+    if row.file_path and not os.path.exists(row.file_path):
+        print(f"歌曲 '{row.title}' (ID: {row.id}) 的文件不存在，路径: {row.file_path}。准备删除...")
+        return True
+    return False
+
+
+def _clear_missing_covers(db: Session, rows: List, executor: ThreadPoolExecutor):
+    """封面文件不存在时清空 cover_path，之后重新获取封面"""
+    cover_paths = list({row.cover_path for row in rows if row.cover_path})
+    missing = [path for path, exists in zip(cover_paths, executor.map(os.path.exists, cover_paths)) if not exists]
+    if not missing:
+        return
+    print(f"{len(missing)} 个封面文件不存在，清空对应歌曲的封面。")
+    db.query(models.Song).filter(models.Song.cover_path.in_(missing)).update(
+        {"cover_path": None}, synchronize_session=False
+    )
+    db.commit()
+    invalidate_songs()
+
+
+def _delete_songs(db: Session, rows: List):
+    song_ids = [row.id for row in rows]
+    # 在删除歌曲之前，先从 playlist_songs 表中删除关联记录
+    db.query(models.PlaylistSong).filter(
+        models.PlaylistSong.song_id.in_(song_ids)
+    ).delete(synchronize_session=False)
+    db.query(models.Song).filter(models.Song.id.in_(song_ids)).delete(synchronize_session=False)
+    db.commit()
+    invalidate_songs()
+
+    search_index = get_search_index()
+    for song_id in song_ids:
+        search_index.remove_song(db, song_id)
+
+    # 删除波形文件，以及不再被引用的封面和缩略图
+    for row in rows:
+        if row.file_path:
+            remove_waveform(row.file_path)
+    for cover_path in {row.cover_path for row in rows if row.cover_path}:
+        crud.release_cover_file(db, cover_path)
+
+
+def sync_database_with_static_files(force: bool = False) -> int:
     """
     同步数据库和static文件夹，删除数据库中存在但static文件夹中不存在的歌曲记录。
+
+    按歌曲 ID 分批扫描并并行检查文件，进度保存在 sync_state 表中：中断后从上次的位置继续，
+    完成后 SYNC_INTERVAL 内不再重复扫描（force 为 True 时除外）。多个进程同时启动时只有
+    持有锁的进程执行同步。返回删除的歌曲数量。
     """
     db: Session = SessionLocal()
+    state = None
+    deleted = 0
     try:
-        all_songs = db.query(models.Song).all()
-        songs_to_delete = []
+        state = acquire_sync_lock(db, STATIC_SYNC_NAME, WORKER_ID)
+        if state is None:
+            print("其他进程正在同步数据库与static文件夹，跳过。")
+            return 0
 
-        print("开始同步数据库与static文件夹...")
+        if (not force and not state.cursor and state.completed_at is not None
+                and datetime.now() - state.completed_at < timedelta(seconds=SYNC_INTERVAL)):
+            print("数据库与static文件夹最近已同步，跳过。")
+            return 0
 
-        for song in all_songs:
-            # 检查歌曲文件是否存在
-            if song.file_path and not os.path.exists(song.file_path):
-                print(f"歌曲 '{song.title}' (ID: {song.id}) 的文件不存在，路径: {song.file_path}。准备删除...")
-                songs_to_delete.append(song)
-                continue  # 文件不存在，无需检查封面
+        print("开始同步数据库与static文件夹..." if not state.cursor
+              else f"继续同步数据库与static文件夹（从歌曲 ID {state.cursor} 之后开始）...")
 
-            # 如果歌曲文件存在，再检查封面文件
-            if song.cover_path and not os.path.exists(song.cover_path):
-                print(f"歌曲 '{song.title}' (ID: {song.id}) 的封面文件不存在，路径: {song.cover_path}。准备删除...")
-                songs_to_delete.append(song)
-
-        if not songs_to_delete:
-            print("数据库与static文件夹内容一致，无需同步。")
-            return
+        with ThreadPoolExecutor(max_workers=SYNC_STAT_WORKERS, thread_name_prefix="sync-stat") as executor:
+            while True:
+                rows = db.query(
+                    models.Song.id, models.Song.title, models.Song.file_path, models.Song.cover_path
+                ).filter(
+                    models.Song.id > state.cursor
+                ).order_by(models.Song.id).limit(SYNC_BATCH_SIZE).all()
+                if not rows:
+                    break
 
-        # 在删除歌曲之前，先从 playlist_songs 表中删除关联记录
-        song_ids_to_delete = {s.id for s in songs_to_delete}
-        db.query(models.PlaylistSong).filter(models.PlaylistSong.song_id.in_(song_ids_to_delete)).delete(synchronize_session=False)
+                missing_rows = [row for row, missing in zip(rows, executor.map(_is_missing, rows)) if missing]
+                if missing_rows:
+                    _delete_songs(db, missing_rows)
+                    deleted += len(missing_rows)
+                missing_ids = {row.id for row in missing_rows}
+                _clear_missing_covers(db, [row for row in rows if row.id not in missing_ids], executor)
 
-        # 执行删除
-        for song in songs_to_delete:
-            db.delete(song)
+                # 保存进度并续期锁
+                state.cursor = rows[-1].id
+                db.commit()
+                if not renew_sync_lock(db, STATIC_SYNC_NAME, WORKER_ID):
+                    print("同步锁已被其他进程获取，停止同步。")
+                    return deleted
 
+        state.cursor = 0
+        state.completed_at = datetime.now()
         db.commit()
-        print(f"同步完成，共删除了 {len(songs_to_delete)} 条无效的歌曲记录。")
+
+        if deleted:
+            get_leaderboard().invalidate()
+            print(f"同步完成，共删除了 {deleted} 条无效的歌曲记录。")
+        else:
+            print("数据库与static文件夹内容一致，无需同步。")
+        return deleted
 
     except Exception as e:
         print(f"同步过程中发生错误: {e}")
         db.rollback()
+        return deleted
     finally:
+        if state is not None:
+            try:
+                release_sync_lock(db, STATIC_SYNC_NAME, WORKER_ID)
+            except Exception:
+                db.rollback()
         db.close()
 
+
+def run_backfills():
+    """回填内容哈希、缩略图、波形和响度；多个进程同时启动时只有持有锁的进程执行"""
+    db: Session = SessionLocal()
+    state = None
+    try:
+        state = acquire_sync_lock(db, BACKFILL_SYNC_NAME, WORKER_ID)
+        if state is None:
+            print("其他进程正在执行回填任务，跳过。")
+            return
+        # 每项回填每处理一批续期一次锁，锁丢失时停止
+        renew = lock_renewer(BACKFILL_SYNC_NAME, WORKER_ID)
+        for backfill in (backfill_content_hashes, backfill_thumbnails, backfill_waveforms, backfill_loudness):
+            backfill(renew=renew)
+            if not renew():
+                return
+    except Exception as e:
+        print(f"回填过程中发生错误: {e}")
+        db.rollback()
+    finally:
+        if state is not None:
+            try:
+                release_sync_lock(db, BACKFILL_SYNC_NAME, WORKER_ID)
+            except Exception:
+                db.rollback()
+        db.close()
+
+
+def start_background_sync() -> threading.Thread:
+    """在后台线程中同步数据库与文件，然后执行回填任务，不阻塞启动"""
+    def run():
+        sync_database_with_static_files()
+        run_backfills()
+
+    thread = threading.Thread(target=run, name="static-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def backfill_content_hashes(batch_size: int = HASH_BACKFILL_BATCH,
+                            renew: Optional[Callable[[], bool]] = None) -> int:
+    """为缺少 content_hash 的歌曲计算音频文件哈希，返回回填的数量
+
+    renew 为续期领导者锁的回调，每处理一批调用一次，返回 False 时停止。
+    """
+    db: Session = SessionLocal()
+    filled = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(models.Song.id, models.Song.file_path).filter(
+                models.Song.content_hash.is_(None),
+                models.Song.id > last_id
+            ).order_by(models.Song.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            mappings = []
+            for song_id, file_path in rows:
+                content_hash = get_file_hash(file_path) if file_path else ""
+                if content_hash:
+                    mappings.append({"id": song_id, "content_hash": content_hash})
+            if mappings:
+                db.bulk_update_mappings(models.Song, mappings)
+                db.commit()
+                filled += len(mappings)
+            if renew is not None and not renew():
+                break
+
+        if filled:
+            print(f"已回填 {filled} 首歌曲的内容哈希。")
+        return filled
+    except Exception as e:
+        print(f"回填内容哈希时发生错误: {e}")
+        db.rollback()
+        return filled
+    finally:
+        db.close()
@@ -0,0 +1,164 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Set
+
+from database import SessionLocal
+import models
+
+try:
+    # 缩略图使用 Pillow 生成，未安装时接口返回原图
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_DIR = "static/covers/thumbs"
+# 缩略图边长（像素），请求的尺寸向上取最接近的一档
+THUMBNAIL_SIZES = (64, 256, 640)
+# 格式 -> (扩展名, 媒体类型, Pillow 格式, 保存参数)
+THUMBNAIL_FORMATS = {
+    "webp": ("webp", "image/webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "image/jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+# 生成缩略图的线程数（Pillow 缩放和编码时释放 GIL）
+THUMBNAIL_WORKERS = 2
+# 回填缩略图时每批检查的封面数量
+THUMBNAIL_BACKFILL_BATCH = 500
+
+
+def is_thumbnail_available() -> bool:
+    return Image is not None
+
+
+def pick_thumbnail_size(size: int) -> int:
+    """返回不小于请求尺寸的最小一档，超过最大一档时返回最大一档"""
+    return next((candidate for candidate in THUMBNAIL_SIZES if candidate >= size), THUMBNAIL_SIZES[-1])
+
+
+def negotiate_thumbnail_format(accept: Optional[str]) -> str:
+    """浏览器支持 WebP 时返回 webp，否则返回 jpeg"""
+    return "webp" if accept and "image/webp" in accept else "jpeg"
+
+
+def thumbnail_path(cover_path: str, size: int, image_format: str) -> str:
+    """封面文件名是内容哈希，缩略图按封面文件名命名，内容不会变化"""
+    stem = os.path.splitext(os.path.basename(cover_path))[0]
+    return os.path.join(THUMBNAIL_DIR, f"{stem}_{size}.{THUMBNAIL_FORMATS[image_format][0]}")
+
+
+def has_thumbnails(cover_path: str) -> bool:
+    return all(
+        os.path.exists(thumbnail_path(cover_path, size, image_format))
+        for size in THUMBNAIL_SIZES for image_format in THUMBNAIL_FORMATS
+    )
+
+
+def remove_thumbnails(cover_path: str):
+    for size in THUMBNAIL_SIZES:
+        for image_format in THUMBNAIL_FORMATS:
+            try:
+                os.remove(thumbnail_path(cover_path, size, image_format))
+            except OSError:
+                pass
+
+
+def generate_thumbnails(cover_path: str):
+    """为封面生成所有尺寸和格式的缩略图（从大到小逐级缩放）"""
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    with Image.open(cover_path) as source:
+        # JPEG 解码时直接按比例缩小，减少大图的解码开销
+        source.draft("RGB", (THUMBNAIL_SIZES[-1], THUMBNAIL_SIZES[-1]))
+        image = source.convert("RGB")
+
+    for size in sorted(THUMBNAIL_SIZES, reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)
+        for image_format, (_, _, pillow_format, options) in THUMBNAIL_FORMATS.items():
+            target = thumbnail_path(cover_path, size, image_format)
+            temp_path = f"{target}.{threading.get_ident()}.tmp"
+            image.save(temp_path, pillow_format, **options)
+            os.replace(temp_path, target)
+
+
+class ThumbnailQueue:
+    """缩略图生成任务：封面保存后在后台线程池中生成，不占用请求"""
+
+    def __init__(self, workers: int = THUMBNAIL_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[str] = set()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnail-worker")
+            return self._executor
+
+    def enqueue(self, cover_path: str) -> bool:
+        """提交缩略图任务；已在生成或已全部生成时返回 False"""
+        if Image is None or not cover_path:
+            return False
+        with self._lock:
+            if cover_path in self._pending:
+                return False
+            self._pending.add(cover_path)
+        if has_thumbnails(cover_path):
+            with self._lock:
+                self._pending.discard(cover_path)
+            return False
+        self._get_executor().submit(self._run, cover_path)
+        return True
+
+    def _run(self, cover_path: str):
+        try:
+            generate_thumbnails(cover_path)
+        except Exception as e:
+            print(f"Failed to generate thumbnails for {cover_path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(cover_path)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_queue = ThumbnailQueue()
+
+
+def get_thumbnail_queue() -> ThumbnailQueue:
+    """获取进程内缩略图任务队列"""
+    return _queue
+
+
+def backfill_thumbnails(batch_size: int = THUMBNAIL_BACKFILL_BATCH,
+                        renew: Optional[Callable[[], bool]] = None) -> int:
+    """为已有封面生成缺少的缩略图，返回提交的任务数量；renew 为每批调用一次的续锁回调，返回 False 时停止"""
+    if Image is None:
+        return 0
+    db = SessionLocal()
+    try:
+        cover_paths = [
+            cover_path for cover_path, in
+            db.query(models.Song.cover_path).filter(models.Song.cover_path.isnot(None)).distinct()
+        ]
+    except Exception as e:
+        print(f"回填缩略图时发生错误: {e}")
+        return 0
+    finally:
+        db.close()
+
+    queue = get_thumbnail_queue()
+    submitted = 0
+    for i in range(0, len(cover_paths), batch_size):
+        submitted += sum(
+            1 for cover_path in cover_paths[i:i + batch_size]
+            if os.path.exists(cover_path) and queue.enqueue(cover_path)
+        )
+        if renew is not None and not renew():
+            break
+    if submitted:
+        print(f"已提交 {submitted} 个封面的缩略图任务。")
+    return submitted
@@ -0,0 +1,253 @@
+import os
+import shutil
+import hashlib
+import threading
+import time
+import uuid
+import subprocess
+from typing import Dict, Optional, Tuple, AsyncIterator
+
+import anyio
+
+# 转码后的文件缓存目录（不在 static 目录下，不会被静态文件服务直接访问）
+TRANSCODE_CACHE_DIR = "cache/transcoded"
+# 缓存总大小上限，超过后按最近访问时间淘汰
+TRANSCODE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+# 同时运行的 ffmpeg 进程数
+TRANSCODE_WORKERS = 2
+# 单个转码任务的最长时间（秒）
+TRANSCODE_TIMEOUT = 600
+# 边转码边播放时，每次读取的块大小和等待新数据的间隔
+TRANSCODE_STREAM_CHUNK = 64 * 1024
+TRANSCODE_POLL_INTERVAL = 0.05
+
+FFMPEG_BINARY = shutil.which("ffmpeg")
+
+# quality 参数 -> (扩展名, 媒体类型, ffmpeg 编码参数)
+RENDITIONS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "low": (".opus", "audio/ogg", ("-c:a", "libopus", "-b:a", "64k", "-f", "ogg")),
+    "medium": (".opus", "audio/ogg", ("-c:a", "libopus", "-b:a", "128k", "-f", "ogg")),
+    "aac": (".aac", "audio/aac", ("-c:a", "aac", "-b:a", "128k", "-f", "adts")),
+    "mp3": (".mp3", "audio/mpeg", ("-c:a", "libmp3lame", "-b:a", "192k", "-f", "mp3")),
+}
+# 返回原始文件
+ORIGINAL_QUALITY = "original"
+
+
+class TranscodeError(Exception):
+    """转码失败"""
+
+
+def is_transcoding_available() -> bool:
+    return FFMPEG_BINARY is not None
+
+
+def source_key(source_path: str, stat_result: os.stat_result, variant: str) -> str:
+    """由源文件路径、大小、修改时间和输出格式生成缓存键"""
+    identity = f"{os.path.abspath(source_path)}|{stat_result.st_size}|{stat_result.st_mtime_ns}|{variant}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+
+def rendition_media_type(quality: str) -> str:
+    return RENDITIONS[quality][1]
+
+
+class TranscodeJob:
+    """一次转码：ffmpeg 写入 .part 文件，完成后改名为缓存文件
+
+    转码进行中的请求可以读取 .part 文件中已经写入的部分，边转码边播放。
+    """
+
+    def __init__(self, source_path: str, part_path: str, final_path: str, quality: str):
+        self.source_path = source_path
+        self.part_path = part_path
+        self.final_path = final_path
+        self.quality = quality
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.error: Optional[str] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    def command(self):
+        codec_args = RENDITIONS[self.quality][2]
+        return [
+            FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", self.source_path, "-vn", "-map_metadata", "-1",
+            *codec_args, self.part_path,
+        ]
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """读取转码输出，直到转码完成且已全部读出"""
+        while not self.started.is_set() and not self.done.is_set():
+            await anyio.sleep(TRANSCODE_POLL_INTERVAL)
+
+        file_obj = None
+        try:
+            while file_obj is None:
+                path = self.part_path if not self.done.is_set() else self.final_path
+                try:
+                    file_obj = await anyio.to_thread.run_sync(open, path, "rb")
+                except FileNotFoundError:
+                    if self.done.is_set() and (self.error or not os.path.exists(self.final_path)):
+                        return
+                    await anyio.sleep(TRANSCODE_POLL_INTERVAL)
+
+            while True:
+                # 先判断是否已完成，再读取，避免漏掉最后写入的数据
+                finished = self.done.is_set()
+                chunk = await anyio.to_thread.run_sync(file_obj.read, TRANSCODE_STREAM_CHUNK)
+                if chunk:
+                    yield chunk
+                elif finished:
+                    return
+                else:
+                    await anyio.sleep(TRANSCODE_POLL_INTERVAL)
+        finally:
+            if file_obj is not None:
+                await anyio.to_thread.run_sync(file_obj.close)
+
+
+class Transcoder:
+    """转码管理：同一文件同一质量只转码一次，结果缓存在磁盘上"""
+
+    def __init__(self, cache_dir: str = TRANSCODE_CACHE_DIR, max_bytes: int = TRANSCODE_CACHE_MAX_BYTES,
+                 workers: int = TRANSCODE_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, TranscodeJob] = {}
+        self._processes = set()
+        self._closed = False
+
+    def cache_path(self, source_path: str, stat_result: os.stat_result, quality: str) -> str:
+        """缓存文件名由源文件和质量决定，源文件被替换后自动失效"""
+        return os.path.join(self.cache_dir, source_key(source_path, stat_result, quality) + RENDITIONS[quality][0])
+
+    def prepare(self, source_path: str, stat_result: os.stat_result, quality: str):
+        """返回 (缓存文件路径, stat) 或正在进行的转码任务"""
+        final_path = self.cache_path(source_path, stat_result, quality)
+        with self._lock:
+            job = self._jobs.get(final_path)
+            if job is not None:
+                return job
+            try:
+                cached = os.stat(final_path)
+            except OSError:
+                cached = None
+            if cached is not None:
+                # 记录访问时间用于 LRU 淘汰（文件系统可能以 noatime 挂载）
+                try:
+                    os.utime(final_path, None)
+                except OSError:
+                    pass
+                return final_path, cached
+            if self._closed:
+                raise TranscodeError("Transcoder is shut down")
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 临时文件名在进程间唯一：多个 worker 可能同时转码同一首歌，各自写入自己的临时文件，
+            # 完成后原子改名（内容相同，后完成的覆盖先完成的）
+            part_path = f"{final_path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.part"
+            job = TranscodeJob(source_path, part_path, final_path, quality)
+            self._jobs[final_path] = job
+
+        threading.Thread(target=self._run, args=(job,), name="transcode", daemon=True).start()
+        return job
+
+    def run_ffmpeg(self, command, job: Optional[TranscodeJob] = None):
+        """占用一个转码进程名额运行 ffmpeg，失败时抛出 TranscodeError"""
+        with self._slots:
+            if self._closed:
+                raise TranscodeError("Transcoder is shut down")
+            process = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            with self._lock:
+                self._processes.add(process)
+            if job is not None:
+                job.process = process
+                job.started.set()
+            try:
+                _, stderr = process.communicate(timeout=TRANSCODE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise TranscodeError("Transcoding timed out")
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+            if process.returncode != 0:
+                raise TranscodeError(stderr.decode("utf-8", "replace").strip()[-500:] or "ffmpeg failed")
+
+    def _run(self, job: TranscodeJob):
+        try:
+            self.run_ffmpeg(job.command(), job)
+            os.replace(job.part_path, job.final_path)
+        except Exception as e:
+            job.error = str(e)
+            print(f"Failed to transcode {job.source_path} ({job.quality}): {e}")
+            try:
+                if os.path.exists(job.part_path):
+                    os.remove(job.part_path)
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._jobs.pop(job.final_path, None)
+            job.done.set()
+
+        if job.error is None:
+            self.evict(keep=job.final_path)
+
+    def evict(self, keep: Optional[str] = None):
+        """缓存超过上限时，按最近访问时间删除最旧的文件"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    stat_result = entry.stat()
+                    if entry.name.endswith(".part"):
+                        # 进程异常退出时留下的临时文件
+                        if time.time() - stat_result.st_mtime > TRANSCODE_TIMEOUT * 2:
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                pass
+                        continue
+                    total += stat_result.st_size
+                    entries.append((max(stat_result.st_atime, stat_result.st_mtime), stat_result.st_size, entry.path))
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """停止所有正在运行的 ffmpeg 进程"""
+        with self._lock:
+            self._closed = True
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+
+_transcoder = Transcoder()
+
+
+def get_transcoder() -> Transcoder:
+    """获取进程内转码管理器"""
+    return _transcoder
@@ -0,0 +1,163 @@
+import os
+import hashlib
+from typing import Optional, Dict, List
+
+import multipart
+from multipart.multipart import parse_options_header
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+from utils.audio import is_valid_audio_file
+from utils.file import ensure_directories, generate_unique_filename
+
+# 累积到该大小后再写入磁盘，减少系统调用次数
+UPLOAD_WRITE_SIZE = 1024 * 1024  # 1MB
+# multipart 边界和表单字段允许占用的额外字节数
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# 文本表单字段的最大长度
+MAX_FIELD_SIZE = 4096
+
+
+class UploadError(Exception):
+    """上传请求无效"""
+
+
+class UnsupportedUploadError(UploadError):
+    """文件格式不受支持"""
+
+
+class UploadTooLargeError(UploadError):
+    """文件超过大小限制"""
+
+
+class IngestedUpload:
+    """已写入磁盘的上传文件"""
+
+    def __init__(self, file_path: str, filename: str, file_size: int, content_hash: str,
+                 fields: Dict[str, str]):
+        self.file_path = file_path
+        self.filename = filename
+        self.file_size = file_size
+        self.content_hash = content_hash
+        self.fields = fields
+
+
+def _write_block(file_obj, hasher, data: bytes):
+    hasher.update(data)
+    file_obj.write(data)
+
+
+def _discard(file_obj, path: Optional[str]):
+    if file_obj is not None:
+        file_obj.close()
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+async def receive_audio_upload(request: Request, directory: str, max_size: int,
+                               file_field: str = "file") -> IngestedUpload:
+    """单次遍历上传请求体：边接收边写入磁盘并计算SHA-256，超过大小限制时立即中止
+
+    请求体不会先缓存到临时文件，文件内容也不会再被重新读取。
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + UPLOAD_FORM_OVERHEAD:
+        raise UploadTooLargeError("File too large")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected multipart/form-data")
+
+    fields: Dict[str, str] = {}
+    pending: List[bytes] = []
+    # upload_filename 只在遇到文件字段时设置一次，后续的文本字段不会覆盖
+    state = {
+        "headers": {}, "header_field": b"", "header_value": b"",
+        "name": None, "is_file": False, "data": b"", "upload_filename": None,
+    }
+
+    def on_part_begin():
+        state.update(headers={}, name=None, is_file=False, data=b"")
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        state["name"] = name
+        if name == file_field and b"filename" in options and state["upload_filename"] is None:
+            state["is_file"] = True
+            state["upload_filename"] = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+
+    def on_part_data(data, start, end):
+        if state["is_file"]:
+            pending.append(data[start:end])
+        elif len(state["data"]) < MAX_FIELD_SIZE:
+            state["data"] += data[start:end]
+
+    def on_part_end():
+        if not state["is_file"] and state["name"]:
+            fields[state["name"]] = state["data"].decode("utf-8", "replace")[:MAX_FIELD_SIZE]
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    ensure_directories()
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    file_obj = None
+    part_path = None
+    file_size = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+
+            # 文件内容先保存在 pending 中，文件打开后再写入
+            if state["upload_filename"] is not None and file_obj is None:
+                if not is_valid_audio_file(state["upload_filename"]):
+                    raise UnsupportedUploadError("Unsupported audio format")
+                part_path = os.path.join(directory, f".upload_{os.urandom(8).hex()}.part")
+                file_obj = await run_in_threadpool(open, part_path, "wb")
+
+            for data in pending:
+                file_size += len(data)
+                buffer += data
+            pending.clear()
+            if file_size > max_size:
+                raise UploadTooLargeError("File too large")
+
+            if len(buffer) >= UPLOAD_WRITE_SIZE:
+                await run_in_threadpool(_write_block, file_obj, hasher, bytes(buffer))
+                buffer.clear()
+        parser.finalize()
+
+        if file_obj is None:
+            raise UploadError("Missing audio file")
+        if buffer:
+            await run_in_threadpool(_write_block, file_obj, hasher, bytes(buffer))
+        await run_in_threadpool(file_obj.close)
+
+        # 写入完成后再改为正式文件名
+        filename = state["upload_filename"]
+        file_path = os.path.join(directory, generate_unique_filename(directory, filename))
+        await run_in_threadpool(os.replace, part_path, file_path)
+        return IngestedUpload(file_path, filename, file_size, hasher.hexdigest(), fields)
+    except Exception:
+        await run_in_threadpool(_discard, file_obj, part_path)
+        raise
@@ -0,0 +1,340 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, List, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+import models
+import crud
+from utils.audio import extract_audio_metadata, get_file_hash, is_valid_audio_file
+from utils.file import AUDIO_DIR
+from utils.search import get_search_index
+from utils.popularity import get_leaderboard
+from utils.response_cache import invalidate_songs
+from utils.waveform import get_waveform_queue, remove_waveform
+from utils.loudness import get_loudness_queue
+from utils.sync import acquire_sync_lock, release_sync_lock, WORKER_ID, SYNC_LOCK_TTL
+
+try:
+    # 有 watchdog 时使用系统文件事件（Linux 下为 inotify）
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# 是否启用音频目录监控
+WATCH_LIBRARY = True
+# 同一文件在该时间（秒）内没有新的事件后才处理，合并批量复制产生的大量事件
+WATCH_DEBOUNCE = 2.0
+# 持续有事件时，最长等待时间（秒）
+WATCH_MAX_DELAY = 10.0
+# 没有 watchdog 时轮询目录的间隔（秒）
+WATCH_POLL_INTERVAL = 5.0
+# 每批对账的文件数量
+WATCH_BATCH_SIZE = 500
+# 领导者锁名称（sync_state 表）
+WATCHER_LOCK_NAME = "library_watcher"
+
+
+def scan_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """递归扫描目录，返回 {路径: (大小, 修改时间)}"""
+    snapshot = {}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        # 跳过隐藏文件和上传中的临时文件
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif is_valid_audio_file(entry.name):
+                        try:
+                            stat_result = entry.stat()
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+        except OSError:
+            continue
+    return snapshot
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "LibraryWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.watcher.mark(event.src_path)
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            self.watcher.mark(dest_path)
+
+
+class LibraryWatcher:
+    """音频目录监控：文件新增、修改、删除后增量更新歌曲记录
+
+    多个进程中只有持有领导者锁的进程进行监控。
+    """
+
+    def __init__(self, directory: str = AUDIO_DIR, debounce: float = WATCH_DEBOUNCE,
+                 max_delay: float = WATCH_MAX_DELAY, poll_interval: float = WATCH_POLL_INTERVAL):
+        self.directory = directory
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # {路径: (首次事件时间, 最近事件时间)}
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self._snapshot: Optional[Dict[str, Tuple[int, int]]] = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if Observer is not None else "polling"
+
+    def start(self):
+        """启动后台监控线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_delay)
+            self._thread = None
+
+    def mark(self, path: str):
+        """记录文件变化，等待合并后处理"""
+        if os.path.basename(path).startswith(".") or not is_valid_audio_file(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            first, _ = self._pending.get(path, (now, now))
+            self._pending[path] = (first, now)
+
+    def _take_ready(self) -> List[str]:
+        """取出已经稳定（或等待过久）的文件"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (first, last) in list(self._pending.items()):
+                if now - last >= self.debounce or now - first >= self.max_delay:
+                    ready.append(path)
+                    del self._pending[path]
+                    if len(ready) >= WATCH_BATCH_SIZE:
+                        break
+        return ready
+
+    def _poll(self):
+        """轮询模式：比较目录快照，找出变化的文件"""
+        snapshot = scan_directory(self.directory)
+        if self._snapshot is not None:
+            for path, signature in snapshot.items():
+                if self._snapshot.get(path) != signature:
+                    self.mark(path)
+            for path in self._snapshot.keys() - snapshot.keys():
+                self.mark(path)
+        self._snapshot = snapshot
+
+    def _start_observer(self):
+        if Observer is None:
+            return
+        observer = Observer()
+        observer.schedule(_EventHandler(self), self.directory, recursive=True)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+
+    def _stop_observer(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=self.max_delay)
+            self._observer = None
+
+    def _renew_lock(self, db) -> bool:
+        try:
+            return acquire_sync_lock(db, WATCHER_LOCK_NAME, WORKER_ID) is not None
+        except Exception as e:
+            print(f"获取目录监控锁失败: {e}")
+            db.rollback()
+            return False
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_db = SessionLocal()
+        leader = False
+        next_renew = 0.0
+        next_poll = 0.0
+        try:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if now >= next_renew:
+                    was_leader, leader = leader, self._renew_lock(lock_db)
+                    next_renew = now + SYNC_LOCK_TTL / 3
+                    if leader and not was_leader:
+                        print(f"开始监控音频目录 {self.directory}（{self.mode}）")
+                        self._start_observer()
+                        self.initial_scan()
+                    elif was_leader and not leader:
+                        self._stop_observer()
+
+                if leader:
+                    if self._observer is None and now >= next_poll:
+                        self._poll()
+                        next_poll = now + self.poll_interval
+                    ready = self._take_ready()
+                    if ready:
+                        self.reconcile(ready)
+                        continue
+
+                self._stopping.wait(0.5)
+        finally:
+            self._stop_observer()
+            if leader:
+                try:
+                    release_sync_lock(lock_db, WATCHER_LOCK_NAME, WORKER_ID)
+                except Exception:
+                    lock_db.rollback()
+            lock_db.close()
+
+    def initial_scan(self):
+        """启动时找出已在目录中但没有歌曲记录的文件（已删除的文件由启动同步处理）"""
+        snapshot = scan_directory(self.directory)
+        self._snapshot = snapshot
+        paths = list(snapshot)
+        db = SessionLocal()
+        try:
+            missing = []
+            for i in range(0, len(paths), WATCH_BATCH_SIZE):
+                chunk = paths[i:i + WATCH_BATCH_SIZE]
+                known = {path for path, in db.query(models.Song.file_path).filter(models.Song.file_path.in_(chunk))}
+                missing.extend(path for path in chunk if path not in known)
+        finally:
+            db.close()
+        for path in missing:
+            self.mark(path)
+
+    def reconcile(self, paths: List[str]) -> Dict[str, int]:
+        """根据文件现状批量新增、更新、删除歌曲记录"""
+        db = SessionLocal()
+        result = {"added": 0, "updated": 0, "removed": 0}
+        try:
+            songs = {
+                song.file_path: song for song in
+                db.query(models.Song).filter(models.Song.file_path.in_(paths))
+            }
+            added: List[models.Song] = []
+            updated: List[models.Song] = []
+            removed: List[models.Song] = []
+
+            for path in paths:
+                song = songs.get(path)
+                try:
+                    file_size = os.path.getsize(path)
+                except OSError:
+                    file_size = None
+
+                if file_size is None:
+                    if song is not None:
+                        removed.append(song)
+                    continue
+
+                if song is None:
+                    metadata = extract_audio_metadata(path)
+                    added.append(models.Song(
+                        title=metadata.get("title") or os.path.splitext(os.path.basename(path))[0],
+                        artist=metadata.get("artist") or "Unknown Artist",
+                        album=metadata.get("album", ""),
+                        duration=metadata.get("duration", 0),
+                        file_path=path,
+                        file_size=file_size,
+                        content_hash=get_file_hash(path)
+                    ))
+                    continue
+
+                # 文件被替换：大小或内容哈希变化时重新读取时长（保留用户编辑过的标题等信息）
+                content_hash = get_file_hash(path) if file_size == song.file_size else None
+                if file_size != song.file_size or (content_hash and content_hash != song.content_hash):
+                    metadata = extract_audio_metadata(path)
+                    song.file_size = file_size
+                    song.duration = metadata.get("duration", 0)
+                    song.content_hash = content_hash or get_file_hash(path)
+                    song.loudness_analyzed_at = None
+                    updated.append(song)
+
+            if removed:
+                removed_ids = [song.id for song in removed]
+                db.query(models.PlaylistSong).filter(
+                    models.PlaylistSong.song_id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+                for song in removed:
+                    db.delete(song)
+            db.add_all(added)
+            try:
+                db.commit()
+            except IntegrityError:
+                # 上传接口已为同一文件创建记录，逐条重试
+                db.rollback()
+                if len(paths) == 1:
+                    return result
+                return self._reconcile_one_by_one(paths)
+
+            if added or updated or removed:
+                invalidate_songs()
+            search_index = get_search_index()
+            leaderboard = get_leaderboard()
+            for song in added + updated:
+                search_index.index_song(db, song)
+            for song in added:
+                leaderboard.record_play(song.id, song.play_count)
+            waveform_queue = get_waveform_queue()
+            loudness_queue = get_loudness_queue()
+            for song in added + updated:
+                waveform_queue.enqueue(song.file_path)
+                loudness_queue.enqueue(song.id, song.file_path)
+            for song in removed:
+                remove_waveform(song.file_path)
+                search_index.remove_song(db, song.id)
+                leaderboard.discard(song.id)
+                try:
+                    crud.release_cover_file(db, song.cover_path)
+                except Exception as e:
+                    print(f"Error deleting cover: {e}")
+
+            result = {"added": len(added), "updated": len(updated), "removed": len(removed)}
+            if any(result.values()):
+                print(f"音频目录变化：新增 {result['added']}，更新 {result['updated']}，删除 {result['removed']}")
+            return result
+        except Exception as e:
+            print(f"处理音频目录变化时发生错误: {e}")
+            db.rollback()
+            return result
+        finally:
+            db.close()
+
+    def _reconcile_one_by_one(self, paths: List[str]) -> Dict[str, int]:
+        result = {"added": 0, "updated": 0, "removed": 0}
+        for path in paths:
+            for key, count in self.reconcile([path]).items():
+                result[key] += count
+        return result
+
+
+_watcher = LibraryWatcher()
+
+
+def get_library_watcher() -> LibraryWatcher:
+    """获取进程内音频目录监控"""
+    return _watcher
@@ -0,0 +1,216 @@
+import os
+import struct
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from database import SessionLocal
+import models
+from utils.file import is_library_file
+from utils.pcm import np, can_decode, decode_pcm, get_analysis_pool, DecodeError
+
+# 各级分辨率（峰值桶数量），相邻级别之间为整数倍，较粗的级别由最细的级别合并得到
+WAVEFORM_RESOLUTIONS = (256, 1024, 4096)
+# 解码时的采样率（单声道），足够计算显示用的峰值
+WAVEFORM_SAMPLE_RATE = 8000
+# 回填时每批查询的歌曲数量
+WAVEFORM_BACKFILL_BATCH = 200
+# 音频目录之外的文件（批量导入时引用的原文件）的波形保存目录，不写入用户的音乐目录
+WAVEFORM_CACHE_DIR = "cache/waveforms"
+
+# 文件格式：文件头 + 每级桶数量 + 每级 int8 的 (min, max) 交错数组
+WAVEFORM_MAGIC = b"MCWF"
+WAVEFORM_VERSION = 1
+_HEADER = struct.Struct("<4sBBIQq")
+_LEVEL = struct.Struct("<I")
+
+
+def is_waveform_available() -> bool:
+    return np is not None
+
+
+def waveform_path(file_path: str) -> str:
+    """音频目录中的文件，波形保存在音频文件旁边（隐藏文件，不会被目录同步当作音频）；
+    其他文件的波形按路径哈希保存在 WAVEFORM_CACHE_DIR 中"""
+    if not is_library_file(file_path):
+        key = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(WAVEFORM_CACHE_DIR, f"{key}.peaks")
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.peaks")
+
+
+def remove_waveform(file_path: str):
+    try:
+        os.remove(waveform_path(file_path))
+    except OSError:
+        pass
+
+
+def compute_peaks(samples) -> Dict[int, bytes]:
+    """计算各级分辨率的 (min, max) 峰值，返回 {桶数量: int8 交错数组}"""
+    finest = max(WAVEFORM_RESOLUTIONS)
+    if len(samples) < finest:
+        padded = np.zeros(finest, dtype=np.int16)
+        padded[:len(samples)] = samples
+        samples = padded
+    # 把采样均匀分成 finest 段，每段取最小值和最大值
+    starts = np.arange(finest, dtype=np.int64) * len(samples) // finest
+    mins = np.minimum.reduceat(samples, starts)
+    maxs = np.maximum.reduceat(samples, starts)
+
+    levels = {}
+    for resolution in WAVEFORM_RESOLUTIONS:
+        factor = finest // resolution
+        level_min = mins.reshape(resolution, factor).min(axis=1)
+        level_max = maxs.reshape(resolution, factor).max(axis=1)
+        # int16 右移 8 位得到 int8，显示精度足够
+        peaks = np.stack((level_min >> 8, level_max >> 8), axis=1).astype(np.int8)
+        levels[resolution] = peaks.tobytes()
+    return levels
+
+
+def compute_waveform(file_path: str) -> bool:
+    """解码音频并写入波形文件（在子进程中运行）"""
+    if np is None:
+        raise DecodeError("numpy is not installed")
+    stat_result = os.stat(file_path)
+    samples, sample_rate = decode_pcm(file_path, WAVEFORM_SAMPLE_RATE, 1)
+    levels = compute_peaks(samples[:, 0])
+
+    parts = [_HEADER.pack(WAVEFORM_MAGIC, WAVEFORM_VERSION, len(levels), sample_rate,
+                          stat_result.st_size, stat_result.st_mtime_ns)]
+    parts.extend(_LEVEL.pack(resolution) for resolution in levels)
+    parts.extend(levels.values())
+
+    target = waveform_path(file_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(temp_path, target)
+    return True
+
+
+def read_waveform(file_path: str, stat_result: Optional[os.stat_result] = None) -> Optional[Dict[int, bytes]]:
+    """读取波形文件；不存在、格式不对或音频文件已变化时返回 None"""
+    try:
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        with open(waveform_path(file_path), "rb") as f:
+            data = f.read()
+        magic, version, count, _, source_size, source_mtime = _HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    if (magic != WAVEFORM_MAGIC or version != WAVEFORM_VERSION
+            or source_size != stat_result.st_size or source_mtime != stat_result.st_mtime_ns):
+        return None
+
+    offset = _HEADER.size
+    resolutions = []
+    for _ in range(count):
+        resolutions.append(_LEVEL.unpack_from(data, offset)[0])
+        offset += _LEVEL.size
+    levels = {}
+    for resolution in resolutions:
+        levels[resolution] = data[offset:offset + resolution * 2]
+        offset += resolution * 2
+    if offset != len(data):
+        return None
+    return levels
+
+
+def has_waveform(file_path: str) -> bool:
+    """波形文件存在且与音频文件一致（只读取文件头）"""
+    try:
+        stat_result = os.stat(file_path)
+        with open(waveform_path(file_path), "rb") as f:
+            magic, version, _, _, source_size, source_mtime = _HEADER.unpack(f.read(_HEADER.size))
+    except (OSError, struct.error):
+        return False
+    return (magic == WAVEFORM_MAGIC and version == WAVEFORM_VERSION
+            and source_size == stat_result.st_size and source_mtime == stat_result.st_mtime_ns)
+
+
+class WaveformJobQueue:
+    """波形计算任务，在音频分析进程池中执行"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def enqueue(self, file_path: str) -> Optional[Future]:
+        """提交波形计算任务，同一文件已在计算时返回同一个任务"""
+        if np is None or not can_decode(file_path):
+            return None
+        with self._lock:
+            future = self._pending.get(file_path)
+            if future is not None:
+                return future
+        future = get_analysis_pool().submit(compute_waveform, file_path)
+        if future is None:
+            return None
+        with self._lock:
+            self._pending[file_path] = future
+        future.add_done_callback(lambda f: self._finish(file_path, f))
+        return future
+
+    def _finish(self, file_path: str, future: Future):
+        with self._lock:
+            if self._pending.get(file_path) is future:
+                del self._pending[file_path]
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Failed to compute waveform for {file_path}: {future.exception()}")
+
+
+_queue = WaveformJobQueue()
+
+
+def get_waveform_queue() -> WaveformJobQueue:
+    """获取进程内波形计算队列"""
+    return _queue
+
+
+def backfill_waveforms(batch_size: int = WAVEFORM_BACKFILL_BATCH,
+                       renew: Optional[Callable[[], bool]] = None) -> int:
+    """为已有歌曲计算缺少或过期的波形，返回计算的数量；renew 为每批调用一次的续锁回调，返回 False 时停止"""
+    if np is None:
+        return 0
+    queue = get_waveform_queue()
+    db = SessionLocal()
+    computed = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(models.Song.id, models.Song.file_path).filter(
+                models.Song.id > last_id
+            ).order_by(models.Song.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            futures = [
+                queue.enqueue(file_path) for _, file_path in rows
+                if file_path and can_decode(file_path) and os.path.exists(file_path) and not has_waveform(file_path)
+            ]
+            if None in futures:
+                # 服务正在关闭
+                break
+            # 每批等待完成后再提交下一批，避免一次提交整个曲库
+            for future in futures:
+                try:
+                    future.result()
+                    computed += 1
+                except Exception:
+                    pass
+            if renew is not None and not renew():
+                break
+
+        if computed:
+            print(f"已计算 {computed} 首歌曲的波形。")
+        return computed
+    except Exception as e:
+        print(f"回填波形时发生错误: {e}")
+        return computed
+    finally:
+        db.close()
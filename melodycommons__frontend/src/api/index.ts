@@ -4,6 +4,13 @@ import {useAuthStore} from '@/stores/auth'
 
 export const API_BASE_URL = 'http://localhost:8000'
 
+declare module 'axios' {
+    interface AxiosRequestConfig {
+        // 为 true 时请求失败不弹出错误提示（由调用方自行处理）
+        silent?: boolean
+    }
+}
+
 // 创建axios实例
 const apiClient = axios.create({
     baseURL: API_BASE_URL,
@@ -36,6 +43,10 @@ apiClient.interceptors.response.use(
     (error) => {
         console.error('API Error:', error)  // 添加错误日志
 
+        if (error.config?.silent) {
+            return Promise.reject(error)
+        }
+
         if (error.response) {
             const {status, data} = error.response
 
@@ -1,18 +1,27 @@
 import apiClient from './index'
 import type {
     Playlist,
+    PlaylistSummary,
+    PlaylistSummaryPage,
     PlaylistCreate,
     PlaylistUpdate,
     SongInPlaylist,
-    PlaylistSongOrder
+    SongInPlaylistPage,
+    PlaylistSongOrder,
+    PlaylistSongBatchResult
 } from '@/types'
 
 export const playlistsApi = {
-    // 获取歌单列表
-    getPlaylists: (): Promise<Playlist[]> => {
+    // 获取歌单列表（附带歌曲数、总时长和代表封面）
+    getPlaylists: (): Promise<PlaylistSummary[]> => {
         return apiClient.get('/playlists')
     },
 
+    // 按游标获取歌单列表（首页 cursor 传空字符串）
+    getPlaylistsPage: (params: { cursor: string, limit?: number }): Promise<PlaylistSummaryPage> => {
+        return apiClient.get('/playlists', {params})
+    },
+
     // 获取单个歌单
     getPlaylist: (id: number): Promise<Playlist> => {
         return apiClient.get(`/playlists/${id}`)
@@ -38,6 +47,11 @@ export const playlistsApi = {
         return apiClient.get(`/playlists/${id}/songs`)
     },
 
+    // 按游标获取歌单中的歌曲（首页 cursor 传空字符串）
+    getPlaylistSongsPage: (id: number, params: { cursor: string, limit?: number }): Promise<SongInPlaylistPage> => {
+        return apiClient.get(`/playlists/${id}/songs`, {params})
+    },
+
     // 添加歌曲到歌单
     addSongToPlaylist: (playlistId: number, songId: number): Promise<void> => {
         return apiClient.post(`/playlists/${playlistId}/songs/${songId}`)
@@ -48,6 +62,21 @@ export const playlistsApi = {
         return apiClient.delete(`/playlists/${playlistId}/songs/${songId}`)
     },
 
+    // 批量添加歌曲到歌单
+    addSongsToPlaylist: (playlistId: number, songIds: number[]): Promise<PlaylistSongBatchResult> => {
+        return apiClient.post(`/playlists/${playlistId}/songs`, {song_ids: songIds})
+    },
+
+    // 批量从歌单移除歌曲
+    removeSongsFromPlaylist: (playlistId: number, songIds: number[]): Promise<PlaylistSongBatchResult> => {
+        return apiClient.delete(`/playlists/${playlistId}/songs`, {data: {song_ids: songIds}})
+    },
+
+    // 将歌曲移动到另一首歌之前（beforeSongId 为 null 时移到末尾）
+    moveSongInPlaylist: (playlistId: number, songId: number, beforeSongId: number | null): Promise<SongInPlaylist> => {
+        return apiClient.post(`/playlists/${playlistId}/songs/${songId}/move`, {before_song_id: beforeSongId})
+    },
+
     // 更新歌单中歌曲顺序
     updatePlaylistSongOrder: (id: number, data: PlaylistSongOrder): Promise<void> => {
         return apiClient.put(`/playlists/${id}/songs/order`, data)
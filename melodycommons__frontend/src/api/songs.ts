@@ -1,5 +1,5 @@
 import apiClient from './index'
-import type {Song, SongCreate, SongUpdate} from '@/types'
+import type {Song, SongCreate, SongPage, SongUpdate, SongUploadResult} from '@/types'
 
 export const songsApi = {
     // 获取歌曲列表
@@ -11,13 +11,23 @@ export const songsApi = {
         return apiClient.get('/songs', {params})
     },
 
+    // 按游标获取歌曲列表（首页 cursor 传空字符串）
+    getSongsPage: (params: {
+        cursor: string
+        limit?: number
+        search?: string
+        sort?: 'created_at' | 'play_count'
+    }): Promise<SongPage> => {
+        return apiClient.get('/songs', {params})
+    },
+
     // 获取单个歌曲
     getSong: (id: number): Promise<Song> => {
         return apiClient.get(`/songs/${id}`)
     },
 
     // 上传歌曲
-    uploadSong: (file: File, metadata?: Partial<SongCreate>): Promise<Song> => {
+    uploadSong: (file: File, metadata?: Partial<SongCreate>): Promise<SongUploadResult> => {
         const formData = new FormData()
         formData.append('file', file)
 
@@ -56,5 +66,30 @@ export const songsApi = {
     // 获取歌曲流媒体URL
     getStreamUrl: (id: number): string => {
         return `${apiClient.defaults.baseURL}/songs/${id}/stream`
+    },
+
+    // 获取波形峰值（int8 的 min/max 交错数组）；服务端无法生成波形时返回 503，不弹出提示
+    getWaveform: async (id: number, resolution = 1024): Promise<Int8Array> => {
+        const data: ArrayBuffer = await apiClient.get(`/songs/${id}/waveform`, {
+            params: {resolution},
+            responseType: 'arraybuffer',
+            silent: true
+        })
+        return new Int8Array(data)
+    },
+
+    // 获取本地封面URL（指定 size 时返回缩略图；带 version 的地址可被浏览器永久缓存）
+    getCoverUrl: (id: number, size?: number, version?: string): string => {
+        const params = new URLSearchParams()
+        if (size) params.set('size', String(size))
+        if (version) params.set('v', version)
+        const query = params.toString()
+        return `${apiClient.defaults.baseURL}/songs/${id}/cover${query ? `?${query}` : ''}`
+    },
+
+    // 获取列表中使用的封面缩略图URL（没有封面时返回 null），以 updated_at 作为版本号
+    // 列表中的封面不超过 60px，默认按 2 倍像素密度请求 128px（服务端返回 256px 一档）
+    getSongCoverUrl: (song: Pick<Song, 'id' | 'cover_url' | 'updated_at'>, size = 128): string | null => {
+        return song.cover_url ? songsApi.getCoverUrl(song.id, size, song.updated_at) : null
     }
 }
\ No newline at end of file
@@ -45,6 +45,17 @@ export const usePlayerStore = defineStore('player', () => {
         }
     }
 
+    // 按 ReplayGain 调整音量，使不同歌曲响度一致（audio.volume 最大为 1，只能降低音量）
+    const replayGainFactor = (song: Song | null) => {
+        if (song?.replay_gain == null) return 1
+        const factor = Math.pow(10, song.replay_gain / 20)
+        return Math.min(1, song.peak ? Math.min(factor, 1 / song.peak) : factor)
+    }
+
+    const applyVolume = () => {
+        if (audio) audio.volume = (volume.value / 100) * replayGainFactor(currentSong.value)
+    }
+
     const hasPrevious = computed(() => playlist.value.length > 1);
     const hasNext = computed(() => playlist.value.length > 1);
 
@@ -73,7 +84,7 @@ export const usePlayerStore = defineStore('player', () => {
             ? `http://localhost:8000/songs/${song.id}/stream?token=${encodeURIComponent(authStore.token)}`
             : `http://localhost:8000/songs/${song.id}/stream`
 
-        audio.volume = volume.value / 100
+        applyVolume()
         audio.muted = isMuted.value
 
         audio.play().then(() => {
@@ -127,7 +138,7 @@ export const usePlayerStore = defineStore('player', () => {
 
     const setVolume = (newVolume: number) => {
         volume.value = Math.max(0, Math.min(100, newVolume))
-        if (audio) audio.volume = volume.value / 100
+        applyVolume()
         if (volume.value > 0 && isMuted.value) toggleMute()
     }
 
@@ -218,8 +229,8 @@ export const usePlayerStore = defineStore('player', () => {
         playlist.value = []
     }
 
-    watch(volume, (newVolume) => {
-        if (audio) audio.volume = newVolume / 100
+    watch(volume, () => {
+        applyVolume()
     })
     watch(isMuted, (muted) => {
         if (audio) audio.muted = muted
@@ -1,10 +1,10 @@
 import {defineStore} from 'pinia'
 import {ref} from 'vue'
 import {playlistsApi} from '@/api/playlists'
-import type {Playlist, PlaylistCreate, PlaylistUpdate, SongInPlaylist} from '@/types'
+import type {Playlist, PlaylistSummary, PlaylistCreate, PlaylistUpdate, SongInPlaylist} from '@/types'
 
 export const usePlaylistsStore = defineStore('playlists', () => {
-    const playlists = ref<Playlist[]>([])
+    const playlists = ref<PlaylistSummary[]>([])
     const currentPlaylist = ref<Playlist | null>(null)
     const loading = ref(false)
 
@@ -37,7 +37,7 @@ export const usePlaylistsStore = defineStore('playlists', () => {
     const createPlaylist = async (data: PlaylistCreate): Promise<Playlist> => {
         try {
             const newPlaylist = await playlistsApi.createPlaylist(data)
-            playlists.value.unshift(newPlaylist)
+            playlists.value.unshift({...newPlaylist, song_count: 0, total_duration: 0, cover_song_id: null})
             return newPlaylist
         } catch (error) {
             console.error('Failed to create playlist:', error)
@@ -53,7 +53,7 @@ export const usePlaylistsStore = defineStore('playlists', () => {
             // 更新本地数据
             const index = playlists.value.findIndex(p => p.id === id)
             if (index > -1) {
-                playlists.value[index] = updatedPlaylist
+                playlists.value[index] = {...playlists.value[index], ...updatedPlaylist}
             }
 
             if (currentPlaylist.value?.id === id) {
@@ -130,6 +130,20 @@ export const usePlaylistsStore = defineStore('playlists', () => {
         }
     }
 
+    // 移动歌单中的单首歌曲
+    const moveSongInPlaylist = async (
+        playlistId: number,
+        songId: number,
+        beforeSongId: number | null
+    ): Promise<void> => {
+        try {
+            await playlistsApi.moveSongInPlaylist(playlistId, songId, beforeSongId)
+        } catch (error) {
+            console.error('Failed to move song in playlist:', error)
+            throw error
+        }
+    }
+
     return {
         playlists,
         currentPlaylist,
@@ -142,6 +156,7 @@ export const usePlaylistsStore = defineStore('playlists', () => {
         getPlaylistSongs,
         addSongToPlaylist,
         removeSongFromPlaylist,
-        updatePlaylistSongOrder
+        updatePlaylistSongOrder,
+        moveSongInPlaylist
     }
 })
\ No newline at end of file
@@ -1,7 +1,7 @@
 import {defineStore} from 'pinia'
 import {ref} from 'vue'
 import {songsApi} from '@/api/songs'
-import type {Song, SongCreate, SongUpdate} from '@/types'
+import type {Song, SongCreate, SongUpdate, SongUploadResult} from '@/types'
 
 interface SongsResponse {
     data: Song[]
@@ -65,7 +65,7 @@ export const useSongsStore = defineStore('songs', () => {
     }
 
     // 上传歌曲
-    const uploadSong = async (file: File, metadata?: Partial<SongCreate>): Promise<Song> => {
+    const uploadSong = async (file: File, metadata?: Partial<SongCreate>): Promise<SongUploadResult> => {
         try {
             return await songsApi.uploadSong(file, metadata)
         } catch (error) {
@@ -24,10 +24,24 @@ export interface Song {
     cover_url: string | null
     cover_path: string | null
     play_count: number
+    // 响度分析结果：积分响度（LUFS）、采样峰值（0~1）、ReplayGain 增益（dB），未分析时为 null
+    loudness?: number | null
+    peak?: number | null
+    replay_gain?: number | null
     created_at: string
     updated_at: string
 }
 
+// 上传结果：duplicate 为 true 表示已有内容相同的歌曲，没有创建新歌曲
+export interface SongUploadResult extends Song {
+    duplicate: boolean
+}
+
+export interface SongPage {
+    items: Song[]
+    next_cursor: string | null
+}
+
 export interface SongCreate {
     title: string
     artist: string
@@ -47,6 +61,17 @@ export interface Playlist {
     created_at: string
 }
 
+export interface PlaylistSummary extends Playlist {
+    song_count: number
+    total_duration: number
+    cover_song_id: number | null
+}
+
+export interface PlaylistSummaryPage {
+    items: PlaylistSummary[]
+    next_cursor: string | null
+}
+
 export interface PlaylistCreate {
     name: string
     description?: string
@@ -63,6 +88,11 @@ export interface SongInPlaylist {
     added_at: string
 }
 
+export interface SongInPlaylistPage {
+    items: SongInPlaylist[]
+    next_cursor: string | null
+}
+
 export interface PlaylistWithSongs extends Playlist {
     songs: SongInPlaylist[]
 }
@@ -74,6 +104,13 @@ export interface PlaylistSongOrder {
     }>
 }
 
+export interface PlaylistSongBatchResult {
+    added: number[]
+    removed: number[]
+    skipped: number[]
+    not_found: number[]
+}
+
 export interface ErrorResponse {
     error: string
     message: string